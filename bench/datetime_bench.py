@@ -0,0 +1,47 @@
+"""
+Compares the throughput (values/sec) of the xsd:dateTime, xsd:date and xsd:time
+conversions of `ResultSet` with the plain `dateutil` parser.
+
+Usage (from the project root, with the package installed or on `PYTHONPATH=src`):
+    python bench/datetime_bench.py [values]
+"""
+import sys
+from time import perf_counter
+from typing import Any, Callable, List
+
+from dateutil.parser import parse as dt_parse
+
+from sparqlc import ResultSet, XSD_DATE, XSD_DATETIME, XSD_TIME
+
+
+def bench(values: List[str], convert: Callable[[str], Any]) -> float:
+    start = perf_counter()
+    for value in values:
+        convert(value)
+    return len(values) / (perf_counter() - start)
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    samples = {
+        XSD_DATETIME: (
+            [f'2020-01-{1 + i % 28:02}T{i % 24:02}:{i % 60:02}:{i % 60:02}.{i % 1000:03}Z' for i in range(count)],
+            dt_parse,
+        ),
+        XSD_DATE: (
+            [f'2020-{1 + i % 12:02}-{1 + i % 28:02}' for i in range(count)],
+            lambda v: dt_parse(v).date(),
+        ),
+        XSD_TIME: (
+            [f'{i % 24:02}:{i % 60:02}:{i % 60:02}' for i in range(count)],
+            lambda v: dt_parse(v).time(),
+        ),
+    }
+    for datatype, (values, baseline) in samples.items():
+        print(datatype)
+        print(f'     dateutil: {bench(values, baseline):12,.0f} values/sec')
+        print(f'    ResultSet: {bench(values, ResultSet.BASIC_TYPES[datatype]):12,.0f} values/sec')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Measures the memory (bytes/row) and throughput (rows/sec) of `fetch_rows`
+with and without the per-result-set IRI cache, on a result whose columns
+repeat IRIs as typical results do (types, predicates, popular subjects).
+
+Usage (from the project root, with the package installed or on `PYTHONPATH=src`):
+    python bench/iri_cache_bench.py [rows]
+"""
+import gc
+import json
+import sys
+import tracemalloc
+from io import BytesIO
+from time import perf_counter
+
+from sparqlc import RawResultSet, RESULT_TYPE_SPARQL_JSON
+
+
+def sample_result(rows: int) -> bytes:
+    return json.dumps({
+        'head': {'vars': ['s', 'p', 'type']},
+        'results': {'bindings': [{
+            's': {'type': 'uri', 'value': f'http://example.org/resource/{i % 1000}'},
+            'p': {'type': 'uri', 'value': f'http://example.org/ontology/property{i % 50}'},
+            'type': {'type': 'uri', 'value': f'http://example.org/ontology/Class{i % 10}'},
+        } for i in range(rows)]},
+    }).encode('utf-8')
+
+
+def fetch_rows(data: bytes, iri_cache_size: int) -> list:
+    return RawResultSet(BytesIO(data), content_type=RESULT_TYPE_SPARQL_JSON, iri_cache_size=iri_cache_size).fetch_rows()
+
+
+def bytes_per_row(data: bytes, rows: int, iri_cache_size: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    result = fetch_rows(data, iri_cache_size)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(result) == rows
+    return size / rows
+
+
+def rows_per_sec(data: bytes, rows: int, iri_cache_size: int, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        fetch_rows(data, iri_cache_size)
+        best = min(best, perf_counter() - start)
+    return rows / best
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    data = sample_result(rows)
+    print(f'{rows} rows, 3 columns of IRIs')
+    for label, size in [('no IRI cache', 0), ('   IRI cache', 16 * 1024)]:
+        print(
+            f'{label}: {bytes_per_row(data, rows, size):8,.0f} bytes/row, '
+            f'{rows_per_sec(data, rows, size):12,.0f} rows/sec'
+        )
+
+
+if __name__ == '__main__':
+    main()
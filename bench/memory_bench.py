@@ -0,0 +1,52 @@
+"""
+Measures the memory (bytes/row) held by a typical 3-column result
+(IRI, language-tagged literal, typed literal) with the slotted term classes,
+compared with the former layout carrying a per-instance `__dict__`.
+
+Usage (from the project root, with the package installed or on `PYTHONPATH=src`):
+    python bench/memory_bench.py [rows]
+"""
+import gc
+import sys
+import tracemalloc
+from typing import List
+
+from sparqlc import IRI, Literal, QUERY_ROW, XSD_INTEGER
+
+
+# Subclasses without `__slots__` get a `__dict__`, as the terms had before
+class DictIRI(IRI):
+    pass
+
+
+class DictLiteral(Literal):
+    pass
+
+
+def sample_rows(rows: int, iri_type: type, literal_type: type) -> List[QUERY_ROW]:
+    return [(
+        iri_type(f'http://example.org/resource/{i}'),
+        literal_type(f'Resource number {i}', lang='en'),
+        literal_type(str(i), XSD_INTEGER),
+    ) for i in range(rows)]
+
+
+def bytes_per_row(rows: int, iri_type: type, literal_type: type) -> float:
+    gc.collect()
+    tracemalloc.start()
+    result = sample_rows(rows, iri_type, literal_type)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(result) == rows
+    return size / rows
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    print(f'{rows} rows, 3 columns')
+    print(f'  __dict__ terms: {bytes_per_row(rows, DictIRI, DictLiteral):8,.0f} bytes/row')
+    print(f'   slotted terms: {bytes_per_row(rows, IRI, Literal):8,.0f} bytes/row')
+
+
+if __name__ == '__main__':
+    main()
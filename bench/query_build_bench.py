@@ -0,0 +1,59 @@
+"""
+Measures the cost (microseconds/request) of composing the HTTP requests of a query:
+creating the query from its service, then its URI, body and headers,
+for each SPARQL method, with a service carrying many prefixes and a few graphs,
+declaring all the prefixes and only those used by the statement (`used_prefixes_only`).
+
+Usage (from the project root, with the package installed or on `PYTHONPATH=src`):
+    python bench/query_build_bench.py [prefixes]
+"""
+import sys
+from time import perf_counter
+
+from sparqlc import Service, SparqlMethod
+
+STATEMENT = 'SELECT ?label WHERE { <http://example.org/resource/42> rdfs:label ?label } LIMIT 10'
+
+
+def create_service(method: SparqlMethod, prefixes: int, used_prefixes_only: bool) -> Service:
+    service = Service('http://example.org/sparql', method)
+    service.used_prefixes_only = used_prefixes_only
+    for i in range(prefixes):
+        service.set_prefix(f'ns{i}', f'http://example.org/ontology/{i}#')
+    service.set_prefix('rdfs', 'http://www.w3.org/2000/01/rdf-schema#')
+    service.default_graphs.extend(['http://example.org/graph/1', 'http://example.org/graph/2'])
+    service.named_graphs.append('http://example.org/graph/3')
+    return service
+
+
+def build(service: Service) -> None:
+    query = service.create_query()
+    query.query_uri(STATEMENT)
+    query.query_body(STATEMENT)
+    query.request_headers()
+
+
+def us_per_request(service: Service, number: int = 20_000, repeat: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        for _ in range(number):
+            build(service)
+        best = min(best, perf_counter() - start)
+    return best / number * 1e6
+
+
+def main() -> None:
+    prefixes = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    print(f'{prefixes + 1} prefixes, 3 graphs')
+    for used_prefixes_only in (False, True):
+        print('used prefixes only:' if used_prefixes_only else 'all prefixes:')
+        for method in SparqlMethod:
+            service = create_service(method, prefixes, used_prefixes_only)
+            query = service.create_query()
+            size = len(query.query_uri(STATEMENT)) + len(query.query_body(STATEMENT) or b'')
+            print(f'{method.name:>16}: {us_per_request(service):6.2f} us/request, {size:5} bytes')
+
+
+if __name__ == '__main__':
+    main()
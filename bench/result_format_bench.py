@@ -0,0 +1,87 @@
+"""
+Compares the throughput (rows/sec) of the parsers of the SPARQL result formats
+on the same synthetic result set.
+
+Usage (from the project root, with the package installed or on `PYTHONPATH=src`):
+    python bench/result_format_bench.py [rows]
+"""
+import json
+import sys
+from io import BytesIO
+from struct import pack
+from time import perf_counter
+from typing import Dict
+
+from sparqlc import RawResultSet, RESULT_TYPE_BINARY, RESULT_TYPE_CSV, RESULT_TYPE_SPARQL_JSON
+from sparqlc import RESULT_TYPE_SPARQL_XML, RESULT_TYPE_TSV
+from xml_parser_bench import sample_result as sample_xml
+
+XSD_INTEGER = 'http://www.w3.org/2001/XMLSchema#integer'
+
+
+def sample_json(rows: int) -> bytes:
+    return json.dumps({
+        'head': {'vars': ['s', 'label', 'value', 'node']},
+        'results': {'bindings': [{
+            's': {'type': 'uri', 'value': f'http://example.org/resource/{i}'},
+            'label': {'type': 'literal', 'value': f'Resource number {i}', 'xml:lang': 'en'},
+            'value': {'type': 'literal', 'value': str(i), 'datatype': XSD_INTEGER},
+            'node': {'type': 'bnode', 'value': f'b{i}'},
+        } for i in range(rows)]},
+    }).encode('utf-8')
+
+
+def sample_tsv(rows: int) -> bytes:
+    return ('?s\t?label\t?value\t?node\n' + ''.join(
+        f'<http://example.org/resource/{i}>\t"Resource number {i}"@en\t{i}\t_:b{i}\n' for i in range(rows)
+    )).encode('utf-8')
+
+
+def sample_csv(rows: int) -> bytes:
+    return ('s,label,value,node\r\n' + ''.join(
+        f'http://example.org/resource/{i},Resource number {i},{i},_:b{i}\r\n' for i in range(rows)
+    )).encode('utf-8')
+
+
+def sample_binary(rows: int) -> bytes:
+    def string(value: str) -> bytes:
+        data = value.encode('utf-8')
+        return pack('>i', len(data)) + data
+
+    head = b'BRTR' + pack('>ii', 2, 4) + b''.join(string(v) for v in ('s', 'label', 'value', 'node'))
+    namespaces = \
+        b'\x02' + pack('>i', 0) + string('http://example.org/resource/') + \
+        b'\x02' + pack('>i', 1) + string('http://www.w3.org/2001/XMLSchema#')
+    body = b''.join(
+        b'\x03' + pack('>i', 0) + string(str(i)) +
+        b'\x07' + string(f'Resource number {i}') + string('en') +
+        b'\x08' + string(str(i)) + b'\x03' + pack('>i', 1) + string('integer') +
+        b'\x05' + string(f'b{i}')
+        for i in range(rows)
+    )
+    return head + namespaces + body + b'\x7f'
+
+
+def bench(data: bytes, content_type: str) -> float:
+    start = perf_counter()
+    count = sum(1 for _ in RawResultSet(BytesIO(data), content_type=content_type))
+    return count / (perf_counter() - start)
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    samples: Dict[str, bytes] = {
+        RESULT_TYPE_SPARQL_XML: sample_xml(rows),
+        RESULT_TYPE_SPARQL_JSON: sample_json(rows),
+        RESULT_TYPE_TSV: sample_tsv(rows),
+        RESULT_TYPE_CSV: sample_csv(rows),
+        RESULT_TYPE_BINARY: sample_binary(rows),
+    }
+    print(f'{rows} rows')
+    for content_type, data in samples.items():
+        size = len(data) / 1024 / 1024
+        print(f'{content_type:>40}: {size:6.1f} MB {bench(data, content_type):12,.0f} rows/sec')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Compares the throughput (rows/sec) of `ResultSet.unpack_row`, of the per-result-set `ConversionPlan`,
+which generates the source of its row converter, and of a row converter built from closures
+over the converters of the columns instead.
+
+Usage (from the project root, with the package installed or on `PYTHONPATH=src`):
+    python bench/unpack_row_bench.py [rows]
+"""
+import sys
+from time import perf_counter
+from typing import Any, Callable, List, Optional
+
+from sparqlc import BlankNode, IRI, Literal, QUERY_ROW, RDFTerm, ResultSet
+from sparqlc import XSD_BOOLEAN, XSD_DECIMAL, XSD_DOUBLE, XSD_INTEGER, XSD_STRING
+
+
+def sample_rows(rows: int) -> List[QUERY_ROW]:
+    return [(
+        IRI(f'http://example.org/resource/{i}'),
+        Literal(f'Resource number {i}', lang='en'),
+        Literal(str(i), XSD_INTEGER),
+        Literal(f'{i}.5', XSD_DOUBLE),
+        Literal(f'{i}.25', XSD_DECIMAL),
+        Literal('true', XSD_BOOLEAN),
+        Literal(f'label {i}', XSD_STRING),
+        BlankNode(f'b{i}'),
+        None,
+    ) for i in range(rows)]
+
+
+def bench(rows: List[QUERY_ROW], unpack_row: Callable[[QUERY_ROW], tuple], repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        for raw in rows:
+            unpack_row(raw)
+        best = min(best, perf_counter() - start)
+    return len(rows) / best
+
+
+def closure_plan(sample: QUERY_ROW) -> Callable[[QUERY_ROW], tuple]:
+    """ Row converter specialised for the types of the sample row, without code generation """
+    def cell(term: Optional[RDFTerm]) -> Callable[[Optional[RDFTerm]], Any]:
+        term_type = term.__class__
+        if not isinstance(term, Literal):
+            return lambda item: None if item is None else (
+                item.value if item.__class__ is term_type else ResultSet.unpack_row((item,))[0]
+            )
+        datatype = term.datatype
+        converter = ResultSet.BASIC_TYPES.get(datatype, str)
+        return lambda item: None if item is None else (
+            converter(item.value) if item.__class__ is term_type and item.datatype == datatype
+            else ResultSet.unpack_row((item,))[0]
+        )
+    cells = tuple(cell(term) for term in sample)
+    return lambda raw: tuple([convert(item) for convert, item in zip(cells, raw)])
+
+
+def main() -> None:
+    rows = sample_rows(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
+    print(f'{len(rows)} rows, {len(rows[0])} columns')
+    print(f'     unpack_row: {bench(rows, ResultSet.unpack_row):12,.0f} rows/sec')
+    print(f'conversion plan: {bench(rows, ResultSet.conversion_plan().unpack_row):12,.0f} rows/sec')
+    print(f'       closures: {bench(rows, closure_plan(rows[0])):12,.0f} rows/sec')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Compares the throughput (rows/sec) of the SPARQL XML parser backends.
+
+Usage (from the project root, with the package installed or on `PYTHONPATH=src`):
+    python bench/xml_parser_bench.py [rows]
+"""
+import sys
+from io import BytesIO
+from time import perf_counter
+
+from sparqlc import RawResultSet, XmlBackend
+
+ROW_TEMPLATE = \
+    '<result>' \
+    '<binding name="s"><uri>http://example.org/resource/{i}</uri></binding>' \
+    '<binding name="label"><literal xml:lang="en">Resource number {i}</literal></binding>' \
+    '<binding name="value"><literal datatype="http://www.w3.org/2001/XMLSchema#integer">{i}</literal></binding>' \
+    '<binding name="node"><bnode>b{i}</bnode></binding>' \
+    '</result>\n'
+
+
+def sample_result(rows: int) -> bytes:
+    head = \
+        '<?xml version="1.0"?>\n' \
+        '<sparql xmlns="http://www.w3.org/2005/sparql-results#">\n' \
+        '<head><variable name="s"/><variable name="label"/>' \
+        '<variable name="value"/><variable name="node"/></head>\n<results>\n'
+    body = ''.join(ROW_TEMPLATE.format(i=i) for i in range(rows))
+    return (head + body + '</results>\n</sparql>\n').encode('utf-8')
+
+
+def bench(data: bytes, backend: XmlBackend) -> float:
+    start = perf_counter()
+    count = sum(1 for _ in RawResultSet(BytesIO(data), xml_backend=backend))
+    return count / (perf_counter() - start)
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    data = sample_result(rows)
+    print(f'{rows} rows, {len(data) / 1024 / 1024:.1f} MB')
+    for backend in XmlBackend:
+        print(f'{backend.name:>8}: {bench(data, backend):12,.0f} rows/sec')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,26 @@
 from .version import VERSION
 from .service_base import SparqlMethod, RESULT_TYPE_SPARQL_XML, RESULT_TYPE_SPARQL_JSON, RESULT_TYPE_XML_SCHEMA
-from .service import Service, query, raw_query
+from .service_base import RESULT_TYPE_TSV, RESULT_TYPE_CSV, RESULT_TYPE_BINARY
+from .service import ReplicaService, Service, ServiceRegistry, query, raw_query
 from .query import Query
-from .result_set import ResultSet, RawResultSet, DEFAULT_ENCODING, QUERY_ROW
+from .batch import BatchResult, QueryBatch
+from .result_cache import CachedResult, ResultCache, ResultCacheBase
+from .disk_cache import DiskCachedResult, DiskResultCache
+from .single_flight import SingleFlight
+from .retry import RetryPolicy, RetryState
+from .circuit_breaker import CircuitBreaker, CircuitState
+from .endpoint_pool import Balancing, EndpointPool
+from .hedging import HedgingPolicy
+from .rate_limit import RateLimiter
+from .async_service import AsyncService
+from .async_query import AsyncQuery
+from .async_result_set import AsyncRawResultSet, AsyncResultSet
+from .result_set import ConversionPlan, ResultSet, RawResultSet, DEFAULT_ENCODING, QUERY_ROW
+from .xml_parser import XmlBackend
 from .datatypes import BlankNode, Datatype, IRI, Literal, RDFTerm
 from .exception import SparqlException
-from .exception import SparqlParseException, SparqlProtocolException
+from .exception import SparqlCircuitOpenException, SparqlParseException, SparqlProtocolException
+from .exception import SparqlRateLimitException
 from .n3_parser import parse_n3_term
 
 from .datatypes import XSD_STRING, XSD_INT, XSD_LONG, XSD_DOUBLE, XSD_FLOAT
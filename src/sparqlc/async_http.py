@@ -0,0 +1,429 @@
+import asyncio
+import ssl
+from collections import deque
+from http.client import HTTPMessage
+from typing import Any, AsyncGenerator, Awaitable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+from .service_base import DEFAULT_MAX_REDIRECTS, DRAIN_CHUNK_SIZE, MAX_DRAIN
+
+# Default maximum number of idle connections kept open per host
+DEFAULT_POOL_SIZE = 10
+
+# Size of the chunks read from the connection
+READ_CHUNK_SIZE = 64 * 1024
+
+REDIRECT_STATUSES = frozenset([301, 302, 303, 307, 308])
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+class AsyncHTTPError(Exception):
+    """ Failure of the HTTP protocol, e.g. a malformed or incomplete response """
+    pass
+
+
+class AsyncConnection:
+    """ Connection of an :class:`AsyncConnectionPool` """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader: asyncio.StreamReader = reader
+        self.writer: asyncio.StreamWriter = writer
+
+    @property
+    def usable(self) -> bool:
+        """
+        :return: False if the connection is known to be closed, e.g. by the server while idle
+        """
+        return not self.writer.is_closing() and not self.reader.at_eof()
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class AsyncHTTPResponse:
+    """
+    Response of an :class:`AsyncConnectionPool`. The body is read on demand,
+    once it is read to the end, the connection returns to the pool.
+    """
+
+    def __init__(
+            self,
+            status: int,
+            reason: str,
+            version: str,
+            headers: HTTPMessage,
+            conn: AsyncConnection,
+            pool: 'AsyncConnectionPool',
+            has_body: bool,
+            timeout: Optional[float]
+    ):
+        self.status: int = status
+        self.reason: str = reason
+        self.version: str = version
+        self.headers: HTTPMessage = headers
+        self._conn: Optional[AsyncConnection] = conn
+        self._pool: AsyncConnectionPool = pool
+        self._timeout: Optional[float] = timeout
+        self._chunked: bool = 'chunked' in headers.get('transfer-encoding', '').lower()
+        self._length: Optional[int] = None
+        self._chunk_left: int = 0
+        self._released: bool = False
+        self._complete: bool = False
+        if not has_body:
+            self._length = 0
+        elif not self._chunked and 'content-length' in headers:
+            self._length = int(headers['content-length'])
+        connection = headers.get('connection', '').lower()
+        self._keep_alive: bool = (self._chunked or self._length is not None) and (
+            connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+        )
+        if self._length == 0:
+            self._finish()
+
+    @classmethod
+    async def read_head(
+            cls,
+            conn: AsyncConnection,
+            pool: 'AsyncConnectionPool',
+            method: str,
+            timeout: Optional[float] = None
+    ) -> 'AsyncHTTPResponse':
+        """
+        Reads the status line and the headers of the response from the connection
+        """
+        while True:
+            line = await conn.reader.readline()
+            if not line:
+                raise AsyncHTTPError('Connection closed without a response')
+            try:
+                version, status, reason = (line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+                status = int(status)
+            except ValueError:
+                raise AsyncHTTPError(f'Invalid status line {line!r}')
+            headers = await cls._read_headers(conn.reader)
+            # Interim responses (e.g. 100 Continue) are followed by the final one
+            if not 100 <= status < 200:
+                break
+        has_body = method != 'HEAD' and status not in (204, 304)
+        return cls(status, reason, version, headers, conn, pool, has_body, timeout)
+
+    @staticmethod
+    async def _read_headers(reader: asyncio.StreamReader) -> HTTPMessage:
+        # Looked up regardless of the case of the names, like the headers of `urllib3.HTTPResponse`
+        headers = HTTPMessage()
+        while True:
+            line = await reader.readline()
+            if not line:
+                raise AsyncHTTPError('Connection closed in the response headers')
+            if line in (b'\r\n', b'\n'):
+                return headers
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            value = value.strip()
+            if name in headers:
+                value = f'{headers[name]}, {value}'
+                del headers[name]
+            headers[name] = value
+
+    @property
+    def released(self) -> bool:
+        """
+        :return: True if the body has been read and the connection returned to the pool
+        """
+        return self._released
+
+    @property
+    def complete(self) -> bool:
+        """
+        :return: True if the whole body has been read
+        """
+        return self._complete
+
+    async def read(self, amt: int = -1) -> bytes:
+        """
+        :param amt: Maximum number of bytes to read, the rest of the body by default
+        :return: The data read, empty at the end of the body
+        """
+        if amt >= 0:
+            return await self._read_chunk(amt)
+        parts: List[bytes] = []
+        while True:
+            data = await self._read_chunk(READ_CHUNK_SIZE)
+            if not data:
+                return b''.join(parts)
+            parts.append(data)
+
+    async def stream(self, chunk_size: int = READ_CHUNK_SIZE) -> AsyncGenerator[bytes, None]:
+        """
+        Generates the body in chunks of at most `chunk_size` bytes
+        """
+        while True:
+            data = await self._read_chunk(chunk_size)
+            if not data:
+                return
+            yield data
+
+    async def release(self, max_drain: int = MAX_DRAIN) -> bool:
+        """
+        Finishes the response like :func:`sparqlc.service_base.release_response`: the unread rest
+        of the body up to `max_drain` bytes is drained to return the connection to the pool,
+        otherwise the connection is closed.
+        :return: True if the connection was returned to the pool, False if it was closed
+        """
+        drained = 0
+        try:
+            while self._conn is not None and drained < max_drain:
+                drained += len(await self._read_chunk(DRAIN_CHUNK_SIZE))
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, AsyncHTTPError):
+            pass
+        self.close()
+        return self._released
+
+    def close(self) -> None:
+        """
+        Closes the connection, unless it has already returned to the pool
+        """
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def _read_chunk(self, amt: int) -> bytes:
+        if self._conn is None or amt == 0:
+            return b''
+        try:
+            if self._chunked:
+                data = await self._read_chunked(amt)
+            elif self._length is not None:
+                data = await self._wait(self._conn.reader.read(min(amt, self._length)))
+                if not data:
+                    raise AsyncHTTPError(f'Response body incomplete, {self._length} bytes missing')
+                self._length -= len(data)
+                if self._length == 0:
+                    self._finish()
+            else:
+                # Delimited by closing the connection
+                data = await self._wait(self._conn.reader.read(amt))
+                if not data:
+                    self._finish()
+        except BaseException:
+            self.close()
+            raise
+        return data
+
+    async def _read_chunked(self, amt: int) -> bytes:
+        reader = self._conn.reader
+        if self._chunk_left == 0:
+            line = await self._wait(reader.readline())
+            try:
+                size = int(line.split(b';', 1)[0].strip(), 16)
+            except ValueError:
+                raise AsyncHTTPError(f'Invalid chunk size {line!r}')
+            if size == 0:
+                await self._wait(self._read_headers(reader))
+                self._finish()
+                return b''
+            self._chunk_left = size
+        data = await self._wait(reader.read(min(amt, self._chunk_left)))
+        if not data:
+            raise AsyncHTTPError('Response body incomplete, chunk truncated')
+        self._chunk_left -= len(data)
+        if self._chunk_left == 0:
+            await self._wait(reader.readexactly(2))
+        return data
+
+    def _finish(self) -> None:
+        """
+        The whole body was read: the connection returns to the pool if it can be reused
+        """
+        conn, self._conn = self._conn, None
+        self._complete = True
+        self._released = self._keep_alive
+        if self._keep_alive:
+            self._pool.put_conn(conn)
+        else:
+            conn.close()
+
+    async def _wait(self, awaitable: Awaitable) -> Any:
+        if self._timeout:
+            return await asyncio.wait_for(awaitable, self._timeout)
+        return await awaitable
+
+
+class AsyncConnectionPool:
+    """
+    Pool of keep-alive HTTP/1.1 connections to a single host. The number of open
+    connections is not limited, at most `maxsize` idle ones are kept for reuse.
+    """
+
+    def __init__(self, scheme: str, host: str, port: int, maxsize: int, ssl_context: Optional[ssl.SSLContext]):
+        self.scheme: str = scheme
+        self.host: str = host
+        self.port: int = port
+        self.maxsize: int = maxsize
+        self._ssl_context: Optional[ssl.SSLContext] = ssl_context
+        self._idle: Deque[AsyncConnection] = deque()
+        self._closed: bool = False
+        self.num_connections: int = 0
+        self.num_requests: int = 0
+
+    async def get_conn(self) -> Tuple[AsyncConnection, bool]:
+        """
+        :return: An idle connection, or a new one if there is none, and whether it is reused
+        """
+        while self._idle:
+            # The most recently used connection is the least likely to be closed by the server
+            conn = self._idle.pop()
+            if conn.usable:
+                return conn, True
+            conn.close()
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self._ssl_context)
+        self.num_connections += 1
+        return AsyncConnection(reader, writer), False
+
+    def put_conn(self, conn: AsyncConnection) -> None:
+        if self._closed or len(self._idle) >= self.maxsize or not conn.usable:
+            conn.close()
+        else:
+            self._idle.append(conn)
+
+    async def urlopen(
+            self,
+            method: str,
+            target: str,
+            headers: Dict[str, str],
+            body: Optional[bytes],
+            timeout: Optional[float] = None
+    ) -> AsyncHTTPResponse:
+        """
+        Sends the request and reads the head of the response.
+        A request failing on a reused connection, which the server may have closed
+        in the meantime, is repeated on a new connection.
+        """
+        request = self._encode_request(method, target, headers, body)
+        while True:
+            conn, reused = await self.get_conn()
+            try:
+                conn.writer.write(request)
+                await conn.writer.drain()
+                response = await AsyncHTTPResponse.read_head(conn, self, method, timeout)
+            except (OSError, asyncio.IncompleteReadError, AsyncHTTPError):
+                conn.close()
+                if reused:
+                    continue
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            self.num_requests += 1
+            return response
+
+    def _encode_request(self, method: str, target: str, headers: Dict[str, str], body: Optional[bytes]) -> bytes:
+        default_port = DEFAULT_PORTS.get(self.scheme)
+        host = f'[{self.host}]' if ':' in self.host else self.host
+        lines = [
+            f'{method} {target} HTTP/1.1',
+            f'Host: {host}' if self.port == default_port else f'Host: {host}:{self.port}',
+        ]
+        lines.extend(f'{name}: {value}' for name, value in headers.items())
+        lower_names = {name.lower() for name in headers}
+        if 'accept-encoding' not in lower_names:
+            lines.append('Accept-Encoding: identity')
+        if body is not None or method in ('POST', 'PUT'):
+            lines.append(f'Content-Length: {len(body or b"")}')
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b'')
+
+    def close(self) -> None:
+        """
+        Closes the idle connections, the others are closed when their responses finish
+        """
+        self._closed = True
+        while self._idle:
+            self._idle.pop().close()
+
+
+class AsyncPoolManager:
+    """
+    asyncio counterpart of the `urllib3.PoolManager`, keeping an :class:`AsyncConnectionPool`
+    per host. The connections belong to the event loop which opened them, the pools are
+    therefore dropped if the manager is used from another event loop.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_POOL_SIZE, ssl_context: Optional[ssl.SSLContext] = None):
+        self._maxsize: int = maxsize
+        self._ssl_context: Optional[ssl.SSLContext] = ssl_context
+        self._pools: Dict[Tuple[str, str, int], AsyncConnectionPool] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def pools(self) -> List[AsyncConnectionPool]:
+        return list(self._pools.values())
+
+    async def request(
+            self,
+            method: str,
+            url: str,
+            headers: Optional[Dict[str, str]] = None,
+            body: Optional[bytes] = None,
+            retries: int = DEFAULT_MAX_REDIRECTS,
+            timeout: Optional[float] = None,
+            **kwargs
+    ) -> AsyncHTTPResponse:
+        """
+        Sends the request, following at most `retries` redirects.
+        Other keyword arguments of `urllib3.PoolManager.request`, e.g. `preload_content`, are ignored:
+        the body of the response is always read on demand.
+        :param timeout: Timeout in seconds of connecting and of each read, no timeout if not set
+        """
+        headers = dict(headers or {})
+        while True:
+            response = await self._urlopen(method, url, headers, body, timeout)
+            location = response.headers.get('Location')
+            if response.status not in REDIRECT_STATUSES or not location:
+                return response
+            await response.release()
+            if retries <= 0:
+                raise AsyncHTTPError(f'Too many redirects, last to {location}')
+            retries -= 1
+            url = urljoin(url, location)
+            if response.status == 303 and method != 'HEAD':
+                method = 'GET'
+                body = None
+                headers = {name: value for name, value in headers.items() if name.lower() != 'content-type'}
+
+    async def _urlopen(
+            self,
+            method: str,
+            url: str,
+            headers: Dict[str, str],
+            body: Optional[bytes],
+            timeout: Optional[float]
+    ) -> AsyncHTTPResponse:
+        parts = urlsplit(url)
+        if parts.scheme not in DEFAULT_PORTS or not parts.hostname:
+            raise AsyncHTTPError(f'Unsupported URL {url}')
+        pool = self._pool(parts.scheme, parts.hostname, parts.port or DEFAULT_PORTS[parts.scheme])
+        target = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        request = pool.urlopen(method, target, headers, body, timeout)
+        return await (asyncio.wait_for(request, timeout) if timeout else request)
+
+    def _pool(self, scheme: str, host: str, port: int) -> AsyncConnectionPool:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._pools = {}
+            self._loop = loop
+        key = (scheme, host, port)
+        pool = self._pools.get(key)
+        if pool is None:
+            ssl_context = None
+            if scheme == 'https':
+                ssl_context = self._ssl_context = self._ssl_context or ssl.create_default_context()
+            pool = self._pools[key] = AsyncConnectionPool(scheme, host, port, self._maxsize, ssl_context)
+        return pool
+
+    def clear(self) -> None:
+        """
+        Closes the idle connections of all the pools and drops the pools
+        """
+        pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.close()
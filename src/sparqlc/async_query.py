@@ -0,0 +1,224 @@
+import asyncio
+from contextlib import ExitStack
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Type, TypeVar
+
+from .async_http import AsyncHTTPError, AsyncHTTPResponse
+from .async_result_set import AsyncRawResultSet, AsyncResponseStream, AsyncResultSet
+from .exception import SparqlException
+from .query import HeldRoute, QueryBase
+from .service_base import MAX_DRAIN, SparqlMethod
+
+T = TypeVar('T')
+
+
+class AsyncRoutedResponse:
+    """
+    Reads through an :class:`AsyncHTTPResponse`, holding the route of its request until the body has been read,
+    like :class:`sparqlc.query.RoutedResponse`
+    """
+
+    def __init__(self, response: AsyncHTTPResponse, route: HeldRoute):
+        self._response: AsyncHTTPResponse = response
+        self._route: HeldRoute = route
+
+    @property
+    def status(self) -> int:
+        return self._response.status
+
+    @property
+    def headers(self):
+        return self._response.headers
+
+    @property
+    def released(self) -> bool:
+        return self._response.released
+
+    async def read(self, amt: int = -1) -> bytes:
+        try:
+            data = await self._response.read(amt)
+        except (AsyncHTTPError, OSError, asyncio.TimeoutError):
+            self._route.finish(SparqlException(f'HTTP Error occurred.'))
+            raise
+        except BaseException:
+            self._route.abandon()
+            raise
+        if self._response.complete:
+            self._route.finish()
+        return data
+
+    async def release(self, max_drain: int = MAX_DRAIN) -> bool:
+        try:
+            return await self._response.release(max_drain)
+        finally:
+            self._release()
+
+    def close(self) -> None:
+        self._response.close()
+        self._release()
+
+    def _release(self) -> None:
+        if self._response.complete:
+            self._route.finish()
+        else:
+            self._route.abandon()
+
+
+class AsyncQuery(QueryBase):
+    """
+    Query sent through the asyncio connection pool of its :class:`AsyncService`
+    """
+
+    async def query(self, statement: str) -> AsyncResultSet:
+        """
+        Sends the statement and receives the response.
+        :param statement: SPARQL statement to send
+        :return: AsyncResultSet allowing to parse the response
+        """
+        return await self._result_set(AsyncResultSet, statement)
+
+    async def raw_query(self, statement: str) -> AsyncRawResultSet:
+        """
+        Sends the statement and receives the response, to be parsed to raw types.
+        :param statement: SPARQL statement to send
+        :return: AsyncRawResultSet allowing to parse the response
+        """
+        return await self._result_set(AsyncRawResultSet, statement)
+
+    async def _result_set(self, result_set_type: Type[AsyncRawResultSet], statement: str) -> AsyncRawResultSet:
+        """
+        Creates the result set of the statement from the :attr:`result_cache`, if it holds
+        the result, otherwise from the response, which is cached once fully read. A stale cached result
+        is used if the endpoint confirms that it is still valid.
+
+        The :attr:`single_flight` of the service is not used: the identical queries are sent each on its own.
+        """
+        cache = self._result_cache
+        key = None
+        if cache is not None:
+            key = self.cache_key(statement)
+            cached = cache.get(key)
+            if cached is not None:
+                return result_set_type(cached.open(), self.encoding, content_type=cached.content_type)
+        return await self._retry(statement, lambda: self._receive(result_set_type, key, statement))
+
+    async def _receive(
+            self,
+            result_set_type: Type[AsyncRawResultSet],
+            key: Optional[Hashable],
+            statement: str
+    ) -> AsyncRawResultSet:
+        """
+        Sends the statement and parses the head of the response. As no row has been returned yet,
+        a failure while the head is received can be retried as well.
+        """
+        cache = self._result_cache
+        stale = cache.stale(key) if cache is not None else None
+        response = await self._send(statement, self.conditional_headers(stale))
+        if response.status == self.STATUS_NOT_MODIFIED:
+            await response.release()
+            cache.refresh(key)
+            return result_set_type(stale.open(), self.encoding, content_type=stale.content_type)
+        content_type = response.headers.get(self.CONTENT_TYPE_HEADER)
+        stream = AsyncResponseStream(response, asyncio.get_running_loop())
+        file = stream if cache is None else cache.record(key, stream, content_type, *self.validators(response))
+        result_set = result_set_type(file, self.encoding, content_type=content_type)
+        await result_set._open(stream)
+        return result_set
+
+    async def _retry(self, statement: str, send: Callable[[], Awaitable[T]]) -> T:
+        """
+        Awaits `send` until it succeeds, or the :attr:`retry_policy` gives up and its error is raised
+        :param statement: SPARQL statement sent, retried only if it is a query
+        """
+        retry = self._retry_policy.start(statement) if self._retry_policy is not None else None
+        while True:
+            try:
+                return await send()
+            except SparqlException as error:
+                delay = retry.delay(error) if retry is not None else None
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+    async def _send(
+            self,
+            statement: str,
+            conditional_headers: Optional[Dict[str, str]] = None
+    ) -> AsyncRoutedResponse:
+        """
+        Sends the statement, hedged as the :attr:`hedging_policy` allows. The request which has lost
+        is cancelled, closing its connection.
+        """
+        policy = self._hedging_policy
+        if policy is None or not policy.hedgeable(statement):
+            return await self._attempt(statement, conditional_headers)
+        return await policy.send_async(
+            lambda: self._attempt(statement, conditional_headers), AsyncRoutedResponse.close
+        )
+
+    async def _attempt(
+            self,
+            statement: str,
+            conditional_headers: Optional[Dict[str, str]] = None
+    ) -> AsyncRoutedResponse:
+        """
+        Sends the statement to the endpoint picked by :func:`_route`
+        :return: Response holding the route until its body has been read
+        """
+        with ExitStack() as stack:
+            endpoint = await self._route(stack)
+            with self._admit(endpoint):
+                response = await self._exchange(statement, conditional_headers, endpoint)
+            return AsyncRoutedResponse(response, HeldRoute(stack.pop_all()))
+
+    async def _route(self, stack: ExitStack) -> str:
+        """
+        Picks the endpoint of a request like :func:`QueryBase._route`, awaiting the :attr:`rate_limiter`
+        """
+        if self._endpoint_pool is None:
+            endpoint = self.endpoint.strip()
+        else:
+            endpoint = stack.enter_context(self._endpoint_pool.acquire()).endpoint
+        if self._rate_limiter is not None:
+            stack.enter_context(await self._rate_limiter.acquire_async(endpoint, self._rate_limit_blocking))
+        return endpoint
+
+    async def _exchange(
+            self,
+            statement: str,
+            conditional_headers: Optional[Dict[str, str]],
+            endpoint: str
+    ) -> AsyncHTTPResponse:
+        """
+        Sends the statement and receives the head of the response. Handles HTTP errors.
+        :param statement: SPARQL statement to send
+        :param conditional_headers: Headers asking whether a cached result is still valid
+        :param endpoint: Endpoint to which the statement is sent
+        :return: Response with the status 200, or 304 (Not Modified) to a conditional request
+        """
+        method, uri = self._request_target(statement, endpoint)
+        headers = self.request_headers(method)
+        try:
+            response = await self.pool_request(
+                method,
+                uri,
+                headers=headers | conditional_headers if conditional_headers else headers,
+                body=self._query_body(method, statement),
+                preload_content=False,
+                **self.snapshot().request_kwargs
+            )
+            if response.status == 200 or (conditional_headers and response.status == self.STATUS_NOT_MODIFIED):
+                return response
+            elif self.method is SparqlMethod.AUTO and method is SparqlMethod.GET \
+                    and response.status in self.STATUS_GET_REJECTED:
+                await response.release()
+                self._reject_get(endpoint)
+                return await self._exchange(statement, conditional_headers, endpoint)
+            else:
+                msg = (await response.read()).decode(self.encoding)
+                raise self.protocol_error(response.status, msg, response.headers.get(self.HEADER_RETRY_AFTER))
+        except (AsyncHTTPError, OSError, asyncio.TimeoutError) as http_error:
+            raise SparqlException(f'HTTP Error occurred.') from http_error
+
+    async def pool_request(self, method: SparqlMethod, url: str, **kwargs) -> AsyncHTTPResponse:
+        return await self._service.pool_request(method, url, **kwargs)
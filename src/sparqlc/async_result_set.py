@@ -0,0 +1,180 @@
+import asyncio
+from io import IOBase
+from types import TracebackType
+from typing import AsyncGenerator, Optional, Type
+
+from .async_http import AsyncHTTPError, AsyncHTTPResponse
+from .exception import SparqlException
+from .result_set import RawResultSet, ResultSet
+from .service_base import MAX_DRAIN
+
+# Number of rows returned by the iteration before it lets the other tasks run
+YIELD_EVERY = 1000
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class AsyncResponseStream(IOBase):
+    """
+    Stream over the body of an :class:`AsyncHTTPResponse` received by the event loop: :func:`receive` awaits
+    the next chunk of the body, which :func:`read` then returns without blocking. Only a read from another
+    thread waits for the event loop to receive the data.
+    """
+
+    # Maximum size of the chunks received
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, response: AsyncHTTPResponse, loop: asyncio.AbstractEventLoop):
+        super().__init__()
+        self._response: AsyncHTTPResponse = response
+        self._loop: asyncio.AbstractEventLoop = loop
+        # Received, not read yet
+        self._buffer: bytes = b''
+        self._eof: bool = False
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, amt: Optional[int] = -1) -> bytes:
+        self._checkClosed()
+        if not self._buffer and not self._eof:
+            if _running_loop() is self._loop:
+                raise RuntimeError('The rows of an asynchronous result set are read with `async for`')
+            asyncio.run_coroutine_threadsafe(self.receive(), self._loop).result()
+        if amt is None or amt < 0:
+            amt = len(self._buffer)
+        data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    @property
+    def length_remaining(self) -> Optional[int]:
+        """
+        0 once the body has been fully read, like `urllib3.HTTPResponse.length_remaining`, otherwise None
+        """
+        return 0 if self._eof and not self._buffer else None
+
+    async def receive(self) -> None:
+        """
+        Receives the next chunk of the body, or its end
+        """
+        try:
+            data = await self._response.read(self.CHUNK_SIZE)
+        except (AsyncHTTPError, OSError, asyncio.TimeoutError) as http_error:
+            raise SparqlException(f'HTTP Error occurred.') from http_error
+        if data:
+            self._buffer += data
+        else:
+            self._eof = True
+
+    async def prefetch(self, size: int) -> None:
+        """
+        Receives the body until `size` bytes are waiting to be read, or its end
+        """
+        while len(self._buffer) < size and not self._eof:
+            await self.receive()
+
+    async def release(self, max_drain: int = MAX_DRAIN) -> None:
+        """
+        Finishes the response, returning its connection to the pool if the unread rest of the body
+        is not longer than `max_drain` bytes, and closes the stream
+        """
+        await self._response.release(max_drain)
+        self.close()
+
+    def close(self) -> None:
+        if not self.closed:
+            # The connection is closed by the event loop
+            if _running_loop() is self._loop:
+                self._response.close()
+            elif not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._response.close)
+        super().close()
+
+
+class _AsyncResultSetMixin:
+    """
+    Asynchronous iteration and context management of a result set.
+    The parser of a result set over an :class:`AsyncResponseStream` is fed each chunk of the body by the event
+    loop as it is received, once the rows parsed so far have been returned: the rows are returned without
+    waiting for the rest of the body, and without any thread waiting for the network or for the iteration.
+    A result set over a cached response is parsed right away, the iteration only lets the other tasks
+    run from time to time.
+    """
+    _stream: Optional[AsyncResponseStream] = None
+
+    async def _open(self, stream: AsyncResponseStream) -> None:
+        """
+        Parses the head of the response streamed by `stream`, so that :attr:`variables` is known
+        """
+        self._stream = stream
+        try:
+            self.check_closed()
+            self._parser = self._create_parser()
+            while not self._parser.head_parsed and self._parser.wants_data:
+                await self._receive()
+            self._parse_head()
+        except BaseException:
+            self._close(0)
+            raise
+
+    async def _receive(self) -> None:
+        """
+        Receives the next chunk of the body, and feeds it to the parser through the response stream
+        """
+        await self._stream.receive()
+        self._parser.feed(self._file.read(AsyncResponseStream.CHUNK_SIZE))
+        if self._parser.failed:
+            # The unparsed rest of the response is part of the error
+            await self._stream.prefetch(self.MAX_RAW_LEN)
+
+    def __aiter__(self) -> AsyncGenerator:
+        return self._async_rows()
+
+    async def _async_rows(self) -> AsyncGenerator:
+        rows = self.fetch_next()
+        count = 0
+        while True:
+            if self._stream is not None:
+                while self._parser.wants_data:
+                    await self._receive()
+            try:
+                row = next(rows)
+            except StopIteration:
+                return
+            yield row
+            count += 1
+            if count % YIELD_EVERY == 0:
+                await asyncio.sleep(0)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(
+            self,
+            exc_type: Optional[Type[BaseException]],
+            exc_val: Optional[BaseException],
+            exc_tb: Optional[TracebackType]
+    ) -> bool:
+        if self._stream is not None and not self.closed:
+            await self._stream.release()
+        self._close()
+        return False
+
+
+class AsyncRawResultSet(_AsyncResultSetMixin, RawResultSet):
+    """
+    :class:`RawResultSet` of an :class:`AsyncQuery`, supporting `async for row in result_set`
+    """
+    pass
+
+
+class AsyncResultSet(_AsyncResultSetMixin, ResultSet):
+    """
+    :class:`ResultSet` of an :class:`AsyncQuery`, supporting `async for row in result_set`
+    """
+    pass
@@ -0,0 +1,83 @@
+from types import TracebackType
+from typing import Dict, Optional, Type
+
+from .async_http import AsyncHTTPResponse, AsyncPoolManager, DEFAULT_POOL_SIZE
+from .async_query import AsyncQuery
+from .async_result_set import AsyncRawResultSet, AsyncResultSet
+from .service_base import DEFAULT_ACCEPT, DEFAULT_ENCODING, DEFAULT_MAX_REDIRECTS, DEFAULT_TIMEOUT
+from .service_base import ServiceBase, SparqlMethod
+
+
+class AsyncService(ServiceBase):
+    """
+    asyncio counterpart of the :class:`Service`, configured the same way.
+    The queries run over pooled keep-alive HTTP/1.1 connections without blocking
+    the event loop, so one loop can run many queries concurrently.
+    Use the service within a single event loop.
+    """
+
+    def __init__(
+            self,
+            endpoint: str,
+            method: SparqlMethod = SparqlMethod.POST,
+            encoding: str = DEFAULT_ENCODING,
+            accept: str = DEFAULT_ACCEPT,
+            max_redirects: int = DEFAULT_MAX_REDIRECTS,
+            timeout: float = DEFAULT_TIMEOUT,
+            pool_size: int = DEFAULT_POOL_SIZE):
+        """
+        :param pool_size: Maximum number of idle connections kept open for reuse
+        """
+        super().__init__(method, endpoint, encoding, accept, max_redirects, timeout)
+        self._pool_manager = AsyncPoolManager(pool_size)
+
+    def create_query(self) -> AsyncQuery:
+        return AsyncQuery(self)
+
+    async def query(self, query_str: str) -> AsyncResultSet:
+        """
+        Executes the query and returns the result
+        :param query_str: Query string
+        :return:
+        """
+        return await self.create_query().query(query_str)
+
+    async def raw_query(self, query_str: str) -> AsyncRawResultSet:
+        """
+        Executes the query and returns the raw results consisting of the actual Sparql objects
+        :param query_str: Query string
+        :return:
+        """
+        return await self.create_query().raw_query(query_str)
+
+    async def pool_request(self, method: SparqlMethod, url: str, **kwargs) -> AsyncHTTPResponse:
+        return await self._pool_manager.request(str(method), url, **kwargs)
+
+    @property
+    def connection_stats(self) -> Dict[str, int]:
+        """
+        Counters of the connection pools (one per host) of the service,
+        the same as :attr:`Service.connection_stats`.
+        """
+        pools = self._pool_manager.pools
+        requests = sum(pool.num_requests for pool in pools)
+        connections = sum(pool.num_connections for pool in pools)
+        return {'requests': requests, 'connections': connections, 'reused': requests - connections}
+
+    def close(self) -> None:
+        """
+        Closes the idle pooled connections
+        """
+        self._pool_manager.clear()
+
+    async def __aenter__(self) -> 'AsyncService':
+        return self
+
+    async def __aexit__(
+            self,
+            exc_type: Optional[Type[BaseException]],
+            exc_val: Optional[BaseException],
+            exc_tb: Optional[TracebackType]
+    ) -> bool:
+        self.close()
+        return False
@@ -0,0 +1,140 @@
+from concurrent.futures import as_completed, Future, ThreadPoolExecutor
+from time import perf_counter
+from typing import Callable, Dict, Generator, Iterable, List, Optional
+
+from .result_parser import QUERY_ROW
+from .result_set import RawResultSet
+
+# Default number of queries of a batch running concurrently
+DEFAULT_MAX_WORKERS = 8
+
+
+class BatchResult:
+    """
+    Outcome of one statement of a :class:`QueryBatch`: either the fetched rows, or the error.
+    """
+
+    def __init__(
+            self,
+            index: int,
+            statement: str,
+            rows: Optional[List[QUERY_ROW]],
+            error: Optional[Exception],
+            elapsed: float
+    ):
+        self.index: int = index
+        self.statement: str = statement
+        self.rows: Optional[List[QUERY_ROW]] = rows
+        self.error: Optional[Exception] = error
+        self.elapsed: float = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        outcome = f'{len(self.rows)} rows' if self.ok else repr(self.error)
+        return f'<BatchResult #{self.index} {outcome} in {self.elapsed:.3f}s>'
+
+
+class QueryBatch:
+    """
+    Statements running concurrently on a thread pool of `max_workers` threads.
+    The queries start as soon as the batch is created. Each worker fetches all the rows
+    of its query, so that its connection returns to the pool before the next query.
+
+    Iterating the batch (once) generates a :class:`BatchResult` per statement, in the order
+    of the statements if `ordered` is set, otherwise as the queries complete.
+    Breaking the iteration cancels the queries which have not started yet.
+    """
+
+    def __init__(
+            self,
+            execute: Callable[[str], RawResultSet],
+            statements: Iterable[str],
+            max_workers: int = DEFAULT_MAX_WORKERS,
+            ordered: bool = True
+    ):
+        """
+        :param execute: Runs a statement, e.g. :func:`Service.query`
+        :param statements: Statements to run
+        :param max_workers: Maximum number of the queries running concurrently
+        :param ordered: Generate the results in the order of the statements, rather than as they complete
+        """
+        self._execute: Callable[[str], RawResultSet] = execute
+        self._ordered: bool = ordered
+        self._results: List[BatchResult] = []
+        self._start: float = perf_counter()
+        self._end: Optional[float] = None
+        executor = ThreadPoolExecutor(max_workers, thread_name_prefix='sparqlc-batch')
+        self._futures: List[Future] = [
+            executor.submit(self._run, index, statement) for index, statement in enumerate(statements)
+        ]
+        # The submitted queries still run, the threads end with the last of them
+        executor.shutdown(wait=False)
+
+    def _run(self, index: int, statement: str) -> BatchResult:
+        start = perf_counter()
+        try:
+            with self._execute(statement) as result_set:
+                rows = result_set.fetch_rows()
+            error = None
+        except Exception as e:
+            rows = None
+            error = e
+        return BatchResult(index, statement, rows, error, perf_counter() - start)
+
+    def __len__(self) -> int:
+        return len(self._futures)
+
+    def __iter__(self) -> Generator[BatchResult, None, None]:
+        futures = self._futures if self._ordered else as_completed(self._futures)
+        completed = False
+        try:
+            for future in futures:
+                if future.cancelled():
+                    continue
+                result = future.result()
+                self._results.append(result)
+                yield result
+            completed = True
+        finally:
+            if completed:
+                self._end = perf_counter()
+            else:
+                self.cancel()
+
+    def results(self) -> List[BatchResult]:
+        """
+        Waits for all the queries
+        :return: Results of all the statements
+        """
+        return list(self)
+
+    def cancel(self) -> None:
+        """
+        Cancels the queries which have not started yet
+        """
+        for future in self._futures:
+            future.cancel()
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """
+        Timing of the results generated so far: the number of `queries` in the batch,
+        of the `completed` ones, of the `errors` and of the fetched `rows`, the wall-clock
+        time `elapsed` since the start of the batch (until the end of the iteration),
+        and the `min`, `mean` and `max` time of a query, in seconds.
+        """
+        times = [result.elapsed for result in self._results]
+        end = self._end if self._end is not None else perf_counter()
+        return {
+            'queries': len(self._futures),
+            'completed': len(self._results),
+            'errors': sum(1 for result in self._results if not result.ok),
+            'rows': sum(len(result.rows) for result in self._results if result.ok),
+            'elapsed': end - self._start,
+            'min': min(times, default=0.0),
+            'mean': sum(times) / len(times) if times else 0.0,
+            'max': max(times, default=0.0),
+        }
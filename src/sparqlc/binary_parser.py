@@ -0,0 +1,222 @@
+import re
+from io import IOBase
+from struct import Struct
+from typing import List, Optional
+
+from .datatypes import BlankNode, Datatype, Literal, RDFTerm
+from .result_parser import QUERY_ROW, ResultParser
+
+# See org.eclipse.rdf4j.query.resultio.binary.BinaryQueryResultConstants
+MAGIC_NUMBER = b'BRTR'
+FORMAT_VERSION = 4
+
+NULL_RECORD_MARKER = 0
+REPEAT_RECORD_MARKER = 1
+NAMESPACE_RECORD_MARKER = 2
+QNAME_RECORD_MARKER = 3
+URI_RECORD_MARKER = 4
+BNODE_RECORD_MARKER = 5
+PLAIN_LITERAL_RECORD_MARKER = 6
+LANG_LITERAL_RECORD_MARKER = 7
+DATATYPE_LITERAL_RECORD_MARKER = 8
+EMPTY_ROW_RECORD_MARKER = 9
+TRIPLE_RECORD_MARKER = 10
+ERROR_RECORD_MARKER = 126
+TABLE_END_RECORD_MARKER = 127
+
+ERROR_TYPES = {
+    1: 'Malformed query',
+    2: 'Query evaluation error',
+}
+
+_int32 = Struct('>i')
+_uint16 = Struct('>H')
+_surrogate_pair = re.compile('[\ud800-\udbff][\udc00-\udfff]')
+
+
+def _decode_modified_utf8(data: bytes) -> str:
+    """
+    Decodes the "modified UTF-8" of Java's `DataOutput.writeUTF`,
+    which encodes NUL as two bytes and supplementary characters as surrogate pairs.
+    """
+    text = data.replace(b'\xc0\x80', b'\x00').decode('utf-8', 'surrogatepass')
+    return _surrogate_pair.sub(lambda m: m.group().encode('utf-16-le', 'surrogatepass').decode('utf-16-le'), text)
+
+
+class _Incomplete(Exception):
+    """
+    The record continues in the next chunk
+    """
+    pass
+
+
+class BinaryResultParser(ResultParser):
+    """
+    Streaming parser of the RDF4J (GraphDB) binary query results format
+    (`application/x-binary-rdf-results-table`).
+
+    The format declares namespaces once and refers to them from qualified
+    names; a value equal to the one in the same column of the previous row
+    is sent as a back-reference and yields the same term instance.
+
+    A record continued by the next chunk is parsed again from its beginning once the chunk is fed.
+    """
+    PARSE_ERRORS = (ValueError,)
+
+    def __init__(self, file: IOBase, iri_cache_size: int = 0):
+        super().__init__(file, iri_cache_size)
+        self._buf: bytes = b''
+        self._pos: int = 0
+        # Chunks fed, not appended to the buffer yet
+        self._unfed: List[bytes] = []
+        self._unfed_size: int = 0
+        # Number of bytes missing from the buffer to complete the record
+        self._missing: int = 0
+        self._version: int = FORMAT_VERSION
+        self._namespaces: List[str] = []
+        self._previous: QUERY_ROW = ()
+        self._current: List[Optional[RDFTerm]] = []
+        self._finished: bool = False
+
+    def _parse(self, data: bytes) -> None:
+        if data:
+            self._unfed.append(data)
+            self._unfed_size += len(data)
+            if self._unfed_size < self._missing:
+                return
+        self._buf = self._buf[self._pos:] + b''.join(self._unfed)
+        self._pos = 0
+        self._unfed = []
+        self._unfed_size = 0
+        self._missing = 0
+        if not self._head_done:
+            try:
+                self._parse_header()
+            except _Incomplete:
+                self._pos = 0
+                return
+        self._parse_records()
+
+    def _parse_header(self) -> None:
+        magic = self._read(len(MAGIC_NUMBER), allow_eof=True)
+        if not magic:
+            # An empty stream is not an error, it just has no results
+            self._finished = True
+            self._head_done = True
+            return
+        if magic != MAGIC_NUMBER:
+            raise ValueError('File does not contain a binary RDF table result')
+        self._version = self._read_int()
+        if not 1 <= self._version <= FORMAT_VERSION:
+            raise ValueError(f'Incompatible format version {self._version}')
+        column_count = self._read_int()
+        if column_count < 0:
+            raise ValueError(f'Illegal column count {column_count}')
+        variables = [self._read_string() for _ in range(column_count)]
+        self.variables.extend(variables)
+        self._previous = (None,) * column_count
+        self._head_done = True
+
+    def _parse_records(self) -> None:
+        width = len(self.variables)
+        pending = self._pending
+        current = self._current
+        start = self._pos
+        try:
+            while not self._finished:
+                start = self._pos
+                marker = self._read_byte()
+                if marker == TABLE_END_RECORD_MARKER:
+                    self._finished = True
+                elif marker == NAMESPACE_RECORD_MARKER:
+                    self._read_namespace()
+                elif marker == EMPTY_ROW_RECORD_MARKER:
+                    pending.append(())
+                elif marker == ERROR_RECORD_MARKER:
+                    self._read_error()
+                else:
+                    if marker == REPEAT_RECORD_MARKER:
+                        current.append(self._previous[len(current)])
+                    else:
+                        current.append(self._read_value(marker))
+                    if len(current) == width:
+                        self._previous = tuple(current)
+                        current.clear()
+                        pending.append(self._previous)
+        except _Incomplete:
+            self._pos = start
+
+    def _read_value(self, marker: int) -> Optional[RDFTerm]:
+        if marker == URI_RECORD_MARKER:
+            return self._iri(self._read_string())
+        elif marker == QNAME_RECORD_MARKER:
+            return self._iri(self._read_qname())
+        elif marker == PLAIN_LITERAL_RECORD_MARKER:
+            return Literal(self._read_string())
+        elif marker == DATATYPE_LITERAL_RECORD_MARKER:
+            value = self._read_string()
+            datatype_marker = self._read_byte()
+            if datatype_marker == QNAME_RECORD_MARKER:
+                return Literal(value, Datatype(self._read_qname()))
+            elif datatype_marker == URI_RECORD_MARKER:
+                return Literal(value, Datatype(self._read_string()))
+            raise ValueError(f"Illegal record type marker {datatype_marker} for literal's datatype")
+        elif marker == LANG_LITERAL_RECORD_MARKER:
+            value = self._read_string()
+            return Literal(value, lang=self._read_string())
+        elif marker == BNODE_RECORD_MARKER:
+            return BlankNode(self._read_string())
+        elif marker == NULL_RECORD_MARKER:
+            return None
+        raise ValueError(f'Unsupported record type {marker}')
+
+    def _read_namespace(self) -> None:
+        ns_id = self._read_int()
+        namespace = self._read_string()
+        if ns_id >= len(self._namespaces):
+            self._namespaces.extend([''] * (ns_id + 1 - len(self._namespaces)))
+        self._namespaces[ns_id] = namespace
+
+    def _read_qname(self) -> str:
+        ns_id = self._read_int()
+        local_name = self._read_string()
+        if ns_id >= len(self._namespaces):
+            raise ValueError(f'Undeclared namespace {ns_id}')
+        return self._namespaces[ns_id] + local_name
+
+    def _read_error(self) -> None:
+        error_type = self._read_byte()
+        message = self._read_string()
+        raise ValueError(f'{ERROR_TYPES.get(error_type, "Unknown error")}: {message}')
+
+    def _read_string(self) -> str:
+        if self._version == 1:
+            return _decode_modified_utf8(self._read(_uint16.unpack(self._read(2))[0]))
+        return self._read(self._read_int()).decode('utf-8')
+
+    def _read_int(self) -> int:
+        return _int32.unpack(self._read(4))[0]
+
+    def _read_byte(self) -> int:
+        pos = self._pos
+        if pos < len(self._buf):
+            self._pos = pos + 1
+            return self._buf[pos]
+        return self._read(1)[0]
+
+    def _read(self, size: int, allow_eof: bool = False) -> bytes:
+        """
+        Reads exactly `size` bytes from the buffer, raising `_Incomplete` if the end of the stream has not been fed yet.
+        :param allow_eof: If set, an empty result is returned at the end of the stream instead of an error
+        """
+        end = self._pos + size
+        if end > len(self._buf):
+            if not self._eof:
+                self._missing = end - len(self._buf)
+                raise _Incomplete()
+            if allow_eof and self._pos == len(self._buf):
+                return b''
+            raise ValueError('Unexpected end of the stream')
+        data = self._buf[self._pos:end]
+        self._pos = end
+        return data
@@ -0,0 +1,254 @@
+from collections import deque
+from enum import Enum
+from threading import Lock
+from time import monotonic
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from .exception import SparqlCircuitOpenException, SparqlException, SparqlProtocolException
+
+DEFAULT_FAILURE_RATE = 0.5
+DEFAULT_SLOW_CALL_RATE = 0.8
+DEFAULT_WINDOW_SIZE = 20
+DEFAULT_MIN_CALLS = 10
+DEFAULT_OPEN_DURATION = 30.0
+DEFAULT_HALF_OPEN_PROBES = 1
+
+# Statuses with which an overloaded or failing endpoint answers, the other errors are the client's
+FAILURE_STATUS_MIN = 500
+STATUS_TOO_MANY_REQUESTS = 429
+
+
+class CircuitState(Enum):
+    # The requests are sent, their outcomes are recorded
+    CLOSED = 'closed'
+    # The requests fail fast, without being sent
+    OPEN = 'open'
+    # A few probe requests are sent, whose outcome closes or opens the circuit again
+    HALF_OPEN = 'half-open'
+
+
+class _Circuit:
+    """
+    State of the circuit of an endpoint, and the outcomes of its last calls
+    """
+
+    def __init__(self, window_size: int):
+        self.state: CircuitState = CircuitState.CLOSED
+        # Failed and slow flags of the last calls
+        self.outcomes: Deque[Tuple[bool, bool]] = deque(maxlen=window_size)
+        self.failures: int = 0
+        self.slow_calls: int = 0
+        self.opened_at: float = 0.0
+        self.probes: int = 0
+
+    def add(self, failed: bool, slow: bool) -> None:
+        if len(self.outcomes) == self.outcomes.maxlen:
+            dropped_failed, dropped_slow = self.outcomes[0]
+            self.failures -= dropped_failed
+            self.slow_calls -= dropped_slow
+        self.outcomes.append((failed, slow))
+        self.failures += failed
+        self.slow_calls += slow
+
+    def reset(self) -> None:
+        self.outcomes.clear()
+        self.failures = self.slow_calls = 0
+
+
+class CircuitCall:
+    """
+    Request let through by a :class:`CircuitBreaker`, a context manager recording its outcome:
+    a :class:`SparqlException` raised in it is a failure (unless it is a client error), otherwise a success.
+    """
+
+    def __init__(self, breaker: 'CircuitBreaker', endpoint: str, probe: bool):
+        self._breaker: CircuitBreaker = breaker
+        self._endpoint: str = endpoint
+        self.probe: bool = probe
+        self._start: float = monotonic()
+
+    def __enter__(self) -> 'CircuitCall':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        duration = monotonic() - self._start
+        if exc_val is None or isinstance(exc_val, SparqlException):
+            self._breaker.record(self._endpoint, self.probe, duration, exc_val)
+        else:
+            # e.g. cancelled, which says nothing about the endpoint
+            self._breaker.release(self._endpoint, self.probe)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of the endpoints of a service: once too many of the last requests to an endpoint
+    have failed (or have been slow), its circuit opens and the requests fail fast with
+    :class:`SparqlCircuitOpenException`, rather than waiting out the timeout on an overloaded endpoint.
+    After `open_duration` seconds the circuit is half-open, letting a few probe requests through:
+    it closes if they succeed, otherwise it opens again.
+
+    A request fails if it raises a network error or the endpoint answers with a 5xx or 429 status.
+    It is slow if it takes `slow_call_duration` seconds or more to receive the response head.
+    The circuit opens once at least `min_calls` of the last `window_size` requests have been made,
+    and `failure_rate` of them have failed or `slow_call_rate` of them have been slow.
+    """
+
+    def __init__(
+            self,
+            failure_rate: float = DEFAULT_FAILURE_RATE,
+            slow_call_duration: Optional[float] = None,
+            slow_call_rate: float = DEFAULT_SLOW_CALL_RATE,
+            window_size: int = DEFAULT_WINDOW_SIZE,
+            min_calls: int = DEFAULT_MIN_CALLS,
+            open_duration: float = DEFAULT_OPEN_DURATION,
+            half_open_probes: int = DEFAULT_HALF_OPEN_PROBES,
+            on_transition: Optional[Callable[[str, CircuitState, CircuitState], None]] = None
+    ):
+        """
+        :param failure_rate: Rate of the failed requests opening the circuit
+        :param slow_call_duration: Duration of a slow request in seconds, None to ignore the durations
+        :param slow_call_rate: Rate of the slow requests opening the circuit
+        :param window_size: Number of the last requests of an endpoint whose outcomes are kept
+        :param min_calls: Minimum number of the kept requests for the circuit to open
+        :param open_duration: Time in seconds after which an open circuit lets the probes through
+        :param half_open_probes: Number of the probe requests sent at the same time
+        :param on_transition: Called with the endpoint, the old and the new state on each transition
+        """
+        self._failure_rate: float = failure_rate
+        self._slow_call_duration: Optional[float] = slow_call_duration
+        self._slow_call_rate: float = slow_call_rate
+        self._window_size: int = window_size
+        self._min_calls: int = min(min_calls, window_size)
+        self._open_duration: float = open_duration
+        self._half_open_probes: int = half_open_probes
+        self._on_transition: Optional[Callable[[str, CircuitState, CircuitState], None]] = on_transition
+        self._circuits: Dict[str, _Circuit] = {}
+        self._lock: Lock = Lock()
+        self._transitions: Dict[CircuitState, int] = {state: 0 for state in CircuitState}
+        self._rejected: int = 0
+
+    def state(self, endpoint: str) -> CircuitState:
+        circuit = self._circuits.get(endpoint)
+        return CircuitState.CLOSED if circuit is None else circuit.state
+
+    @property
+    def states(self) -> Dict[str, CircuitState]:
+        """
+        Current state of the circuit of each endpoint which has been requested
+        """
+        with self._lock:
+            return {endpoint: circuit.state for endpoint, circuit in self._circuits.items()}
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Counters of the breaker: the number of transitions to each state (`opened`, `half_opened`
+        and `closed`), and of the requests `rejected` by an open circuit.
+        """
+        return {
+            'opened': self._transitions[CircuitState.OPEN],
+            'half_opened': self._transitions[CircuitState.HALF_OPEN],
+            'closed': self._transitions[CircuitState.CLOSED],
+            'rejected': self._rejected,
+        }
+
+    @staticmethod
+    def failure(error: Optional[SparqlException]) -> bool:
+        """
+        :return: True if the error shows that the endpoint is failing, False for a client error (or None)
+        """
+        if isinstance(error, SparqlProtocolException):
+            return error.code >= FAILURE_STATUS_MIN or error.code == STATUS_TOO_MANY_REQUESTS
+        return error is not None
+
+    def call(self, endpoint: str) -> CircuitCall:
+        """
+        Lets a request to the endpoint through
+        :return: Context manager of the request, recording its outcome
+        :raise SparqlCircuitOpenException: If the circuit of the endpoint is open
+        """
+        transitions = []
+        try:
+            with self._lock:
+                circuit = self._circuits.get(endpoint)
+                if circuit is None:
+                    circuit = self._circuits[endpoint] = _Circuit(self._window_size)
+                if circuit.state is CircuitState.OPEN:
+                    retry_in = circuit.opened_at + self._open_duration - monotonic()
+                    if retry_in > 0:
+                        self._rejected += 1
+                        raise SparqlCircuitOpenException(endpoint, retry_in)
+                    self._transition(endpoint, circuit, CircuitState.HALF_OPEN, transitions)
+                probe = circuit.state is CircuitState.HALF_OPEN
+                if probe:
+                    if circuit.probes >= self._half_open_probes:
+                        self._rejected += 1
+                        raise SparqlCircuitOpenException(endpoint, 0.0)
+                    circuit.probes += 1
+        finally:
+            self._notify(transitions)
+        return CircuitCall(self, endpoint, probe)
+
+    def record(self, endpoint: str, probe: bool, duration: float, error: Optional[SparqlException]) -> None:
+        """
+        Records the outcome of a request let through by :func:`call`
+        """
+        failed = self.failure(error)
+        slow = self._slow_call_duration is not None and duration >= self._slow_call_duration
+        transitions = []
+        with self._lock:
+            circuit = self._circuits[endpoint]
+            if probe:
+                circuit.probes -= 1
+            if circuit.state is CircuitState.HALF_OPEN and probe:
+                if failed or slow:
+                    self._open(endpoint, circuit, transitions)
+                else:
+                    circuit.reset()
+                    self._transition(endpoint, circuit, CircuitState.CLOSED, transitions)
+            elif circuit.state is CircuitState.CLOSED:
+                circuit.add(failed, slow)
+                calls = len(circuit.outcomes)
+                if calls >= self._min_calls and (
+                        circuit.failures >= self._failure_rate * calls
+                        or circuit.slow_calls >= self._slow_call_rate * calls
+                ):
+                    self._open(endpoint, circuit, transitions)
+        self._notify(transitions)
+
+    def release(self, endpoint: str, probe: bool) -> None:
+        """
+        Ends a request let through by :func:`call` without an outcome
+        """
+        if probe:
+            with self._lock:
+                self._circuits[endpoint].probes -= 1
+
+    def reset(self, endpoint: Optional[str] = None) -> None:
+        """
+        Closes the circuit of the endpoint, or of all the endpoints, forgetting the past requests
+        """
+        transitions = []
+        with self._lock:
+            for name, circuit in self._circuits.items():
+                if endpoint is None or name == endpoint:
+                    circuit.reset()
+                    if circuit.state is not CircuitState.CLOSED:
+                        self._transition(name, circuit, CircuitState.CLOSED, transitions)
+        self._notify(transitions)
+
+    def _open(self, endpoint: str, circuit: _Circuit, transitions: List) -> None:
+        circuit.opened_at = monotonic()
+        circuit.reset()
+        self._transition(endpoint, circuit, CircuitState.OPEN, transitions)
+
+    def _transition(self, endpoint: str, circuit: _Circuit, state: CircuitState, transitions: List) -> None:
+        transitions.append((endpoint, circuit.state, state))
+        circuit.state = state
+        self._transitions[state] += 1
+
+    def _notify(self, transitions: List[Tuple[str, CircuitState, CircuitState]]) -> None:
+        # Called outside the lock, the callback may use the breaker
+        if self._on_transition is not None:
+            for endpoint, old, new in transitions:
+                self._on_transition(endpoint, old, new)
@@ -0,0 +1,230 @@
+from copy import deepcopy
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, Optional, Sequence, Tuple
+from urllib.parse import quote_plus, urlencode
+
+CONTENT_TYPE_HEADER = 'Content-Type'
+
+# Lower-case name of the User-Agent header, left out of the cache keys
+USER_AGENT_HEADER = 'user-agent'
+
+# Number of the preambles of distinct prefix selections kept by a snapshot
+MAX_PREAMBLES = 1024
+
+
+class ObservedDict(dict):
+    """
+    Dictionary calling `on_change` after each change of its content
+    """
+    __slots__ = ('_on_change',)
+
+    def __init__(self, on_change: Callable[[], None], *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._on_change: Callable[[], None] = on_change
+
+    def __setitem__(self, key, value) -> None:
+        super().__setitem__(key, value)
+        self._on_change()
+
+    def __delitem__(self, key) -> None:
+        super().__delitem__(key)
+        self._on_change()
+
+    def __ior__(self, other):
+        super().__ior__(other)
+        self._on_change()
+        return self
+
+    def clear(self) -> None:
+        super().clear()
+        self._on_change()
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._on_change()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._on_change()
+        return item
+
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        self._on_change()
+        return value
+
+    def update(self, *args, **kwargs) -> None:
+        super().update(*args, **kwargs)
+        self._on_change()
+
+    def __reduce__(self):
+        # Copied (or pickled) as a plain dictionary, without the observer
+        return dict, (dict(self),)
+
+
+class ObservedList(list):
+    """
+    List calling `on_change` after each change of its content
+    """
+    __slots__ = ('_on_change',)
+
+    def __init__(self, on_change: Callable[[], None], *args):
+        super().__init__(*args)
+        self._on_change: Callable[[], None] = on_change
+
+    def __setitem__(self, index, value) -> None:
+        super().__setitem__(index, value)
+        self._on_change()
+
+    def __delitem__(self, index) -> None:
+        super().__delitem__(index)
+        self._on_change()
+
+    def __iadd__(self, other):
+        super().__iadd__(other)
+        self._on_change()
+        return self
+
+    def __imul__(self, other):
+        super().__imul__(other)
+        self._on_change()
+        return self
+
+    def append(self, value) -> None:
+        super().append(value)
+        self._on_change()
+
+    def extend(self, values) -> None:
+        super().extend(values)
+        self._on_change()
+
+    def insert(self, index, value) -> None:
+        super().insert(index, value)
+        self._on_change()
+
+    def remove(self, value) -> None:
+        super().remove(value)
+        self._on_change()
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._on_change()
+        return value
+
+    def clear(self) -> None:
+        super().clear()
+        self._on_change()
+
+    def sort(self, *args, **kwargs) -> None:
+        super().sort(*args, **kwargs)
+        self._on_change()
+
+    def reverse(self) -> None:
+        super().reverse()
+        self._on_change()
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+class ConfigSnapshot:
+    """
+    Copy of the configuration of a service (headers, prefixes, graphs and request arguments),
+    which is never changed. The queries of the service share it until they change their own
+    configuration. The parts of the requests derived from it are computed once, on first use.
+
+    Its containers must not be modified.
+    """
+
+    def __init__(
+            self,
+            headers: Mapping[str, str],
+            prefixes: Mapping[str, str],
+            default_graphs: Sequence[str],
+            named_graphs: Sequence[str],
+            request_kwargs: Mapping[str, Any]
+    ):
+        self.headers: Dict[str, str] = dict(headers)
+        self.prefixes: Dict[str, str] = dict(prefixes)
+        self.default_graphs: List[str] = list(default_graphs)
+        self.named_graphs: List[str] = list(named_graphs)
+        self.request_kwargs: Dict[str, Any] = deepcopy(dict(request_kwargs))
+        self._graph_params: Dict[str, List[Tuple[str, bytes]]] = {}
+        self._graph_string: Dict[str, str] = {}
+        self._prefix_preamble: Dict[Optional[FrozenSet[str]], str] = {}
+        self._quoted_preamble: Dict[Tuple[str, Optional[FrozenSet[str]]], str] = {}
+        self._request_headers: Dict[Optional[str], Dict[str, str]] = {}
+        self._header_items: Dict[Optional[str], Tuple[Tuple[str, str], ...]] = {}
+
+    def graph_params(self, encoding: str) -> List[Tuple[str, bytes]]:
+        """
+        :return: The encoded default-graph-uri and named-graph-uri request parameters
+        """
+        params = self._graph_params.get(encoding)
+        if params is None:
+            params = self._graph_params[encoding] = \
+                [('default-graph-uri', uri.encode(encoding)) for uri in self.default_graphs] \
+                + [('named-graph-uri', uri.encode(encoding)) for uri in self.named_graphs]
+        return params
+
+    def graph_string(self, encoding: str) -> str:
+        """
+        :return: The url-encoded graph parameters, e.g. 'default-graph-uri=...&named-graph-uri=...'
+        """
+        graph_string = self._graph_string.get(encoding)
+        if graph_string is None:
+            graph_string = self._graph_string[encoding] = urlencode(self.graph_params(encoding))
+        return graph_string
+
+    def prefix_preamble(self, names: Optional[FrozenSet[str]] = None) -> str:
+        """
+        :param names: Names of the prefixes to declare, None for all of them
+        :return: The PREFIX declarations prepended to the statements, e.g. 'PREFIX a: <uri> PREFIX b: <uri> '
+        """
+        preamble = self._prefix_preamble.get(names)
+        if preamble is None:
+            if len(self._prefix_preamble) >= MAX_PREAMBLES:
+                self._prefix_preamble.clear()
+            preamble = self._prefix_preamble[names] = ''.join(
+                f'PREFIX {prefix}: <{uri}> ' for prefix, uri in self.prefixes.items()
+                if names is None or prefix in names
+            )
+        return preamble
+
+    def quoted_preamble(self, encoding: str, names: Optional[FrozenSet[str]] = None) -> str:
+        """
+        :return: The url-encoded :func:`prefix_preamble`. URL encoding is done byte by byte,
+                 so the quoted preamble followed by the quoted statement is the quoted query.
+        """
+        quoted = self._quoted_preamble.get((encoding, names))
+        if quoted is None:
+            if len(self._quoted_preamble) >= MAX_PREAMBLES:
+                self._quoted_preamble.clear()
+            quoted = self._quoted_preamble[encoding, names] = quote_plus(self.prefix_preamble(names).encode(encoding))
+        return quoted
+
+    def request_headers(self, content_type: Optional[str]) -> Dict[str, str]:
+        """
+        :param content_type: Content type of the request body, if any
+        :return: Headers of the requests, do not modify
+        """
+        headers = self._request_headers.get(content_type)
+        if headers is None:
+            headers = dict(self.headers)
+            if content_type:
+                headers[CONTENT_TYPE_HEADER] = content_type
+            self._request_headers[content_type] = headers
+        return headers
+
+    def header_items(self, content_type: Optional[str]) -> Tuple[Tuple[str, str], ...]:
+        """
+        :return: The headers of the requests as sorted pairs, identifying them in a cache key. The User-Agent
+            is left out: it does not change the result, and changes with the version of the library.
+        """
+        items = self._header_items.get(content_type)
+        if items is None:
+            items = self._header_items[content_type] = tuple(sorted(
+                (name, value) for name, value in self.request_headers(content_type).items()
+                if name.lower() != USER_AGENT_HEADER
+            ))
+        return items
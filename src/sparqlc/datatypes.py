@@ -1,10 +1,9 @@
 import re
 from abc import abstractmethod
-from typing import Any, Optional
+from itertools import islice
+from threading import Lock
+from typing import Any, Callable, Dict, FrozenSet, Iterable, ItemsView, Iterator, Optional
 
-# The purpose of this construction is to use shared strings when
-# they have the same value. This way comparisons can happen on the
-# memory address rather than looping through the content.
 XSD_STRING = 'http://www.w3.org/2001/XMLSchema#string'
 XSD_INT = 'http://www.w3.org/2001/XMLSchema#int'
 XSD_LONG = 'http://www.w3.org/2001/XMLSchema#long'
@@ -17,43 +16,120 @@ XSD_DATE = 'http://www.w3.org/2001/XMLSchema#date'
 XSD_TIME = 'http://www.w3.org/2001/XMLSchema#time'
 XSD_BOOLEAN = 'http://www.w3.org/2001/XMLSchema#boolean'
 
-datatype_dict = {
-    '': '',
-    XSD_STRING: XSD_STRING,
-    XSD_INT: XSD_INT,
-    XSD_LONG: XSD_LONG,
-    XSD_DOUBLE: XSD_DOUBLE,
-    XSD_FLOAT: XSD_FLOAT,
-    XSD_INTEGER: XSD_INTEGER,
-    XSD_DECIMAL: XSD_DECIMAL,
-    XSD_DATETIME: XSD_DATETIME,
-    XSD_DATE: XSD_DATE,
-    XSD_TIME: XSD_TIME,
-    XSD_BOOLEAN: XSD_BOOLEAN
-}
+
+class InternTable:
+    """
+    Bounded table of shared instances, keyed by their string value.
+
+    Calling the table returns the instance stored for the value, creating
+    it by `factory` if there is none. Once the table is full, the oldest
+    quarter of the entries is dropped to make room, except the pinned ones.
+    Lookups do not lock; inserting and dropping entries is guarded by a lock,
+    so the table can be shared by threads.
+    """
+
+    def __init__(self, maxsize: int, factory: Callable[[str], Any] = str, pinned: Iterable[str] = ()):
+        self._maxsize: int = maxsize
+        self._factory: Callable[[str], Any] = factory
+        self._pinned: FrozenSet[str] = frozenset(pinned)
+        self._table: Dict[str, Any] = {value: factory(value) for value in self._pinned}
+        self._lock: Lock = Lock()
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    def __call__(self, value: str) -> Any:
+        instance = self._table.get(value)
+        if instance is None:
+            instance = self._insert(value)
+        return instance
+
+    def _insert(self, value: str) -> Any:
+        with self._lock:
+            table = self._table
+            instance = table.get(value)
+            if instance is not None:
+                return instance
+            instance = self._factory(value)
+            if len(table) >= self._maxsize:
+                evicted = max(1, self._maxsize // 4)
+                pinned = self._pinned
+                for key in list(islice((key for key in table if key not in pinned), evicted)):
+                    del table[key]
+                if len(table) >= self._maxsize:
+                    # All entries are pinned
+                    return instance
+            table[value] = instance
+            return instance
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def __contains__(self, value: str) -> bool:
+        return value in self._table
+
+    def __getitem__(self, value: str) -> Any:
+        return self._table[value]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._table)
+
+    def items(self) -> ItemsView[str, Any]:
+        return self._table.items()
+
+    def pop(self, value: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._table.pop(value, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._table = {value: self._table[value] for value in self._pinned}
+
+
+# The purpose of this construction is to use shared strings when
+# they have the same value. This way comparisons can happen on the
+# memory address rather than looping through the content.
+# Maximum number of datatypes shared by :func:`Datatype`:
+DATATYPE_TABLE_SIZE = 1024
+
+datatype_table = InternTable(DATATYPE_TABLE_SIZE, pinned=[
+    '',
+    XSD_STRING,
+    XSD_INT,
+    XSD_LONG,
+    XSD_DOUBLE,
+    XSD_FLOAT,
+    XSD_INTEGER,
+    XSD_DECIMAL,
+    XSD_DATETIME,
+    XSD_DATE,
+    XSD_TIME,
+    XSD_BOOLEAN,
+])
+# Former name of the table, when it was an unbounded dict
+datatype_dict = datatype_table
 
 
 # noinspection PyPep8Naming
 def Datatype(value):
     """
-    Replace the string with a shared string.
-    intern() only works for plain strings - not unicode.
+    Replace the string with a shared string from :data:`datatype_table`.
     We make it look like a class, because it conceptually could be.
     """
-    if value is None:
-        r = None
-    elif value in datatype_dict:
-        r = datatype_dict[value]
-    else:
-        r = datatype_dict[value] = value
-    return r
+    return None if value is None else datatype_table(value)
 
 
 class RDFTerm:
     """
     Super class containing methods to override. :class:`IRI`,
     :class:`Literal` and :class:`BlankNode` all inherit from :class:`RDFTerm`.
+
+    The terms are hashable and should be treated as immutable: the hash is
+    computed on first use and cached in the instance. The classes use
+    `__slots__` to keep large result sets compact in memory.
     """
+    __slots__ = ('value', '_hash')
     __allow_access_to_unprotected_subobjects__ = {'n3': 1}
 
     def __init__(self, value: str = None):
@@ -65,6 +141,23 @@ class RDFTerm:
     def __eq__(self, other) -> bool:
         return type(self) == type(other) and self.value == other.value
 
+    def __hash__(self) -> int:
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = h = hash(self._key())
+            return h
+
+    def _key(self) -> tuple:
+        """
+        :return: The values the equality of the terms is based on
+        """
+        return type(self), self.value
+
+    def __reduce__(self):
+        # The cached hash of strings is not stable across processes, leave it out
+        return type(self), (self.value,)
+
     @abstractmethod
     def n3(self) -> str:
         """
@@ -105,8 +198,10 @@ class RDFTerm:
 
 class IRI(RDFTerm):
     """ An RDF resource. """
+    __slots__ = ()
+
     def __init__(self, value: str):
-        super().__init__(value)
+        self.value = value
 
     def n3(self) -> str:
         return f'<{self.value}>'
@@ -116,8 +211,10 @@ class Literal(RDFTerm):
     """
     Literals. These can take a data type or a language code.
     """
+    __slots__ = ('lang', 'datatype')
+
     def __init__(self, value: Any, datatype: str = None, lang: str = None):
-        super().__init__(str(value))
+        self.value = str(value)
         self.lang = lang
         self.datatype = datatype
 
@@ -127,6 +224,15 @@ class Literal(RDFTerm):
                self.lang == other.lang and \
                self.datatype == other.datatype
 
+    # Overriding __eq__ resets the inherited __hash__
+    __hash__ = RDFTerm.__hash__
+
+    def _key(self) -> tuple:
+        return type(self), self.value, self.lang, self.datatype
+
+    def __reduce__(self):
+        return type(self), (self.value, self.datatype, self.lang)
+
     def n3(self) -> str:
         n3_value = self._n3_quote(self.value)
         n3_type = f'^^<{self.datatype}>' if self.datatype is not None else ''
@@ -136,8 +242,10 @@ class Literal(RDFTerm):
 
 class BlankNode(RDFTerm):
     """ Blank node. Similar to `IRI` but lacks a stable identifier. """
+    __slots__ = ()
+
     def __init__(self, value):
-        super().__init__(value)
+        self.value = value
 
     def n3(self):
         return f'_:{self.value}'
@@ -0,0 +1,467 @@
+import json
+import mmap
+import os
+from collections import OrderedDict
+from gzip import decompress, GzipFile
+from hashlib import sha256
+from io import IOBase
+from tempfile import mkstemp
+from threading import Lock
+from time import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from .result_cache import DEFAULT_TTL, ResultCacheBase
+
+# Default maximum total size of the compressed entries of a DiskResultCache
+DEFAULT_DISK_CACHE_SIZE = 1024 * 1024 * 1024
+
+# gzip compression level of the cached bodies, favouring speed over the last few percent
+COMPRESS_LEVEL = 6
+
+ENTRY_SUFFIX = '.entry'
+TMP_SUFFIX = '.tmp'
+
+# First bytes of an entry file, followed by the JSON header line and the gzip-compressed body
+ENTRY_MAGIC = b'SPARQLC-CACHE-1 '
+
+# Maximum length of the header line read from an entry file
+MAX_HEADER_SIZE = 64 * 1024
+
+# Temporary files older than this (in seconds) were left behind by writers which did not finish
+TMP_MAX_AGE = 3600.0
+
+# Number of writes after which the directory is scanned again, to account for the entries written,
+# used and removed by the other processes
+RESCAN_INTERVAL = 100
+
+
+class MappedFile(IOBase):
+    """
+    Read-only stream over a memory-mapped file, from the given offset. `on_close` is called once it is closed.
+    """
+
+    def __init__(self, mapped: mmap.mmap, offset: int, on_close: Optional[Callable[[], None]] = None):
+        super().__init__()
+        self._mapped: Optional[mmap.mmap] = mapped
+        self._pos: int = offset
+        self._on_close: Optional[Callable[[], None]] = on_close
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        self._checkClosed()
+        end = len(self._mapped) if size is None or size < 0 else min(self._pos + size, len(self._mapped))
+        data = self._mapped[self._pos:end]
+        self._pos = max(end, self._pos)
+        return data
+
+    def close(self) -> None:
+        if not self.closed:
+            self._mapped = None
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close()
+        super().close()
+
+
+class _EntryStream(GzipFile):
+    """
+    Decompressing stream over the body of an entry, closing the mapped file it reads
+    (a `GzipFile` leaves the file object it is given open)
+    """
+
+    def close(self) -> None:
+        fileobj = self.fileobj
+        try:
+            super().close()
+        finally:
+            if fileobj is not None:
+                fileobj.close()
+
+
+class DiskCachedResult:
+    """
+    Result held by a :class:`DiskResultCache`, the counterpart of :class:`CachedResult`:
+    the memory-mapped entry file, whose compressed body is decompressed while it is read.
+
+    The file is unmapped once the streams opened by :func:`open` are all closed (or by :func:`close`),
+    so that the process does not keep the evicted entries mapped. It is mapped again if it is read again,
+    unless the entry has been replaced or removed in the meantime.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            mapped: mmap.mmap,
+            offset: int,
+            header: Dict[str, Any],
+            expired: bool,
+            file_id: Tuple[int, int]
+    ):
+        """
+        :param file_id: Device and inode of the entry file, which a new entry replaces
+        """
+        self.content_type: Optional[str] = header.get('content_type')
+        # Size of the uncompressed body
+        self.size: int = header.get('size', 0)
+        self.etag: Optional[str] = header.get('etag')
+        self.last_modified: Optional[str] = header.get('last_modified')
+        self.expired: bool = expired
+        self._path: str = path
+        self._file_id: Tuple[int, int] = file_id
+        self._mapped: Optional[mmap.mmap] = mapped
+        self._offset: int = offset
+        self._streams: int = 0
+        self._lock: Lock = Lock()
+
+    @property
+    def revalidatable(self) -> bool:
+        return self.etag is not None or self.last_modified is not None
+
+    @property
+    def body(self) -> bytes:
+        """
+        The whole body, read at once: the file stays mapped until :func:`close`
+        :raise OSError: If the entry has been replaced or removed since the file was unmapped
+        """
+        with self._lock:
+            compressed = self._map()[self._offset:]
+        return decompress(compressed)
+
+    def open(self) -> IOBase:
+        """
+        :return: New stream reading the body
+        :raise OSError: If the entry has been replaced or removed since the file was unmapped
+        """
+        with self._lock:
+            mapped = self._map()
+            self._streams += 1
+        return _EntryStream(fileobj=MappedFile(mapped, self._offset, self._release), mode='rb')
+
+    def close(self) -> None:
+        """
+        Unmaps the file, unless a stream is reading it: it is then unmapped once the streams are closed
+        """
+        with self._lock:
+            if self._streams == 0:
+                self._unmap()
+
+    def _release(self) -> None:
+        with self._lock:
+            self._streams -= 1
+            if self._streams == 0:
+                self._unmap()
+
+    def _unmap(self) -> None:
+        # Called with the lock held
+        mapped, self._mapped = self._mapped, None
+        if mapped is not None:
+            mapped.close()
+
+    def _map(self) -> mmap.mmap:
+        # Called with the lock held
+        if self._mapped is None:
+            self._mapped = self._remap()
+        return self._mapped
+
+    def _remap(self) -> mmap.mmap:
+        with open(self._path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            if (stat.st_dev, stat.st_ino) != self._file_id:
+                raise FileNotFoundError(f'The cache entry {self._path} has been replaced')
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class DiskResultCache(ResultCacheBase):
+    """
+    Cache of query responses in a directory, which survives restarts of the process
+    and can be shared by the processes of a host. Each result is a file holding
+    the gzip-compressed response body, its content type and validators. A hit is read
+    through a memory map and decompressed while it is parsed.
+
+    The files are written to a temporary file first and then renamed, so the readers
+    never see a partial entry. The least recently used results are evicted once the entries
+    exceed `max_size` bytes on disk. The cache keeps the size and the order of use of the entries
+    in memory, so a write does not scan the directory: it is scanned again every `RESCAN_INTERVAL`
+    writes, taking in the entries of the other processes and dropping the results older than `ttl` seconds.
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            max_size: int = DEFAULT_DISK_CACHE_SIZE,
+            ttl: Optional[float] = DEFAULT_TTL,
+            max_entry_size: Optional[int] = None
+    ):
+        """
+        :param directory: Directory of the cache, created if it does not exist
+        :param max_size: Maximum total size of the (compressed) entry files in bytes
+        :param ttl: Time in seconds for which a result is used, None to use it until evicted
+        :param max_entry_size: Maximum size of a cached (uncompressed) body in bytes,
+                               a quarter of `max_size` by default
+        """
+        super().__init__(max_size, ttl, max_entry_size)
+        self._directory: str = directory
+        self._lock: Lock = Lock()
+        # Size of each entry file by path, the least recently used first, None until the directory is scanned
+        self._index: Optional[OrderedDict[str, int]] = None
+        self._indexed_size: int = 0
+        self._writes: int = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def directory(self) -> str:
+        return self._directory
+
+    def path(self, key: Hashable) -> str:
+        """
+        :return: Path of the entry file of the request, named by the hash of the canonical serialization
+            of the key (see :func:`QueryBase.cache_key`), the same in every process
+        """
+        return os.path.join(self._directory, sha256(_serialize(key)).hexdigest() + ENTRY_SUFFIX)
+
+    @property
+    def size(self) -> int:
+        return sum(size for _, size, _ in self._entries(time()))
+
+    def __len__(self) -> int:
+        return len(self._entries(time()))
+
+    def __contains__(self, key: Hashable) -> bool:
+        try:
+            return not self._expired(os.stat(self.path(key)).st_mtime, time())
+        except OSError:
+            return False
+
+    def get(self, key: Hashable) -> Optional[DiskCachedResult]:
+        path = self.path(key)
+        result = self._open(path, time())
+        if result is not None and result.expired:
+            result.close()
+            if not result.revalidatable:
+                _remove(path)
+                with self._lock:
+                    self._expirations += 1
+                    self._unindex(path)
+            result = None
+        with self._lock:
+            if result is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return result
+
+    def stale(self, key: Hashable) -> Optional[DiskCachedResult]:
+        result = self._open(self.path(key), time())
+        if result is not None and result.expired and result.revalidatable:
+            return result
+        if result is not None:
+            result.close()
+        return None
+
+    def refresh(self, key: Hashable) -> bool:
+        # The modification time is the time of the last validation
+        try:
+            os.utime(self.path(key))
+        except OSError:
+            return False
+        with self._lock:
+            self._revalidations += 1
+        return True
+
+    def _open(self, path: str, now: float) -> Optional[DiskCachedResult]:
+        """
+        Maps the entry file, marking the use of the entry for the eviction
+        :return: The result of the entry, None if there is none
+        """
+        try:
+            with open(path, 'rb') as file:
+                stat = os.fstat(file.fileno())
+                mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # e.g. missing, or empty (which cannot be mapped)
+            return None
+        end = mapped.find(b'\n')
+        header = _parse_header(mapped[:end]) if end >= 0 else None
+        if header is None:
+            # Not written by this version, or damaged
+            mapped.close()
+            _remove(path)
+            return None
+        try:
+            os.utime(path, (now, stat.st_mtime))
+        except OSError:
+            pass
+        with self._lock:
+            if self._index is not None and path in self._index:
+                self._index.move_to_end(path)
+        return DiskCachedResult(
+            path, mapped, end + 1, header, self._expired(stat.st_mtime, now), (stat.st_dev, stat.st_ino)
+        )
+
+    def put(
+            self,
+            key: Hashable,
+            body: bytes,
+            content_type: Optional[str],
+            etag: Optional[str] = None,
+            last_modified: Optional[str] = None
+    ) -> bool:
+        if len(body) > self._max_entry_size:
+            return False
+        header = json.dumps({
+            'content_type': content_type, 'size': len(body), 'etag': etag, 'last_modified': last_modified
+        }).encode('utf-8')
+        path = self.path(key)
+        tmp_path = None
+        try:
+            fd, tmp_path = mkstemp(TMP_SUFFIX, dir=self._directory)
+            with os.fdopen(fd, 'wb') as file:
+                file.write(ENTRY_MAGIC + header + b'\n')
+                with GzipFile(fileobj=file, mode='wb', compresslevel=COMPRESS_LEVEL, mtime=0) as gz:
+                    gz.write(body)
+                file.flush()
+                os.fsync(file.fileno())
+                entry_size = file.tell()
+            os.replace(tmp_path, path)
+        except OSError:
+            # The result is just not cached, e.g. when the disk is full
+            if tmp_path is not None:
+                _remove(tmp_path)
+            return False
+        with self._lock:
+            self._writes += 1
+            rescan = self._index is None or self._writes % RESCAN_INTERVAL == 0
+            if not rescan:
+                self._unindex(path)
+                self._index[path] = entry_size
+                self._indexed_size += entry_size
+        if rescan:
+            self._scan()
+        self._prune()
+        return True
+
+    def pop(self, key: Hashable) -> bool:
+        path = self.path(key)
+        with self._lock:
+            self._unindex(path)
+        return _remove(path)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._index = None
+        for _, _, path in self._entries(None):
+            _remove(path)
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self._ttl is not None and now - created >= self._ttl
+
+    def _entries(self, now: Optional[float]) -> List[Tuple[float, int, str]]:
+        """
+        Lists the entry files, dropping the expired ones which cannot be revalidated
+        (if `now` is given) and the temporary files left behind
+        :return: Last use time, size and path of each entry
+        """
+        entries = []
+        try:
+            scan = list(os.scandir(self._directory))
+        except FileNotFoundError:
+            return entries
+        for entry in scan:
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith(ENTRY_SUFFIX):
+                if now is not None and self._expired(stat.st_mtime, now) and not _revalidatable(entry.path):
+                    if _remove(entry.path):
+                        with self._lock:
+                            self._expirations += 1
+                            self._unindex(entry.path)
+                else:
+                    entries.append((stat.st_atime, stat.st_size, entry.path))
+            elif entry.name.endswith(TMP_SUFFIX) and now is not None and now - stat.st_mtime > TMP_MAX_AGE:
+                _remove(entry.path)
+        return entries
+
+    def _unindex(self, path: str) -> None:
+        # Called with the lock held
+        if self._index is not None:
+            self._indexed_size -= self._index.pop(path, 0)
+
+    def _scan(self) -> None:
+        """
+        Rebuilds the index of the entries from the directory
+        """
+        entries = self._entries(time())
+        entries.sort()
+        with self._lock:
+            self._index = OrderedDict((path, entry_size) for _, entry_size, path in entries)
+            self._indexed_size = sum(self._index.values())
+
+    def _prune(self) -> None:
+        """
+        Evicts the least recently used entries of the index over the maximum size
+        """
+        evicted = []
+        with self._lock:
+            while self._index and self._indexed_size > self._max_size:
+                path, entry_size = self._index.popitem(last=False)
+                self._indexed_size -= entry_size
+                evicted.append(path)
+        for path in evicted:
+            if _remove(path):
+                with self._lock:
+                    self._evictions += 1
+
+
+def _serialize(key: Hashable) -> bytes:
+    """
+    :return: The key as JSON, its tuples as arrays and its bytes as tagged hexadecimal strings
+    """
+    return json.dumps(key, default=_serialize_value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _serialize_value(value: Any) -> Any:
+    if isinstance(value, bytes):
+        return {'bytes': value.hex()}
+    if isinstance(value, (set, frozenset)):
+        return {'set': sorted(_serialize(item).decode('utf-8') for item in value)}
+    raise TypeError(f'Cache key of type {type(value).__name__} cannot be serialized')
+
+
+def _parse_header(line: bytes) -> Optional[Dict[str, Any]]:
+    """
+    :return: The header of the entry from its first line, None if it is not valid
+    """
+    if not line.startswith(ENTRY_MAGIC):
+        return None
+    try:
+        header = json.loads(line[len(ENTRY_MAGIC):])
+    except ValueError:
+        return None
+    return header if isinstance(header, dict) else None
+
+
+def _revalidatable(path: str) -> bool:
+    """
+    :return: True if the entry has a validator, so that it is kept once stale
+    """
+    try:
+        with open(path, 'rb') as file:
+            header = _parse_header(file.readline(MAX_HEADER_SIZE).rstrip(b'\n'))
+    except OSError:
+        return False
+    return header is not None and (header.get('etag') is not None or header.get('last_modified') is not None)
+
+
+def _remove(path: str) -> bool:
+    """
+    :return: True if the file was removed, False if it did not exist (or could not be removed)
+    """
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
@@ -0,0 +1,175 @@
+from enum import Enum
+from threading import Lock
+from time import monotonic
+from typing import Any, Dict, List, Optional, Sequence
+
+from .circuit_breaker import CircuitBreaker
+from .exception import SparqlException, SparqlRateLimitException
+
+DEFAULT_MAX_FAILURES = 3
+DEFAULT_EJECTION_DURATION = 30.0
+# Weight of the last response time in the moving average of a replica
+DEFAULT_DECAY = 0.3
+
+
+class Balancing(Enum):
+    # Each replica in turn
+    ROUND_ROBIN = 'round-robin'
+    # The replica with the fewest requests in progress
+    LEAST_OUTSTANDING = 'least-outstanding'
+    # The replica with the lowest average response time, weighted by its requests in progress
+    EWMA = 'ewma'
+
+
+class _Replica:
+    def __init__(self, endpoint: str):
+        self.endpoint: str = endpoint
+        self.outstanding: int = 0
+        self.requests: int = 0
+        # Consecutive failures
+        self.failures: int = 0
+        # Exponentially weighted moving average of the response time, None until a request has succeeded
+        self.latency: Optional[float] = None
+        self.ejected_until: float = 0.0
+        self.ejections: int = 0
+        # Readmitted after an ejection, until a request succeeds
+        self.on_trial: bool = False
+
+    def score(self, balancing: Balancing) -> float:
+        if balancing is Balancing.LEAST_OUTSTANDING:
+            return self.outstanding
+        if balancing is Balancing.EWMA:
+            # The replicas not measured yet are tried first
+            return 0.0 if self.latency is None else self.latency * (self.outstanding + 1)
+        return 0.0
+
+
+class ReplicaCall:
+    """
+    Request sent to the replica :attr:`endpoint` picked by an :class:`EndpointPool`, a context manager
+    recording its outcome: a :class:`SparqlException` raised in it (unless it is a client error) is a failure.
+    """
+
+    def __init__(self, pool: 'EndpointPool', replica: _Replica):
+        self._pool: EndpointPool = pool
+        self._replica: _Replica = replica
+        self._start: float = monotonic()
+
+    @property
+    def endpoint(self) -> str:
+        return self._replica.endpoint
+
+    def __enter__(self) -> 'ReplicaCall':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if isinstance(exc_val, SparqlRateLimitException):
+            # Not sent, which says nothing about the replica
+            self._pool.release(self._replica, None, False)
+        elif exc_val is None or isinstance(exc_val, SparqlException):
+            self._pool.release(self._replica, monotonic() - self._start, CircuitBreaker.failure(exc_val))
+        else:
+            self._pool.release(self._replica, None, False)
+
+
+class EndpointPool:
+    """
+    Replicas of the same dataset, among which a replica is picked for each request by the `balancing`.
+    A replica whose last `max_failures` requests have failed (with a network error or a 5xx / 429 answer)
+    is ejected for `ejection_duration` seconds. It is then readmitted on trial: its first request
+    either confirms it, or ejects it again. If all the replicas are ejected, the one readmitted first is used.
+    """
+
+    def __init__(
+            self,
+            endpoints: Sequence[str],
+            balancing: Balancing = Balancing.LEAST_OUTSTANDING,
+            max_failures: int = DEFAULT_MAX_FAILURES,
+            ejection_duration: float = DEFAULT_EJECTION_DURATION,
+            decay: float = DEFAULT_DECAY
+    ):
+        """
+        :param endpoints: URLs of the replicas
+        :param balancing: How a replica is picked
+        :param max_failures: Number of consecutive failures ejecting a replica
+        :param ejection_duration: Time in seconds for which a failing replica is not used
+        :param decay: Weight of the last response time in the average response time of a replica (EWMA)
+        """
+        if not endpoints:
+            raise ValueError('No endpoint given')
+        self._replicas: List[_Replica] = [_Replica(endpoint.strip()) for endpoint in endpoints]
+        self._balancing: Balancing = balancing
+        self._max_failures: int = max_failures
+        self._ejection_duration: float = ejection_duration
+        self._decay: float = decay
+        self._next: int = 0
+        self._lock: Lock = Lock()
+
+    @property
+    def endpoints(self) -> List[str]:
+        return [replica.endpoint for replica in self._replicas]
+
+    @property
+    def balancing(self) -> Balancing:
+        return self._balancing
+
+    def acquire(self) -> ReplicaCall:
+        """
+        Picks the replica of a request
+        :return: Context manager of the request, recording its outcome
+        """
+        with self._lock:
+            now = monotonic()
+            count = len(self._replicas)
+            # Starting from the next replica in turn, which breaks the ties
+            rotated = [self._replicas[(self._next + i) % count] for i in range(count)]
+            self._next = (self._next + 1) % count
+            admitted = [replica for replica in rotated if replica.ejected_until <= now]
+            if admitted:
+                replica = min(admitted, key=lambda r: r.score(self._balancing))
+            else:
+                replica = min(rotated, key=lambda r: r.ejected_until)
+            replica.outstanding += 1
+            return ReplicaCall(self, replica)
+
+    def release(self, replica: _Replica, duration: Optional[float], failed: bool) -> None:
+        """
+        Records the outcome of a request, None `duration` if it has none (e.g. it was cancelled)
+        """
+        with self._lock:
+            replica.outstanding -= 1
+            if duration is None:
+                return
+            replica.requests += 1
+            if failed:
+                replica.failures += 1
+                if replica.on_trial or replica.failures >= self._max_failures:
+                    replica.ejected_until = monotonic() + self._ejection_duration
+                    replica.ejections += 1
+                    replica.on_trial = True
+            else:
+                replica.failures = 0
+                replica.on_trial = False
+                replica.latency = duration if replica.latency is None \
+                    else self._decay * duration + (1.0 - self._decay) * replica.latency
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        State of each replica: the number of requests in progress (`outstanding`), of the `requests` made
+        and of the consecutive `failures`, the average response time in seconds (`latency`), whether
+        it is `ejected` and the number of its `ejections`.
+        """
+        with self._lock:
+            now = monotonic()
+            return {
+                replica.endpoint: {
+                    'outstanding': replica.outstanding,
+                    'requests': replica.requests,
+                    'failures': replica.failures,
+                    'latency': replica.latency,
+                    'ejected': replica.ejected_until > now,
+                    'ejections': replica.ejections,
+                }
+                for replica in self._replicas
+            }
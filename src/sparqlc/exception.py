@@ -1,3 +1,6 @@
+from typing import Optional
+
+
 class SparqlException(Exception):
     """ Sparql generic exception """
     def __init__(self, message: str):
@@ -6,9 +9,29 @@ class SparqlException(Exception):
 
 class SparqlProtocolException(SparqlException):
     """ Sparql HTTP related exception """
-    def __init__(self, code: int, message: str):
+    def __init__(self, code: int, message: str, retry_after: Optional[float] = None):
         super().__init__(message)
         self.code: int = code
+        # Seconds to wait before sending the request again, as asked by the endpoint
+        self.retry_after: Optional[float] = retry_after
+
+
+class SparqlCircuitOpenException(SparqlException):
+    """ Sparql exception raised without sending the request, as the circuit of the endpoint is open """
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f'Circuit of {endpoint} is open')
+        self.endpoint: str = endpoint
+        # Seconds after which the circuit lets a probe request through
+        self.retry_in: float = retry_in
+
+
+class SparqlRateLimitException(SparqlException):
+    """ Sparql exception raised without sending the request, as the rate limit of the endpoint is reached """
+    def __init__(self, endpoint: str, retry_in: Optional[float]):
+        super().__init__(f'Rate limit of {endpoint} reached')
+        self.endpoint: str = endpoint
+        # Seconds after which a request could be sent, None if it waits for a request in progress to end
+        self.retry_in: Optional[float] = retry_in
 
 
 class SparqlParseException(SparqlException):
@@ -0,0 +1,293 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Condition, Lock
+from time import monotonic
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+from .retry import RetryPolicy
+
+DEFAULT_PERCENTILE = 0.95
+DEFAULT_WINDOW_SIZE = 100
+DEFAULT_MIN_SAMPLES = 20
+DEFAULT_MAX_EXTRA_LOAD = 0.05
+DEFAULT_MAX_BURST = 10.0
+DEFAULT_MAX_THREADS = 16
+
+T = TypeVar('T')
+
+
+class _Race:
+    """
+    Requests sent in the threads of an executor for the same response: the first one received wins,
+    the others are discarded once received
+    """
+
+    def __init__(self, discard: Callable[[T], None], executor: ThreadPoolExecutor, threads: BoundedSemaphore):
+        """
+        :param threads: Free threads of the executor, a request is only sent if one is free
+        """
+        self._discard: Callable[[T], None] = discard
+        self._executor: ThreadPoolExecutor = executor
+        self._threads: BoundedSemaphore = threads
+        self._condition: Condition = Condition()
+        self._running: int = 0
+        # Whether the winner is a hedge, and its response
+        self._winner: Optional[Tuple[bool, T]] = None
+        self._error: Optional[BaseException] = None
+        self._abandoned: bool = False
+
+    def start(self, send: Callable[[], T], hedge: bool) -> bool:
+        """
+        :return: True if the request has been sent, False if no thread is free
+        """
+        if not self._threads.acquire(blocking=False):
+            return False
+        with self._condition:
+            self._running += 1
+        self._executor.submit(self._run, send, hedge)
+        return True
+
+    def _run(self, send: Callable[[], T], hedge: bool) -> None:
+        try:
+            self._send(send, hedge)
+        finally:
+            self._threads.release()
+
+    def _send(self, send: Callable[[], T], hedge: bool) -> None:
+        try:
+            response = send()
+        except BaseException as error:
+            with self._condition:
+                self._running -= 1
+                # The error of the first request is raised if both fail
+                if self._error is None or not hedge:
+                    self._error = error
+                self._condition.notify_all()
+            return
+        with self._condition:
+            self._running -= 1
+            won = self._winner is None and not self._abandoned
+            if won:
+                self._winner = (hedge, response)
+            self._condition.notify_all()
+        if not won:
+            self._discard(response)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        :return: True once a response has been received or all the requests have failed
+        """
+        with self._condition:
+            return self._condition.wait_for(lambda: self._winner is not None or self._running == 0, timeout)
+
+    def result(self) -> Tuple[bool, T]:
+        """
+        :return: Whether the winner is a hedge, and its response
+        :raise: The error of the first request sent, if all of them have failed
+        """
+        with self._condition:
+            if self._winner is None:
+                raise self._error
+            return self._winner
+
+    def abandon(self) -> None:
+        """
+        Discards the response received, and those still to come
+        """
+        with self._condition:
+            self._abandoned = True
+            winner, self._winner = self._winner, None
+        if winner is not None:
+            self._discard(winner[1])
+
+
+class HedgingPolicy:
+    """
+    Hedged requests cutting the tail latency of the queries: if the head of the response has not arrived
+    within the `percentile` of the response times of the last `window_size` requests, the same query is sent
+    again, to another replica of the :attr:`endpoint_pool` or over another connection to the endpoint.
+    The first response received is used. The other request is cancelled if it is asynchronous, a blocking
+    request cannot be: its response is discarded with its connection once received.
+
+    The blocking requests are sent by at most `max_threads` threads of the policy: while none is free,
+    the queries are sent without being hedged.
+
+    The hedges add at most `max_extra_load` to the requests sent: each request earns that fraction
+    of a hedge, and up to `max_burst` hedges can be saved up. No query is hedged until `min_samples`
+    response times have been measured. Only the queries (SELECT, ASK, CONSTRUCT, DESCRIBE) are hedged,
+    never the updates.
+    """
+
+    def __init__(
+            self,
+            percentile: float = DEFAULT_PERCENTILE,
+            window_size: int = DEFAULT_WINDOW_SIZE,
+            min_samples: int = DEFAULT_MIN_SAMPLES,
+            max_extra_load: float = DEFAULT_MAX_EXTRA_LOAD,
+            max_burst: float = DEFAULT_MAX_BURST,
+            max_threads: int = DEFAULT_MAX_THREADS
+    ):
+        """
+        :param percentile: Percentile of the recent response times after which a query is hedged, from 0 to 1
+        :param window_size: Number of the last response times kept
+        :param min_samples: Minimum number of the response times kept for a query to be hedged
+        :param max_extra_load: Maximum number of hedges per request sent
+        :param max_burst: Maximum number of hedges saved up
+        :param max_threads: Maximum number of the threads sending the blocking requests
+        """
+        self._percentile: float = percentile
+        self._min_samples: int = max(1, min(min_samples, window_size))
+        self._max_extra_load: float = max_extra_load
+        self._max_burst: float = max_burst
+        self._max_threads: int = max_threads
+        self._threads: BoundedSemaphore = BoundedSemaphore(max_threads)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._latencies: Deque[float] = deque(maxlen=window_size)
+        self._tokens: float = 0.0
+        self._lock: Lock = Lock()
+        self._requests: int = 0
+        self._hedged: int = 0
+        self._won: int = 0
+        self._denied: int = 0
+
+    @staticmethod
+    def hedgeable(statement: str) -> bool:
+        """
+        :return: True if the statement is a query, which can be sent twice, False for an update
+        """
+        return RetryPolicy.idempotent(statement)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Counters of the policy: the number of the hedgeable `requests`, of those `hedged`,
+        of the hedges which `won` (answered first), and of those `denied` by the cap on the extra load.
+        """
+        with self._lock:
+            return {'requests': self._requests, 'hedged': self._hedged, 'won': self._won, 'denied': self._denied}
+
+    def delay(self) -> Optional[float]:
+        """
+        Counts a request, earning its share of a hedge
+        :return: Seconds after which the request is hedged, None if too few response times have been measured
+        """
+        with self._lock:
+            self._requests += 1
+            self._tokens = min(self._max_burst, self._tokens + self._max_extra_load)
+            count = len(self._latencies)
+            if count < self._min_samples:
+                return None
+            return sorted(self._latencies)[min(int(self._percentile * count), count - 1)]
+
+    def record(self, duration: float) -> None:
+        """
+        Records the response time of a request which has succeeded
+        """
+        with self._lock:
+            self._latencies.append(duration)
+
+    def _spend(self) -> bool:
+        """
+        :return: True if a hedge may be sent, within the cap on the extra load
+        """
+        with self._lock:
+            if self._tokens < 1.0:
+                self._denied += 1
+                return False
+            self._tokens -= 1.0
+            self._hedged += 1
+            return True
+
+    def _refund(self) -> None:
+        """
+        Gives back the hedge which has been denied a thread
+        """
+        with self._lock:
+            self._tokens += 1.0
+            self._hedged -= 1
+            self._denied += 1
+
+    def _race(self, discard: Callable[[T], None]) -> _Race:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self._max_threads, thread_name_prefix='sparqlc-hedging')
+        return _Race(discard, self._executor, self._threads)
+
+    def _count_won(self) -> None:
+        with self._lock:
+            self._won += 1
+
+    def _timed(self, send: Callable[[], T]) -> T:
+        start = monotonic()
+        response = send()
+        self.record(monotonic() - start)
+        return response
+
+    async def _timed_async(self, send: Callable[[], Awaitable[T]]) -> T:
+        start = monotonic()
+        response = await send()
+        self.record(monotonic() - start)
+        return response
+
+    def send(self, send: Callable[[], T], discard: Callable[[T], None]) -> T:
+        """
+        Calls `send` in a thread, and in another thread too if it has not returned within the hedging delay.
+        The request which has lost is not interrupted, its response is discarded once received.
+        Without a free thread, `send` is called in the calling thread, and not hedged.
+        :param send: Sends the request and receives the head of the response
+        :param discard: Closes the response of the request which has lost, and its connection
+        :return: The response received first
+        :raise: The error of the first request, if both have failed
+        """
+        delay = self.delay()
+        if delay is None:
+            return self._timed(send)
+        race = self._race(discard)
+        if not race.start(lambda: self._timed(send), False):
+            return self._timed(send)
+        try:
+            if not race.wait(delay) and self._spend() and not race.start(lambda: self._timed(send), True):
+                self._refund()
+            race.wait()
+        except BaseException:
+            race.abandon()
+            raise
+        hedge, response = race.result()
+        if hedge:
+            self._count_won()
+        return response
+
+    async def send_async(self, send: Callable[[], Awaitable[T]], discard: Callable[[T], None]) -> T:
+        """
+        Awaits `send` in a task, and in another task too if it has not returned within the hedging delay.
+        The task which has lost is cancelled.
+        :param send: Sends the request and receives the head of the response
+        :param discard: Closes the response of a request which has lost, and its connection
+        :return: The response received first
+        :raise: The error of the first request, if both have failed
+        """
+        delay = self.delay()
+        if delay is None:
+            return await self._timed_async(send)
+        attempts: List[asyncio.Future] = [asyncio.ensure_future(self._timed_async(send))]
+        winner = None
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done and self._spend():
+                attempts.append(asyncio.ensure_future(self._timed_async(send)))
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in attempts if task in done and task.exception() is None), None)
+                if winner is not None:
+                    if winner is not attempts[0]:
+                        self._count_won()
+                    return winner.result()
+            return attempts[0].result()
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+                elif task is not winner and not task.cancelled() and task.exception() is None:
+                    discard(task.result())
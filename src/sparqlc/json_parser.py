@@ -0,0 +1,194 @@
+import codecs
+from io import IOBase
+from json import JSONDecoder
+from typing import Any, Dict, Generator, List, Optional
+
+from .datatypes import BlankNode, Datatype, Literal, RDFTerm
+from .result_parser import QUERY_ROW, ResultParser
+
+_WHITESPACE = ' \t\n\r'
+
+
+class JsonResultParser(ResultParser):
+    """
+    Streaming parser of the SPARQL JSON result format
+    (https://www.w3.org/TR/sparql11-results-json/).
+
+    The outer structure of the document is tokenized incrementally, so only
+    one binding object of the `results.bindings` array is decoded at a time
+    and the response is never loaded into memory as a whole. The tokenizer
+    is a generator, suspended whenever it has run out of data until the next chunk is fed.
+    """
+    PARSE_ERRORS = (ValueError, KeyError)
+
+    def __init__(self, file: IOBase, iri_cache_size: int = 0):
+        super().__init__(file, iri_cache_size)
+        # JSON is always UTF-8 encoded (RFC 8259)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = JSONDecoder()
+        self._buf: str = ''
+        self._pos: int = 0
+        # Chunks fed, not decoded yet
+        self._unfed: List[bytes] = []
+        self._unfed_size: int = 0
+        self._var_index: Dict[str, int] = {}
+        self._head_seen: bool = False
+        self._document = self._parse_document()
+
+    def _parse(self, data: bytes) -> None:
+        if data:
+            self._unfed.append(data)
+            self._unfed_size += len(data)
+            # The data is collected until it is as long as the unparsed rest, so that
+            # a large value spanning many chunks does not get re-decoded too many times
+            if self._unfed_size < len(self._buf) - self._pos:
+                return
+        self._buf = self._buf[self._pos:] + self._decoder.decode(b''.join(self._unfed), final=self._eof)
+        self._pos = 0
+        self._unfed = []
+        self._unfed_size = 0
+        for _ in self._document:
+            # Waiting for the next chunk
+            return
+        self._head_done = True
+
+    def _skip_whitespace(self) -> Generator[None, None, str]:
+        """
+        :return: The next non-whitespace character (not consumed), or '' at the end of the stream
+        """
+        while True:
+            buf, pos = self._buf, self._pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if self._eof:
+                return ''
+            yield
+
+    def _expect(self, chars: str) -> Generator[None, None, str]:
+        ch = yield from self._skip_whitespace()
+        if not ch or ch not in chars:
+            raise ValueError(f'Expected one of "{chars}" at offset {self._pos}, found "{ch}"')
+        self._pos += 1
+        return ch
+
+    def _value(self) -> Generator[None, None, Any]:
+        """
+        Decodes the next complete JSON value, waiting for more data as required.
+        """
+        yield from self._skip_whitespace()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buf, self._pos)
+                # A number may continue in the next chunk
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except ValueError:
+                if self._eof:
+                    raise
+            yield
+
+    def _parse_document(self) -> Generator[None, None, None]:
+        # An empty stream is not an error, it just has no results
+        if not (yield from self._skip_whitespace()):
+            return
+        yield from self._expect('{')
+        if (yield from self._skip_whitespace()) == '}':
+            self._pos += 1
+            return
+        # Bindings of results preceding the head, the members of an object being in any order
+        deferred: Optional[List[Any]] = None
+        while True:
+            key = yield from self._value()
+            yield from self._expect(':')
+            if key == 'head':
+                self._parse_head((yield from self._value()))
+                if deferred is not None:
+                    bindings, deferred = deferred, None
+                    self._pending.extend(self._row(binding) for binding in bindings)
+            elif key == 'boolean':
+                self.has_result = (yield from self._value()) is True
+                self._head_done = True
+            elif key == 'results':
+                if self._head_seen:
+                    self._head_done = True
+                    yield from self._parse_results()
+                else:
+                    # The variables are not known yet: the results are decoded as a whole,
+                    # and their rows generated once the head has been parsed
+                    deferred = self._bindings((yield from self._value()))
+            else:
+                yield from self._value()
+            if (yield from self._expect(',}')) == '}':
+                if deferred is not None:
+                    raise ValueError('"results" without "head"')
+                return
+
+    @staticmethod
+    def _bindings(results: Any) -> List[Any]:
+        if not isinstance(results, dict):
+            raise ValueError('"results" must be an object')
+        bindings = results.get('bindings', [])
+        if not isinstance(bindings, list):
+            raise ValueError('"bindings" must be an array')
+        return bindings
+
+    def _parse_head(self, head: Any) -> None:
+        if not isinstance(head, dict):
+            raise ValueError('"head" must be an object')
+        variables = head.get('vars', [])
+        if not isinstance(variables, list) or not all(isinstance(name, str) for name in variables):
+            raise ValueError('"vars" must be an array of strings')
+        self.variables.extend(variables)
+        self._var_index = {name: idx for idx, name in enumerate(self.variables)}
+        self._head_seen = True
+        if self.variables:
+            self._head_done = True
+
+    def _parse_results(self) -> Generator[None, None, None]:
+        yield from self._expect('{')
+        if (yield from self._skip_whitespace()) == '}':
+            self._pos += 1
+            return
+        while True:
+            key = yield from self._value()
+            yield from self._expect(':')
+            if key == 'bindings':
+                yield from self._expect('[')
+                if (yield from self._skip_whitespace()) == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        self._pending.append(self._row((yield from self._value())))
+                        if (yield from self._expect(',]')) == ']':
+                            break
+            else:
+                yield from self._value()
+            if (yield from self._expect(',}')) == '}':
+                return
+
+    def _row(self, binding: Dict[str, Dict[str, str]]) -> QUERY_ROW:
+        if not isinstance(binding, dict):
+            raise ValueError('A binding must be an object')
+        row: List[Optional[RDFTerm]] = [None] * len(self.variables)
+        for name, term in binding.items():
+            if name not in self._var_index:
+                raise ValueError(f'Binding of an undeclared variable "{name}"')
+            row[self._var_index[name]] = self._term(term)
+        return tuple(row)
+
+    def _term(self, term: Dict[str, str]) -> RDFTerm:
+        if not isinstance(term, dict):
+            raise ValueError('An RDF term must be an object')
+        term_type = term.get('type')
+        if term_type == 'uri':
+            return self._iri(term['value'])
+        # 'typed-literal' comes from the SPARQL 1.0 version of the format
+        elif term_type == 'literal' or term_type == 'typed-literal':
+            return Literal(term['value'], Datatype(term.get('datatype')), term.get('xml:lang'))
+        elif term_type == 'bnode':
+            return BlankNode(term['value'])
+        raise ValueError(f'Unsupported RDF term type "{term_type}"')
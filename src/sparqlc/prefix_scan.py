@@ -0,0 +1,39 @@
+import re
+from functools import lru_cache
+from typing import FrozenSet
+
+# Number of distinct statements whose prefixes are remembered
+STATEMENT_CACHE_SIZE = 4096
+
+# Tokens of a SPARQL statement relevant to its prefixes. Comments, strings and IRIs are matched
+# as a whole, so that what looks like a prefixed name in them is skipped. A prefix name starts
+# with a letter and does not end with a dot, the empty prefix (':name') is a prefix as well.
+_tokens = re.compile(r'''
+      \#[^\n\r]*
+    | \'\'\'(?:[^'\\]|\\.|'(?!''))*\'\'\'
+    | """(?:[^"\\]|\\.|"(?!""))*"""
+    | '(?:[^'\\\n\r]|\\.)*'
+    | "(?:[^"\\\n\r]|\\.)*"
+    | <[^<>"{}|^`\\\x00-\x20]*>
+    | (?P<declaration>(?<![\w.:-])(?i:PREFIX)\s+(?P<declared>[^\W\d_](?:[\w.-]*[\w-])?)?:)
+    | (?P<use>(?<![\w.:?$-])(?P<used>[^\W\d_](?:[\w.-]*[\w-])?)?:)
+''', re.VERBOSE)
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def used_prefixes(statement: str) -> FrozenSet[str]:
+    """
+    Scans the statement for the prefixed names (e.g. `rdfs:label`) it uses.
+    The prefixes the statement declares itself (`PREFIX name: <uri>`) are left out.
+
+    :param statement: SPARQL statement
+    :return: Names of the prefixes used and not declared by the statement, '' for the empty prefix
+    """
+    used = set()
+    declared = set()
+    for match in _tokens.finditer(statement):
+        if match.group('use') is not None:
+            used.add(match.group('used') or '')
+        elif match.group('declaration') is not None:
+            declared.add(match.group('declared') or '')
+    return frozenset(used - declared)
@@ -1,80 +1,154 @@
-from copy import deepcopy
-from typing import Dict, Optional
-from urllib.parse import urlencode
+from contextlib import ExitStack, nullcontext
+from io import IOBase
+from time import sleep
+from typing import Any, Callable, ContextManager, Dict, FrozenSet, Optional, Tuple, Type, TypeVar
+from urllib.parse import quote_plus
 
 from urllib3 import HTTPResponse
 from urllib3.exceptions import HTTPError
+from urllib3.util import Retry
 
 from .exception import SparqlException, SparqlProtocolException
+from .config import CONTENT_TYPE_HEADER
+from .prefix_scan import used_prefixes
+from .result_cache import CachedResult
 from .result_set import RawResultSet, ResultSet
-from .service_base import ServiceBase, SparqlMethod
+from .retry import parse_retry_after
+from .service_base import release_response, ServiceBase, SparqlMethod
 
+T = TypeVar('T')
 
-class Query(ServiceBase):
-    def __init__(self, service: ServiceBase):
-        super().__init__(
-            service.method,
-            service.endpoint,
-            service.encoding,
-            service.accept,
-            service.max_redirects,
-            service.timeout
-        )
-        self._default_graphs = deepcopy(service._default_graphs)
-        self._headers_map = deepcopy(service._headers_map)
-        self._named_graphs = deepcopy(service._named_graphs)
-        self._prefix_map = deepcopy(service._prefix_map)
-        self._request_kwargs = deepcopy(service._request_kwargs)
-        self._service = service
 
-    @property
-    def service(self) -> ServiceBase:
-        return self._service
+class _Abandoned(Exception):
+    """
+    The response was released before its body had been read, the outcome of its request is unknown
+    """
+    pass
 
-    def query(self, statement: str) -> ResultSet:
+
+class HeldRoute:
+    """
+    Route of a request (see :func:`QueryBase._route`), held by the response until its body has been read,
+    so that the :attr:`endpoint_pool` counts the request in progress and measures it to the end of the body,
+    and the request keeps its concurrency slot of the :attr:`rate_limiter`
+    """
+
+    def __init__(self, stack: ExitStack):
+        self._stack: Optional[ExitStack] = stack
+
+    def finish(self, error: Optional[SparqlException] = None) -> None:
         """
-        Sends the statement and starts parsing the response.
-        :param statement: SPARQL statement to send
-        :return: ResultSet allowing to parse the response
+        Exits the route, once the body has been read, or has failed with the `error`
         """
-        return ResultSet(self._query(statement), self.encoding)
+        stack, self._stack = self._stack, None
+        if stack is None:
+            return
+        if error is None:
+            stack.close()
+        else:
+            stack.__exit__(type(error), error, error.__traceback__)
 
-    def raw_query(self, statement: str) -> RawResultSet:
+    def abandon(self) -> None:
         """
-        Sends the statement and starts parsing the response to raw types.
-        :param statement: SPARQL statement to send
-        :return: RawResultSet allowing to parse the response
+        Exits the route of a response released before its body has been read, without recording an outcome
         """
-        return RawResultSet(self._query(statement), self.encoding)
+        self.finish(_Abandoned())
+
+
+class RoutedResponse(IOBase):
+    """
+    Reads through an HTTP response, holding the route of its request until the body has been read
+    """
+
+    def __init__(self, response: HTTPResponse, route: HeldRoute):
+        super().__init__()
+        self._response: HTTPResponse = response
+        self._route: HeldRoute = route
 
-    def _query(self, statement: str) -> HTTPResponse:
+    @property
+    def status(self) -> int:
+        return self._response.status
+
+    @property
+    def headers(self):
+        return self._response.headers
+
+    @property
+    def length_remaining(self) -> Optional[int]:
+        return getattr(self._response, 'length_remaining', None)
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, amt: Optional[int] = None, **kwargs) -> bytes:
+        try:
+            data = self._response.read(amt, **kwargs)
+        except HTTPError:
+            self._route.finish(SparqlException(f'HTTP Error occurred.'))
+            raise
+        if amt is None or amt < 0 or (not data and amt != 0) or self._at_end():
+            self._route.finish()
+        return data
+
+    def _at_end(self) -> bool:
         """
-        Sends the statement and receives the response. Handles HTTP errors.
-        :param statement: SPARQL statement to send
-        :return: ResultSet allowing to parse the response
+        :return: True if the response has been read to its length (parsers stop at the end of the document,
+            without reading past it)
         """
-        try:
-            response = self.pool_request(
-                self.method,
-                self.query_uri(statement),
-                headers=self.headers | self.content_type_header(),
-                body=self.query_body(statement),
-                preload_content=False,
-                **self.request_kwargs
-            )
-            if response.status == 200:
-                return response
-            else:
-                msg = response.read().decode(self.encoding)
-                response.close()
-                raise SparqlProtocolException(response.status, msg)
-        except HTTPError as http_error:
-            raise SparqlException(f'HTTP Error occurred.') from http_error
+        return self.length_remaining == 0 or self._response.closed
 
-    def pool_request(self, method: SparqlMethod, url: str, **kwargs) -> HTTPResponse:
-        return self._service.pool_request(method, url, **kwargs)
+    def release_conn(self) -> None:
+        self._release()
+        self._response.release_conn()
+
+    @property
+    def closed(self) -> bool:
+        return self._response.closed
+
+    def close(self) -> None:
+        self._release()
+        self._response.close()
 
-    CONTENT_TYPE_HEADER = 'Content-Type'
+    def _release(self) -> None:
+        if self._at_end():
+            self._route.finish()
+        else:
+            self._route.abandon()
+
+
+class QueryBase(ServiceBase):
+    """
+    Configuration of a query, copied from the service, and the composition
+    of its HTTP request. The requests are sent by the subclasses.
+    """
+
+    def __init__(self, service: ServiceBase):
+        # ServiceBase.__init__ is not called: the query shares the configuration snapshot
+        # of the service (copy-on-write), so that creating a query copies nothing
+        self._method = service.method
+        self._endpoint = service.endpoint
+        self._encoding = service.encoding
+        self._used_prefixes_only = service.used_prefixes_only
+        self._max_get_uri_length = service.max_get_uri_length
+        self._auto_post_method = service.auto_post_method
+        self._share_config(service.snapshot())
+        # The cache and the coalescing are shared by the queries of the service
+        self._result_cache = service._result_cache
+        self._single_flight = service._single_flight
+        self._retry_policy = service._retry_policy
+        self._circuit_breaker = service._circuit_breaker
+        self._endpoint_pool = service._endpoint_pool
+        self._hedging_policy = service._hedging_policy
+        self._rate_limiter = service._rate_limiter
+        self._rate_limit_blocking = service._rate_limit_blocking
+        self._get_rejected = service._get_rejected
+        self._service = service
+
+    @property
+    def service(self) -> ServiceBase:
+        return self._service
+
+    CONTENT_TYPE_HEADER = CONTENT_TYPE_HEADER
     CONTENT_TYPE_POST_URLENCODED = 'application/x-www-form-urlencoded'
     CONTENT_TYPE_POST = 'application/sparql-query'
     REQUEST_CONTENT_TYPE_MAP = {
@@ -83,12 +157,108 @@ class Query(ServiceBase):
         SparqlMethod.POST_URL_ENCODED: CONTENT_TYPE_POST_URLENCODED,
     }
 
+    # Answers to a GET request after which SparqlMethod.AUTO POSTs the queries of the endpoint
+    STATUS_GET_REJECTED = (414, 405)
+
+    STATUS_NOT_MODIFIED = 304
+    HEADER_RETRY_AFTER = 'Retry-After'
+    HEADER_ETAG = 'ETag'
+    HEADER_LAST_MODIFIED = 'Last-Modified'
+    HEADER_IF_NONE_MATCH = 'If-None-Match'
+    HEADER_IF_MODIFIED_SINCE = 'If-Modified-Since'
+
+    def conditional_headers(self, stale: Optional[CachedResult]) -> Dict[str, str]:
+        """
+        :param stale: Stale cached result of the statement, if any
+        :return: Headers asking the endpoint to answer 304 (Not Modified) if the result is still valid
+        """
+        headers = {}
+        if stale is not None:
+            if stale.etag is not None:
+                headers[self.HEADER_IF_NONE_MATCH] = stale.etag
+            if stale.last_modified is not None:
+                headers[self.HEADER_IF_MODIFIED_SINCE] = stale.last_modified
+        return headers
+
+    def validators(self, response) -> Tuple[Optional[str], Optional[str]]:
+        """
+        :return: The ETag and Last-Modified headers of the response
+        """
+        return response.headers.get(self.HEADER_ETAG), response.headers.get(self.HEADER_LAST_MODIFIED)
+
     def content_type_header(self) -> Dict[str, str]:
         ct = self.REQUEST_CONTENT_TYPE_MAP.get(self.method, None)
         return {self.CONTENT_TYPE_HEADER: ct} if ct else dict()
 
+    def request_headers(self, method: Optional[SparqlMethod] = None) -> Dict[str, str]:
+        """
+        :param method: Method of the request, :attr:`method` by default
+        :return: The headers of the request, including its content type (shared, do not modify)
+        """
+        return self.snapshot().request_headers(self.REQUEST_CONTENT_TYPE_MAP.get(method or self.method))
+
+    def protocol_error(self, status: int, message: str, retry_after: Optional[str]) -> SparqlProtocolException:
+        """
+        :param retry_after: Retry-After header of the response
+        :return: The error reporting the response which is not a result
+        """
+        return SparqlProtocolException(status, message, parse_retry_after(retry_after))
+
+    def request_method(self, statement: str) -> SparqlMethod:
+        """
+        :return: The method of the request of the statement, which :attr:`SparqlMethod.AUTO` resolves
+                 to GET or to :attr:`auto_post_method`
+        """
+        return self._request_target(statement)[0]
+
+    def _request_target(self, statement: str, endpoint: Optional[str] = None) -> Tuple[SparqlMethod, str]:
+        """
+        :param endpoint: Endpoint to which the request is sent, :attr:`endpoint` by default
+        :return: The method and URI of the request of the statement
+        """
+        endpoint = endpoint or self.endpoint.strip()
+        method = self.method
+        if method is SparqlMethod.AUTO:
+            if endpoint not in self._get_rejected:
+                uri = self._query_uri(SparqlMethod.GET, statement, endpoint)
+                if len(uri) <= self._max_get_uri_length:
+                    return SparqlMethod.GET, uri
+            method = self._auto_post_method
+        return method, self._query_uri(method, statement, endpoint)
+
+    def _reject_get(self, endpoint: str) -> None:
+        """
+        Remembers that the endpoint does not accept the GET requests of SparqlMethod.AUTO
+        """
+        self._get_rejected.add(endpoint)
+
+    def _route(self, stack: ExitStack) -> str:
+        """
+        Picks the endpoint of a request, a replica of the :attr:`endpoint_pool` if there is one,
+        and waits for the :attr:`rate_limiter` to let it through. The replica and the concurrency slot
+        of the limiter are held in `stack` until the response has been read, the pool recording the outcome
+        of the request.
+        :return: The endpoint
+        """
+        if self._endpoint_pool is None:
+            endpoint = self.endpoint.strip()
+        else:
+            endpoint = stack.enter_context(self._endpoint_pool.acquire()).endpoint
+        if self._rate_limiter is not None:
+            stack.enter_context(self._rate_limiter.acquire(endpoint, self._rate_limit_blocking))
+        return endpoint
+
+    def _admit(self, endpoint: str) -> ContextManager:
+        """
+        Lets the request through the :attr:`circuit_breaker`, which records the outcome of its head
+        """
+        return self._circuit_breaker.call(endpoint) if self._circuit_breaker is not None else nullcontext()
+
     def query_body(self, statement: str) -> Optional[bytes]:
-        match self.method:
+        return self._query_body(self.request_method(statement), statement)
+
+    def _query_body(self, method: SparqlMethod, statement: str) -> Optional[bytes]:
+        match method:
             case SparqlMethod.GET:
                 return None
             case SparqlMethod.POST_URL_ENCODED:
@@ -104,27 +274,47 @@ class Query(ServiceBase):
         :param statement: Statement to turn into query
         :return: URI for the HTTP request
         """
-        endpoint = self.endpoint.strip()
-        if self.method is SparqlMethod.POST_URL_ENCODED:
+        return self._request_target(statement)[1]
+
+    def _query_uri(self, method: SparqlMethod, statement: str, endpoint: str) -> str:
+        if method is SparqlMethod.POST_URL_ENCODED:
             return endpoint
-        separator = '&' if '?' in self.endpoint else '?'
-        qs = self.param_string(statement if self.method is SparqlMethod.GET else None)
+        separator = '&' if '?' in endpoint else '?'
+        qs = self.param_string(statement if method is SparqlMethod.GET else None)
         return endpoint + separator + qs if qs else endpoint
 
+    def cache_key(self, statement: str) -> Tuple:
+        """
+        Identifies the request of the statement in the :attr:`result_cache`: the method, URI, body
+        and headers (including the Accept header) of the request. The default and named graphs
+        are part of the URI or of the body.
+        :param statement: SPARQL statement to send
+        :return: Hashable key of the request
+        """
+        # The surrounding whitespace does not change the query
+        statement = statement.strip()
+        method, uri = self._request_target(statement)
+        return (
+            str(method),
+            uri,
+            self._query_body(method, statement),
+            self.snapshot().header_items(self.REQUEST_CONTENT_TYPE_MAP.get(method)),
+        )
+
     def param_string(self, statement: str | None) -> str:
         """
         Creates a url-encoded parameter string, containing query, graph URIs
         :param statement: Statement to turn into query (or None if query should be omitted)
         :return: Query part of the URI string corresponding to query, prefixes, graph URIs
         """
-        graph_params = \
-            [('default-graph-uri', uri.encode(self.encoding)) for uri in self.default_graphs] \
-            + [('named-graph-uri', uri.encode(self.encoding)) for uri in self.named_graphs]
-
-        if statement:
-            return urlencode([('query', self.query_string(statement).encode(self.encoding))] + graph_params)
-        else:
-            return urlencode(graph_params)
+        snapshot = self.snapshot()
+        graph_string = snapshot.graph_string(self.encoding)
+        if not statement:
+            return graph_string
+        # The prefixes are quoted once per configuration, only the statement is quoted per request
+        quoted_preamble = snapshot.quoted_preamble(self.encoding, self.prefix_names(statement))
+        query = 'query=' + quoted_preamble + quote_plus(statement.encode(self.encoding))
+        return query + '&' + graph_string if graph_string else query
 
     def query_string(self, statement: str) -> str:
         """
@@ -132,10 +322,197 @@ class Query(ServiceBase):
         :param statement: SPARQL statement
         :return: Query string corresponding with the statement, decorated with prefixes
         """
-        prefixes = ' '.join([
-            f"PREFIX {p}: <{self._prefix_map[p]}>"
-            for p in self._prefix_map
-        ])
-        if len(prefixes) > 0:
-            prefixes += ' '
-        return prefixes + statement
+        return self.snapshot().prefix_preamble(self.prefix_names(statement)) + statement
+
+    def prefix_names(self, statement: str) -> Optional[FrozenSet[str]]:
+        """
+        :return: Names of the prefixes to declare for the statement, None for all of them
+        """
+        return used_prefixes(statement) if self._used_prefixes_only else None
+
+
+class Query(QueryBase):
+    """
+    Query sent through the blocking connection pool of its :class:`Service`
+    """
+
+    def query(self, statement: str) -> ResultSet:
+        """
+        Sends the statement and starts parsing the response.
+        :param statement: SPARQL statement to send
+        :return: ResultSet allowing to parse the response
+        """
+        return self._result_set(ResultSet, statement)
+
+    def raw_query(self, statement: str) -> RawResultSet:
+        """
+        Sends the statement and starts parsing the response to raw types.
+        :param statement: SPARQL statement to send
+        :return: RawResultSet allowing to parse the response
+        """
+        return self._result_set(RawResultSet, statement)
+
+    def _result_set(self, result_set_type: Type[RawResultSet], statement: str) -> RawResultSet:
+        """
+        Creates the result set of the statement from the :attr:`result_cache`, if it holds
+        the result, otherwise from the response, which is cached once it has been fully read.
+        With :attr:`single_flight`, the response is shared with the identical queries in progress.
+        """
+        cache = self._result_cache
+        if cache is None and self._single_flight is None:
+            response = self._query(statement)
+            return result_set_type(response, self.encoding, content_type=response.headers.get(self.CONTENT_TYPE_HEADER))
+        key = self.cache_key(statement)
+        cached = cache.get(key) if cache is not None else None
+        if cached is None and self._single_flight is not None:
+            cached = self._single_flight.do(key, lambda: self._fetch(key, statement))
+        response = None
+        if cached is None:
+            cached, response = self._retry(statement, lambda: self._revalidate(key, statement))
+        if cached is not None:
+            return result_set_type(cached.open(), self.encoding, content_type=cached.content_type)
+        content_type = response.headers.get(self.CONTENT_TYPE_HEADER)
+        return result_set_type(
+            cache.record(key, response, content_type, *self.validators(response)),
+            self.encoding,
+            content_type=content_type
+        )
+
+    def _revalidate(self, key: Tuple, statement: str) -> Tuple[Optional[CachedResult], Optional[HTTPResponse]]:
+        """
+        Sends the statement, asking the endpoint whether the stale result of the cache (if any) is still valid
+        :return: The cached result if it is, otherwise the response
+        """
+        stale = self._result_cache.stale(key) if self._result_cache is not None else None
+        response = self._send(statement, self.conditional_headers(stale))
+        if response.status == self.STATUS_NOT_MODIFIED:
+            release_response(response)
+            self._result_cache.refresh(key)
+            return stale, None
+        return None, response
+
+    def _fetch(self, key: Tuple, statement: str) -> CachedResult:
+        """
+        Receives the whole response to the statement, and caches it. As no row has been returned yet,
+        a failure while the body is received is retried as well.
+        """
+        return self._retry(statement, lambda: self._receive(key, statement))
+
+    def _receive(self, key: Tuple, statement: str) -> CachedResult:
+        cached, response = self._revalidate(key, statement)
+        if cached is not None:
+            return cached
+        try:
+            body = response.read()
+        except HTTPError as http_error:
+            release_response(response, 0)
+            raise SparqlException(f'HTTP Error occurred.') from http_error
+        release_response(response)
+        content_type = response.headers.get(self.CONTENT_TYPE_HEADER)
+        etag, last_modified = self.validators(response)
+        if self._result_cache is not None:
+            self._result_cache.put(key, body, content_type, etag, last_modified)
+        return CachedResult(body, content_type, None, etag, last_modified)
+
+    def _retry(self, statement: str, send: Callable[[], T]) -> T:
+        """
+        Calls `send` until it succeeds, or the :attr:`retry_policy` gives up and its error is raised
+        :param statement: SPARQL statement sent, retried only if it is a query
+        """
+        retry = self._retry_policy.start(statement) if self._retry_policy is not None else None
+        while True:
+            try:
+                return send()
+            except SparqlException as error:
+                delay = retry.delay(error) if retry is not None else None
+                if delay is None:
+                    raise
+            sleep(delay)
+
+    def _query(self, statement: str, conditional_headers: Optional[Dict[str, str]] = None) -> HTTPResponse:
+        """
+        Sends the statement and receives the response, retried as the :attr:`retry_policy` allows
+        """
+        return self._retry(statement, lambda: self._send(statement, conditional_headers))
+
+    def _send(self, statement: str, conditional_headers: Optional[Dict[str, str]] = None) -> HTTPResponse:
+        """
+        Sends the statement, hedged as the :attr:`hedging_policy` allows. The request which has lost
+        is not interrupted, its response is discarded with its connection once received.
+        """
+        policy = self._hedging_policy
+        if policy is None or not policy.hedgeable(statement):
+            return self._attempt(statement, conditional_headers)
+        return policy.send(lambda: self._attempt(statement, conditional_headers), lambda r: release_response(r, 0))
+
+    def _attempt(self, statement: str, conditional_headers: Optional[Dict[str, str]] = None) -> RoutedResponse:
+        """
+        Sends the statement to the endpoint picked by :func:`_route`
+        :return: Response holding the route until its body has been read
+        """
+        with ExitStack() as stack:
+            endpoint = self._route(stack)
+            with self._admit(endpoint):
+                response = self._exchange(statement, conditional_headers, endpoint)
+            return RoutedResponse(response, HeldRoute(stack.pop_all()))
+
+    def _exchange(
+            self,
+            statement: str,
+            conditional_headers: Optional[Dict[str, str]],
+            endpoint: str
+    ) -> HTTPResponse:
+        """
+        Sends the statement and receives the response. Handles HTTP errors.
+        :param statement: SPARQL statement to send
+        :param conditional_headers: Headers asking whether a cached result is still valid, see
+                                    :func:`conditional_headers`
+        :param endpoint: Endpoint to which the statement is sent
+        :return: Response with the status 200, or 304 (Not Modified) to a conditional request
+        """
+        method, uri = self._request_target(statement, endpoint)
+        headers = self.request_headers(method)
+        if conditional_headers:
+            headers = headers | conditional_headers
+        elif method is SparqlMethod.GET:
+            # urllib3 strips the credentials from the headers of a GET request redirected to another host
+            headers = dict(headers)
+        try:
+            response = self.pool_request(
+                method,
+                uri,
+                headers=headers,
+                body=self._query_body(method, statement),
+                preload_content=False,
+                **self._pool_kwargs()
+            )
+            if response.status == 200 or (conditional_headers and response.status == self.STATUS_NOT_MODIFIED):
+                return response
+            elif self.method is SparqlMethod.AUTO and method is SparqlMethod.GET \
+                    and response.status in self.STATUS_GET_REJECTED:
+                release_response(response)
+                self._reject_get(endpoint)
+                return self._exchange(statement, conditional_headers, endpoint)
+            else:
+                msg = response.read().decode(self.encoding)
+                release_response(response)
+                raise self.protocol_error(response.status, msg, response.headers.get(self.HEADER_RETRY_AFTER))
+        except HTTPError as http_error:
+            raise SparqlException(f'HTTP Error occurred.') from http_error
+
+    def _pool_kwargs(self) -> Dict[str, Any]:
+        """
+        :return: The arguments of the request. With a :attr:`retry_policy`, urllib3 follows the redirects
+                 but does not retry the failures itself (the number of redirects would retry them too).
+        """
+        request_kwargs = self.snapshot().request_kwargs
+        max_redirects = request_kwargs.get(self.PARAM_MAX_REDIRECTS)
+        if self._retry_policy is None or not isinstance(max_redirects, int):
+            return request_kwargs
+        retries = Retry(
+            total=None, connect=0, read=0, redirect=max_redirects, status=0, other=0, respect_retry_after_header=False
+        )
+        return request_kwargs | {self.PARAM_MAX_REDIRECTS: retries}
+
+    def pool_request(self, method: SparqlMethod, url: str, **kwargs) -> HTTPResponse:
+        return self._service.pool_request(method, url, **kwargs)
@@ -0,0 +1,271 @@
+import asyncio
+from collections import deque
+from threading import Event, Lock
+from time import monotonic, sleep
+from typing import Callable, Deque, Dict, Optional, Union
+
+from .exception import SparqlRateLimitException
+
+
+class _Waiter:
+    """
+    Request waiting for a concurrency slot, notified once it has been granted one
+    """
+
+    def __init__(self, notify: Callable[[], None]):
+        self.notify: Callable[[], None] = notify
+        self.granted: bool = False
+
+
+class _Bucket:
+    """
+    Tokens and concurrency slots of an endpoint
+    """
+
+    def __init__(self, tokens: float):
+        self.tokens: float = tokens
+        self.updated: float = monotonic()
+        self.running: int = 0
+        self.waiters: Deque[_Waiter] = deque()
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class RatePermit:
+    """
+    Request let through by a :class:`RateLimiter`, a context manager releasing its concurrency slot.
+    :attr:`wait` is the time in seconds it has waited for the limits.
+    """
+
+    def __init__(self, limiter: 'RateLimiter', endpoint: str, wait: float):
+        self._limiter: RateLimiter = limiter
+        self._endpoint: str = endpoint
+        self.wait: float = wait
+
+    def __enter__(self) -> 'RatePermit':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self._limiter.release(self._endpoint)
+
+
+class RateLimiter:
+    """
+    Client-side limits of the requests sent to each endpoint, keeping within the quotas of the endpoints
+    rather than being answered with 429 (Too Many Requests), or banned. A token bucket lets `rate` requests
+    per second through, with bursts of up to `burst` requests, and at most `max_concurrent` requests
+    are in progress at a time. The requests wait in turn for a token and a slot, for at most `max_wait`
+    seconds. Otherwise, or right away if the limiter is not `blocking` (a request can also choose
+    for itself, see :func:`acquire`), they fail with :class:`SparqlRateLimitException` without being sent.
+
+    The limiter can be shared by threads and by asyncio tasks: the tasks wait without blocking the event loop.
+    """
+
+    def __init__(
+            self,
+            rate: Optional[float] = None,
+            burst: Optional[float] = None,
+            max_concurrent: Optional[int] = None,
+            blocking: bool = True,
+            max_wait: Optional[float] = None,
+            on_wait: Optional[Callable[[str, float], None]] = None
+    ):
+        """
+        :param rate: Number of requests per second to an endpoint, None for no limit
+        :param burst: Number of tokens of the bucket, the requests which can be sent at once (max(1, rate) by default)
+        :param max_concurrent: Number of requests in progress to an endpoint, None for no limit
+        :param blocking: Whether the requests wait for the limits by default, or fail right away if they are reached
+        :param max_wait: Maximum time in seconds a request waits, None for no limit
+        :param on_wait: Called with the endpoint and the time in seconds the request has waited (0 if it has not),
+                        for each request let through
+        """
+        if rate is not None and rate <= 0:
+            raise ValueError('The rate must be positive')
+        self._rate: Optional[float] = rate
+        self._burst: float = burst if burst is not None else max(1.0, rate or 1.0)
+        self._max_concurrent: Optional[int] = max_concurrent
+        self._blocking: bool = blocking
+        self._max_wait: Optional[float] = max_wait
+        self._on_wait: Optional[Callable[[str, float], None]] = on_wait
+        self._buckets: Dict[str, _Bucket] = {}
+        self._lock: Lock = Lock()
+        self._requests: int = 0
+        self._delayed: int = 0
+        self._rejected: int = 0
+        self._wait_time: float = 0.0
+        self._max_wait_time: float = 0.0
+
+    @property
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """
+        Counters of the limiter: the number of the `requests` let through, of those `delayed` by the limits,
+        and of those `rejected`, the total `wait_time` of the requests in seconds, and the `max_wait_time`.
+        """
+        with self._lock:
+            return {
+                'requests': self._requests,
+                'delayed': self._delayed,
+                'rejected': self._rejected,
+                'wait_time': self._wait_time,
+                'max_wait_time': self._max_wait_time,
+            }
+
+    def acquire(self, endpoint: str, blocking: Optional[bool] = None) -> RatePermit:
+        """
+        Waits for a request to the endpoint to be let through
+        :param blocking: Whether the request waits for the limits, or fails right away if they are reached,
+                         None as the limiter is `blocking`
+        :return: Context manager of the request, releasing its concurrency slot
+        :raise SparqlRateLimitException: If the limits are reached and the request cannot wait for them
+        """
+        blocking = self._blocking if blocking is None else blocking
+        start = monotonic()
+        deadline = None if self._max_wait is None else start + self._max_wait
+        event = Event()
+        waiter = self._enter(endpoint, event.set, deadline, blocking)
+        if waiter is not None and not event.wait(self._remaining(deadline)) and not self._abandon(endpoint, waiter):
+            raise self._reject(endpoint, None)
+        try:
+            delay = self._reserve(endpoint, deadline, blocking)
+            if delay > 0:
+                sleep(delay)
+        except BaseException:
+            self.release(endpoint)
+            raise
+        return self._permit(endpoint, start, waiter is not None or delay > 0)
+
+    async def acquire_async(self, endpoint: str, blocking: Optional[bool] = None) -> RatePermit:
+        """
+        Awaits a request to the endpoint to be let through, like :func:`acquire`
+        """
+        blocking = self._blocking if blocking is None else blocking
+        start = monotonic()
+        deadline = None if self._max_wait is None else start + self._max_wait
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = self._enter(endpoint, lambda: loop.call_soon_threadsafe(_resolve, future), deadline, blocking)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(future, self._remaining(deadline))
+            except asyncio.TimeoutError:
+                if not self._abandon(endpoint, waiter):
+                    raise self._reject(endpoint, None)
+            except BaseException:
+                # Cancelled, the slot may have been granted in the meantime
+                if self._abandon(endpoint, waiter):
+                    self.release(endpoint)
+                raise
+        try:
+            delay = self._reserve(endpoint, deadline, blocking)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        except BaseException:
+            self.release(endpoint)
+            raise
+        return self._permit(endpoint, start, waiter is not None or delay > 0)
+
+    def release(self, endpoint: str) -> None:
+        """
+        Releases the concurrency slot of a request, handing it over to the next request waiting
+        """
+        if self._max_concurrent is None:
+            return
+        with self._lock:
+            bucket = self._buckets[endpoint]
+            if bucket.waiters:
+                waiter = bucket.waiters.popleft()
+                waiter.granted = True
+                waiter.notify()
+            else:
+                bucket.running -= 1
+
+    def _bucket(self, endpoint: str) -> _Bucket:
+        # Called with the lock held
+        bucket = self._buckets.get(endpoint)
+        if bucket is None:
+            bucket = self._buckets[endpoint] = _Bucket(self._burst)
+        return bucket
+
+    def _enter(
+            self,
+            endpoint: str,
+            notify: Callable[[], None],
+            deadline: Optional[float],
+            blocking: bool
+    ) -> Optional[_Waiter]:
+        """
+        Takes a concurrency slot, or queues a waiter for one
+        :return: None if the slot has been taken, otherwise the waiter notified once it is granted one
+        """
+        if self._max_concurrent is None:
+            return None
+        with self._lock:
+            bucket = self._bucket(endpoint)
+            if bucket.running < self._max_concurrent and not bucket.waiters:
+                bucket.running += 1
+                return None
+            if not blocking or (deadline is not None and deadline <= monotonic()):
+                self._rejected += 1
+                raise SparqlRateLimitException(endpoint, None)
+            waiter = _Waiter(notify)
+            bucket.waiters.append(waiter)
+            return waiter
+
+    def _abandon(self, endpoint: str, waiter: _Waiter) -> bool:
+        """
+        Stops waiting for a concurrency slot
+        :return: True if the slot had been granted in the meantime
+        """
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._buckets[endpoint].waiters.remove(waiter)
+            return False
+
+    def _reserve(self, endpoint: str, deadline: Optional[float], blocking: bool) -> float:
+        """
+        Takes a token, ahead of its time if the bucket is empty
+        :return: Seconds to wait for the token
+        """
+        if self._rate is None:
+            return 0.0
+        with self._lock:
+            bucket = self._bucket(endpoint)
+            now = monotonic()
+            bucket.tokens = min(self._burst, bucket.tokens + (now - bucket.updated) * self._rate)
+            bucket.updated = now
+            delay = max(0.0, (1.0 - bucket.tokens) / self._rate)
+            if delay > 0 and (not blocking or (deadline is not None and now + delay > deadline)):
+                self._rejected += 1
+                raise SparqlRateLimitException(endpoint, delay)
+            bucket.tokens -= 1.0
+            return delay
+
+    def _reject(self, endpoint: str, retry_in: Optional[float]) -> SparqlRateLimitException:
+        with self._lock:
+            self._rejected += 1
+        return SparqlRateLimitException(endpoint, retry_in)
+
+    def _permit(self, endpoint: str, start: float, delayed: bool) -> RatePermit:
+        wait = monotonic() - start if delayed else 0.0
+        with self._lock:
+            self._requests += 1
+            if delayed:
+                self._delayed += 1
+                self._wait_time += wait
+                self._max_wait_time = max(self._max_wait_time, wait)
+        # Called outside the lock, the callback may use the limiter
+        if self._on_wait is not None:
+            try:
+                self._on_wait(endpoint, wait)
+            except BaseException:
+                self.release(endpoint)
+                raise
+        return RatePermit(self, endpoint, wait)
+
+    @staticmethod
+    def _remaining(deadline: Optional[float]) -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - monotonic())
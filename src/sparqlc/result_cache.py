@@ -0,0 +1,369 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from io import BytesIO, IOBase
+from threading import Lock
+from time import monotonic
+from typing import Dict, Hashable, List, Optional
+
+# Default maximum total size of the response bodies held by a ResultCache
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+
+# Default time in seconds for which a cached result is used
+DEFAULT_TTL = 300.0
+
+
+class CachedResult:
+    """
+    Response body of a query with its content type, as held by a :class:`ResultCache`,
+    and the validators of the response (its ETag and Last-Modified headers), if any.
+    """
+
+    def __init__(
+            self,
+            body: bytes,
+            content_type: Optional[str],
+            expires: Optional[float],
+            etag: Optional[str] = None,
+            last_modified: Optional[str] = None
+    ):
+        self.body: bytes = body
+        self.content_type: Optional[str] = content_type
+        # Monotonic time after which the result is stale, None if it never is
+        self.expires: Optional[float] = expires
+        self.etag: Optional[str] = etag
+        self.last_modified: Optional[str] = last_modified
+
+    @property
+    def revalidatable(self) -> bool:
+        """
+        Whether the endpoint can confirm that the result is still valid, once it is stale
+        """
+        return self.etag is not None or self.last_modified is not None
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+    def expired(self, now: float) -> bool:
+        return self.expires is not None and now >= self.expires
+
+    def open(self) -> IOBase:
+        """
+        :return: New stream reading the body
+        """
+        return BytesIO(self.body)
+
+
+class ResultCacheBase(ABC):
+    """
+    Cache of query responses, shared by the queries of a service, keyed by the request
+    (see :func:`QueryBase.cache_key`). The bodies are held as received, so that each hit
+    is parsed into a fresh result set, the same as a response from the endpoint.
+
+    The stale results with a validator (ETag or Last-Modified) are kept until they are evicted,
+    so that the query can ask the endpoint whether they are still valid (see :func:`stale`).
+    """
+
+    def __init__(self, max_size: int, ttl: Optional[float], max_entry_size: Optional[int]):
+        """
+        :param max_size: Maximum total size of the cached bodies in bytes
+        :param ttl: Time in seconds for which a result is used, None to use it until evicted
+        :param max_entry_size: Maximum size of a cached body in bytes, a quarter of `max_size` by default
+        """
+        self._max_size: int = max_size
+        self._ttl: Optional[float] = ttl
+        self._max_entry_size: int = max_size // 4 if max_entry_size is None else min(max_entry_size, max_size)
+        self._hits: int = 0
+        self._misses: int = 0
+        self._evictions: int = 0
+        self._expirations: int = 0
+        self._revalidations: int = 0
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    @property
+    def max_entry_size(self) -> int:
+        return self._max_entry_size
+
+    @property
+    def ttl(self) -> Optional[float]:
+        return self._ttl
+
+    @property
+    @abstractmethod
+    def size(self) -> int:
+        """
+        Total size of the cached bodies in bytes
+        """
+        pass
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abstractmethod
+    def __contains__(self, key: Hashable) -> bool:
+        pass
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Optional[CachedResult]:
+        """
+        :return: The cached result of the request, None if there is none or it has expired
+        """
+        pass
+
+    @abstractmethod
+    def stale(self, key: Hashable) -> Optional[CachedResult]:
+        """
+        :return: The expired result of the request which can be revalidated, None if there is none
+        """
+        pass
+
+    @abstractmethod
+    def refresh(self, key: Hashable) -> bool:
+        """
+        Restarts the time to live of the result, which the endpoint has confirmed to be still valid
+        :return: True if there was a result
+        """
+        pass
+
+    @abstractmethod
+    def put(
+            self,
+            key: Hashable,
+            body: bytes,
+            content_type: Optional[str],
+            etag: Optional[str] = None,
+            last_modified: Optional[str] = None
+    ) -> bool:
+        """
+        Caches the response body of the request, evicting the least recently used results
+        :param etag: ETag header of the response
+        :param last_modified: Last-Modified header of the response
+        :return: True if the body was cached, False if it is larger than :attr:`max_entry_size`
+        """
+        pass
+
+    @abstractmethod
+    def pop(self, key: Hashable) -> bool:
+        """
+        Drops the result of the request
+        :return: True if there was a result
+        """
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        """
+        Drops all the results, the counters are kept
+        """
+        pass
+
+    def record(
+            self,
+            key: Hashable,
+            response: IOBase,
+            content_type: Optional[str],
+            etag: Optional[str] = None,
+            last_modified: Optional[str] = None
+    ) -> 'RecordingResponse':
+        """
+        :return: Response reading through the given one, which caches its body once fully read
+        """
+        return RecordingResponse(
+            response, self._max_entry_size, lambda body: self.put(key, body, content_type, etag, last_modified)
+        )
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Counters of the cache: the number of lookups which were `hits` and `misses`,
+        of the results `evicted` to make room and of those dropped as `expired`,
+        of the stale results confirmed by the endpoint (`revalidations`), and the current
+        number of `entries` and their total `size` in bytes.
+        """
+        return {
+            'hits': self._hits,
+            'misses': self._misses,
+            'evictions': self._evictions,
+            'expirations': self._expirations,
+            'revalidations': self._revalidations,
+            'entries': len(self),
+            'size': self.size,
+        }
+
+
+class ResultCache(ResultCacheBase):
+    """
+    Bounded, thread-safe in-memory LRU cache of query responses.
+
+    The least recently used results are evicted once the total size of the bodies exceeds
+    `max_size` bytes, the results older than `ttl` seconds are dropped on their next lookup.
+    """
+
+    def __init__(
+            self,
+            max_size: int = DEFAULT_CACHE_SIZE,
+            ttl: Optional[float] = DEFAULT_TTL,
+            max_entry_size: Optional[int] = None
+    ):
+        super().__init__(max_size, ttl, max_entry_size)
+        self._entries: OrderedDict[Hashable, CachedResult] = OrderedDict()
+        self._size: int = 0
+        self._lock: Lock = Lock()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and not entry.expired(monotonic())
+
+    def get(self, key: Hashable) -> Optional[CachedResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expired(monotonic()):
+                if not entry.revalidatable:
+                    self._remove(key)
+                    self._expirations += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry
+
+    def stale(self, key: Hashable) -> Optional[CachedResult]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.revalidatable and entry.expired(monotonic()):
+            return entry
+        return None
+
+    def refresh(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            entry.expires = self._expires()
+            self._entries.move_to_end(key)
+            self._revalidations += 1
+            return True
+
+    def put(
+            self,
+            key: Hashable,
+            body: bytes,
+            content_type: Optional[str],
+            etag: Optional[str] = None,
+            last_modified: Optional[str] = None
+    ) -> bool:
+        if len(body) > self._max_entry_size:
+            return False
+        entry = CachedResult(body, content_type, self._expires(), etag, last_modified)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._size += len(body)
+            while self._size > self._max_size:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+        return True
+
+    def pop(self, key: Hashable) -> bool:
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key)
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _expires(self) -> Optional[float]:
+        return None if self._ttl is None else monotonic() + self._ttl
+
+    def _remove(self, key: Hashable) -> CachedResult:
+        entry = self._entries.pop(key)
+        self._size -= entry.size
+        return entry
+
+
+class RecordingResponse(IOBase):
+    """
+    Reads through an HTTP response, keeping a copy of the body up to `max_size` bytes.
+    Once the body has been fully read, the copy is passed to `on_complete`: by the reader, or by the drain
+    of the response on closing if the reader has read it all but its end (e.g. a chunked response, whose
+    length is unknown). A body which is longer, or is not fully read by the reader, is not recorded.
+    """
+
+    def __init__(self, response: IOBase, max_size: int, on_complete):
+        super().__init__()
+        self._response: IOBase = response
+        self._max_size: int = max_size
+        self._on_complete = on_complete
+        self._parts: Optional[List[bytes]] = []
+        self._size: int = 0
+
+    @property
+    def recording(self) -> bool:
+        return self._parts is not None
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, amt: Optional[int] = None, **kwargs) -> bytes:
+        data = self._response.read(amt, **kwargs)
+        if self._parts is None:
+            return data
+        if kwargs:
+            # Read otherwise than by the reader (e.g. drained on closing): the end of the body completes
+            # the copy, any other data may not be as the reader would have read it (e.g. not decoded)
+            if data:
+                self._parts = None
+        elif data:
+            self._size += len(data)
+            if self._size > self._max_size:
+                self._parts = None
+            else:
+                self._parts.append(data)
+        if self._parts is not None and self._at_end(amt, data):
+            parts, self._parts = self._parts, None
+            self._on_complete(b''.join(parts))
+        return data
+
+    def _at_end(self, amt: Optional[int], data: bytes) -> bool:
+        """
+        :return: True if the read has reached the end of the body: it has read it all at once, or nothing,
+            or the response has been read to its length (parsers stop at the end of the document,
+            without reading past it)
+        """
+        if amt is None or amt < 0 or (not data and amt != 0):
+            return True
+        return getattr(self._response, 'length_remaining', None) == 0 or self._response.closed
+
+    @property
+    def headers(self):
+        return self._response.headers
+
+    def release_conn(self) -> None:
+        release_conn = getattr(self._response, 'release_conn', None)
+        if release_conn is not None:
+            release_conn()
+
+    @property
+    def closed(self) -> bool:
+        return self._response.closed
+
+    def close(self) -> None:
+        self._parts = None
+        self._response.close()
@@ -0,0 +1,123 @@
+from abc import abstractmethod
+from collections import deque
+from io import IOBase
+from typing import Callable, Deque, Generator, List, Optional, Tuple, Type
+
+from .datatypes import InternTable, IRI, RDFTerm
+
+QUERY_ROW = Tuple[RDFTerm, ...]
+
+
+class ResultParser:
+    """
+    Base class of the parsers of the SPARQL query result formats.
+
+    The parser is fed the response incrementally, chunk by chunk, by :func:`feed`: the head
+    of the response (variables and the result of an ASK query) is parsed first, then the rows.
+    :func:`parse_head` and :func:`rows` read the chunks from the response stream as they need them.
+    The reader of a response received asynchronously rather pushes the chunks it receives,
+    whenever the parser :attr:`wants_data`, so that the parsing never waits for the network.
+    """
+
+    # Exceptions the parser raises on malformed input
+    PARSE_ERRORS: Tuple[Type[Exception], ...] = ()
+
+    # Size of the chunks read from the response stream
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, file: IOBase, iri_cache_size: int = 0):
+        """
+        :param file: Response stream
+        :param iri_cache_size: If positive, repeated IRIs share the same `IRI` instance,
+                               up to that many distinct values
+        """
+        self._file: IOBase = file
+        self._iri: Callable[[str], IRI] = InternTable(iri_cache_size, IRI) if iri_cache_size > 0 else IRI
+        self.variables: List[str] = []
+        self.has_result: Optional[bool] = None
+        # Rows parsed, not returned yet
+        self._pending: Deque[QUERY_ROW] = deque()
+        self._head_done: bool = False
+        self._eof: bool = False
+        self._error: Optional[Exception] = None
+
+    @property
+    def head_parsed(self) -> bool:
+        return self._head_done
+
+    @property
+    def wants_data(self) -> bool:
+        """
+        True if all the rows parsed so far have been returned, and the rest of the response has not been fed
+        """
+        return not self._pending and not self._eof and self._error is None
+
+    @property
+    def failed(self) -> bool:
+        return self._error is not None
+
+    def feed(self, data: bytes) -> None:
+        """
+        Parses the next chunk of the response. A parse error is raised only once
+        the rows parsed before it have been returned.
+        :param data: Chunk of the response, empty at its end
+        """
+        if self._eof or self._error is not None:
+            return
+        if not data:
+            self._eof = True
+        try:
+            self._parse(data)
+        except self.PARSE_ERRORS as error:
+            self._error = error
+
+    def parse_head(self) -> None:
+        """
+        Parses the head of the response, filling in :attr:`variables`
+        and, for ASK queries, :attr:`has_result`.
+        """
+        while not self._head_done and self._read_more():
+            pass
+        if not self._head_done and self._error is not None:
+            raise self._error
+
+    def rows(self) -> Generator[QUERY_ROW, None, None]:
+        """
+        Generates the rows of the result. Rows not consumed by one generator
+        are returned by the next one.
+        """
+        pending = self._pending
+        while True:
+            while pending:
+                yield pending.popleft()
+            if not self._read_more():
+                if self._error is not None:
+                    raise self._error
+                return
+
+    def _read_more(self) -> bool:
+        """
+        Feeds the next chunk of the response stream.
+        :return: False if the end of the stream (or a parse error) has already been reached
+        """
+        if self._eof or self._error is not None:
+            return False
+        self.feed(self._file.read(self.CHUNK_SIZE))
+        return True
+
+    @abstractmethod
+    def _parse(self, data: bytes) -> None:
+        """
+        Parses the chunk of the response, setting :attr:`head_parsed` at the end of the head
+        and appending the rows completed to the pending ones
+        :param data: Chunk of the response, empty at its end
+        """
+        pass
+
+    @staticmethod
+    def error_message(error: Exception) -> str:
+        """
+        :param error: One of the :attr:`PARSE_ERRORS` raised by this parser
+        :return: Human-readable description of the error
+        """
+        return str(error)
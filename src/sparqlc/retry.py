@@ -0,0 +1,142 @@
+import re
+from email.utils import parsedate_to_datetime
+from random import uniform
+from time import monotonic, time
+from typing import FrozenSet, Iterable, Optional, Tuple, Type
+
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, NewConnectionError, ProtocolError
+
+from .exception import SparqlException, SparqlProtocolException
+
+# Statuses with which the endpoints shed load or report a transient failure of a proxy
+DEFAULT_RETRY_STATUSES: FrozenSet[int] = frozenset({429, 502, 503, 504})
+
+# Failures to connect and connections reset or closed before the response was received.
+# Read timeouts are not retried by default, as a slow query would most likely time out again.
+DEFAULT_RETRY_EXCEPTIONS: Tuple[Type[BaseException], ...] = (
+    ConnectTimeoutError, NewConnectionError, ProtocolError, ConnectionError
+)
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF = 0.2
+DEFAULT_MAX_BACKOFF = 10.0
+DEFAULT_BUDGET = 30.0
+
+# The statement starts with a query form (after the comments and the PREFIX and BASE declarations)
+_query_form = re.compile(r'''
+    (?: \s+
+      | \#[^\n\r]*
+      | (?i:PREFIX) \s* (?:[^\W\d_](?:[\w.-]*[\w-])?)? : \s* <[^<>]*>
+      | (?i:BASE) \s* <[^<>]*>
+    )*
+    (?i:SELECT|ASK|CONSTRUCT|DESCRIBE)\b
+''', re.VERBOSE)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    :param value: Retry-After header, the number of seconds or the date to wait for
+    :return: The number of seconds to wait, None if the header is missing or not valid
+    """
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    When and how a query is sent again after a transient failure: a response with one of the `statuses`,
+    or one of the `exceptions` raised while connecting or waiting for the response. The `max_retries`
+    attempts wait for an exponential backoff with full jitter (a random time up to `backoff` seconds,
+    doubled after each attempt up to `max_backoff`), or for the Retry-After of the response if it is
+    longer. No attempt is made after the `budget` of seconds since the first one.
+
+    Only the queries (SELECT, ASK, CONSTRUCT, DESCRIBE) are retried, being idempotent, and only before
+    any row has been returned: a failure while the rows are read from the response is raised.
+    """
+
+    def __init__(
+            self,
+            max_retries: int = DEFAULT_MAX_RETRIES,
+            statuses: Iterable[int] = DEFAULT_RETRY_STATUSES,
+            exceptions: Tuple[Type[BaseException], ...] = DEFAULT_RETRY_EXCEPTIONS,
+            backoff: float = DEFAULT_BACKOFF,
+            max_backoff: float = DEFAULT_MAX_BACKOFF,
+            budget: Optional[float] = DEFAULT_BUDGET,
+            respect_retry_after: bool = True
+    ):
+        """
+        :param max_retries: Maximum number of attempts after the first one
+        :param statuses: Response statuses which are retried
+        :param exceptions: Errors of the HTTP client which are retried
+        :param backoff: Maximum wait before the first retry in seconds
+        :param max_backoff: Maximum wait before any retry in seconds
+        :param budget: Time in seconds after the first attempt in which the retries are made, None for no limit
+        :param respect_retry_after: Whether a longer Retry-After of the response is waited for
+        """
+        self.max_retries: int = max_retries
+        self.statuses: FrozenSet[int] = frozenset(statuses)
+        self.exceptions: Tuple[Type[BaseException], ...] = exceptions
+        self.backoff: float = backoff
+        self.max_backoff: float = max_backoff
+        self.budget: Optional[float] = budget
+        self.respect_retry_after: bool = respect_retry_after
+
+    @staticmethod
+    def idempotent(statement: str) -> bool:
+        """
+        :return: True if the statement is a query, which can be sent again, False for an update
+        """
+        return _query_form.match(statement) is not None
+
+    def retryable(self, error: SparqlException) -> bool:
+        """
+        :return: True if the error is a transient failure which the policy retries
+        """
+        if isinstance(error, SparqlProtocolException):
+            return error.code in self.statuses
+        cause = error.__cause__
+        if isinstance(cause, MaxRetryError):
+            # urllib3 gave up retrying the connection itself
+            cause = cause.reason
+        return isinstance(cause, self.exceptions)
+
+    def start(self, statement: str) -> Optional['RetryState']:
+        """
+        :return: The state of the retries of a query sending the statement, None if it is not retried
+        """
+        return RetryState(self) if self.max_retries > 0 and self.idempotent(statement) else None
+
+
+class RetryState:
+    """
+    Retries of a query under a :class:`RetryPolicy`
+    """
+
+    def __init__(self, policy: RetryPolicy):
+        self._policy: RetryPolicy = policy
+        self._deadline: Optional[float] = None if policy.budget is None else monotonic() + policy.budget
+        self.retries: int = 0
+
+    def delay(self, error: SparqlException) -> Optional[float]:
+        """
+        Counts a retry after the error, if the policy allows it
+        :return: Seconds to wait before sending the query again, None to raise the error
+        """
+        policy = self._policy
+        if self.retries >= policy.max_retries or not policy.retryable(error):
+            return None
+        delay = uniform(0.0, min(policy.max_backoff, policy.backoff * 2 ** self.retries))
+        retry_after = getattr(error, 'retry_after', None)
+        if policy.respect_retry_after and retry_after is not None:
+            delay = max(delay, retry_after)
+        if self._deadline is not None and monotonic() + delay > self._deadline:
+            return None
+        self.retries += 1
+        return delay
@@ -1,7 +1,13 @@
 from base64 import encodebytes
+from collections import OrderedDict
+from os import getpid
+from threading import Lock
+from typing import Dict, Iterable, Sequence, Tuple
 
 from urllib3 import HTTPResponse, PoolManager
 
+from .batch import DEFAULT_MAX_WORKERS, QueryBatch
+from .endpoint_pool import Balancing, EndpointPool
 from .query import Query
 from .result_set import RawResultSet, ResultSet
 from .service_base import DEFAULT_ACCEPT, ServiceBase
@@ -45,6 +51,39 @@ class Service(ServiceBase):
         """
         return self.create_query().raw_query(query_str)
 
+    def query_many(
+            self,
+            statements: Iterable[str],
+            max_workers: int = DEFAULT_MAX_WORKERS,
+            ordered: bool = True,
+            raw: bool = False) -> QueryBatch:
+        """
+        Runs the statements concurrently on a thread pool, sharing the connection pool of the service,
+        which is enlarged to keep a connection per worker.
+        :param statements: Statements to run
+        :param max_workers: Maximum number of queries running concurrently
+        :param ordered: Generate the results in the order of the statements, rather than as they complete
+        :param raw: Fetch the raw rows (see :func:`raw_query`) rather than converted ones
+        :return: Batch generating the rows (or the error) of each statement, with timing statistics
+        """
+        self.pool_size = max(self.pool_size, max_workers)
+        return QueryBatch(self.raw_query if raw else self.query, statements, max_workers, ordered)
+
+    @property
+    def pool_size(self) -> int:
+        """
+        Maximum number of connections kept open for reuse per host.
+        Changing it drops the connection pools held so far (their idle connections are closed,
+        those in use are closed once released), so that it applies to all the hosts.
+        """
+        return self._pool_manager.connection_pool_kw.get('maxsize', 1)
+
+    @pool_size.setter
+    def pool_size(self, pool_size: int) -> None:
+        if pool_size != self.pool_size:
+            self._pool_manager.connection_pool_kw['maxsize'] = pool_size
+            self._pool_manager.clear()
+
     def authenticate(self, username, password):
         b64_encoded = encodebytes(bytes(f"{username}:{password}")).replace(bytes("\012"), bytes())
         self._headers_map['Authorization'] = f"Basic {b64_encoded}"
@@ -52,6 +91,131 @@ class Service(ServiceBase):
     def pool_request(self, method: SparqlMethod, url: str, **kwargs) -> HTTPResponse:
         return self._pool_manager.request(str(method), url, **kwargs)
 
+    @property
+    def connection_stats(self) -> Dict[str, int]:
+        """
+        Counters of the connection pools (one per host) currently held by the service:
+        the number of `requests` sent, of the `connections` opened for them and of the
+        requests which `reused` an already open connection.
+        """
+        pools = self._pool_manager.pools
+        requests = connections = 0
+        for key in pools.keys():
+            try:
+                pool = pools[key]
+            except KeyError:
+                # Dropped in the meantime
+                continue
+            requests += pool.num_requests
+            connections += pool.num_connections
+        return {'requests': requests, 'connections': connections, 'reused': requests - connections}
+
+    def close(self) -> None:
+        """
+        Closes the idle pooled connections. Connections of result sets still being read
+        are closed when those finish.
+        """
+        self._pool_manager.clear()
+
+
+class ReplicaService(Service):
+    """
+    Service of several replicas of the same dataset: each request is sent to one of the `endpoints`,
+    picked by the `balancing` of its :attr:`endpoint_pool`. The first endpoint identifies the service
+    (and its results in the :attr:`result_cache`).
+    """
+
+    def __init__(
+            self,
+            endpoints: Sequence[str],
+            method: SparqlMethod = SparqlMethod.POST,
+            encoding: str = DEFAULT_ENCODING,
+            accept: str = DEFAULT_ACCEPT,
+            max_redirects: int = DEFAULT_MAX_REDIRECTS,
+            timeout: float = DEFAULT_TIMEOUT,
+            balancing: Balancing = Balancing.LEAST_OUTSTANDING):
+        pool = EndpointPool(endpoints, balancing)
+        super().__init__(pool.endpoints[0], method, encoding, accept, max_redirects, timeout)
+        self.endpoint_pool = pool
+
+
+# Default maximum number of services held by a ServiceRegistry
+DEFAULT_REGISTRY_SIZE = 32
+
+
+class ServiceRegistry:
+    """
+    Bounded registry of :class:`Service` instances, keyed by the endpoint and
+    the settings, so that the repeated queries reuse the pooled connections.
+    The least recently used service is closed and dropped once the registry is full.
+
+    The registry is fork-safe: a forked child process starts with an empty registry
+    and never uses the connections inherited from its parent.
+    The services of the registry are shared, do not modify them.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_REGISTRY_SIZE):
+        self._maxsize: int = maxsize
+        self._services: OrderedDict[Tuple, Service] = OrderedDict()
+        self._lock: Lock = Lock()
+        self._pid: int = getpid()
+
+    @property
+    def maxsize(self) -> int:
+        return self._maxsize
+
+    def __len__(self) -> int:
+        return len(self._services)
+
+    def get(
+            self,
+            endpoint: str,
+            method: SparqlMethod = SparqlMethod.POST,
+            encoding: str = DEFAULT_ENCODING,
+            accept: str = DEFAULT_ACCEPT,
+            max_redirects: int = DEFAULT_MAX_REDIRECTS,
+            timeout: float = DEFAULT_TIMEOUT) -> Service:
+        """
+        :return: The registered service for the endpoint and the settings, created if there is none
+        """
+        self._check_fork()
+        key = (endpoint, method, encoding, accept, max_redirects, timeout)
+        with self._lock:
+            service = self._services.get(key)
+            if service is not None:
+                self._services.move_to_end(key)
+                return service
+            service = self._services[key] = Service(endpoint, method, encoding, accept, max_redirects, timeout)
+            evicted = []
+            while len(self._services) > self._maxsize:
+                evicted.append(self._services.popitem(last=False)[1])
+        for old_service in evicted:
+            old_service.close()
+        return service
+
+    def clear(self) -> None:
+        """
+        Closes and drops all the services
+        """
+        self._check_fork()
+        with self._lock:
+            services = list(self._services.values())
+            self._services.clear()
+        for service in services:
+            service.close()
+
+    def _check_fork(self) -> None:
+        if self._pid != getpid():
+            # The lock may have been held by another thread of the parent at the time of the fork.
+            # The inherited services are dropped without closing, their sockets belong to the parent.
+            self._lock = Lock()
+            self._services = OrderedDict()
+            self._pid = getpid()
+
+
+# Registry of the services used by :func:`query` and :func:`raw_query`
+service_registry = ServiceRegistry()
+
 
 def query(endpoint: str,
           query_str: str,
@@ -62,10 +226,10 @@ def query(endpoint: str,
           timeout: float = DEFAULT_TIMEOUT) -> ResultSet:
     """
     Convenient method to execute a single query.
-    Exactly equivalent to:
+    Equivalent to:
         sparql.Service(endpoint).query(query)
-    Only use it for one-off queries, as it manages the thread pool.
-    If you need multitude of queries, create a service once and use it repeatedly.
+    except that the service (and its connection pool) is shared with the other calls
+    for the same endpoint and settings, see :data:`service_registry`.
 
     :param endpoint: HTTP endpoint to run the query against
     :param query_str: Query string
@@ -76,7 +240,7 @@ def query(endpoint: str,
     :param timeout: Timeout in seconds
     :return: The result of the query
     """
-    return Service(endpoint, method, encoding, accept, max_redirects, timeout).query(query_str)
+    return service_registry.get(endpoint, method, encoding, accept, max_redirects, timeout).query(query_str)
 
 
 def raw_query(endpoint: str,
@@ -88,10 +252,10 @@ def raw_query(endpoint: str,
               timeout: float = DEFAULT_TIMEOUT) -> RawResultSet:
     """
     Convenient method to execute a single query, returning RawResultSet instead of ResultSet.
-    Exactly equivalent to:
-        sparql.Service(endpoint).query(query)
-    Only use it for one-off queries, as it manages the thread pool.
-    If you need multitude of queries, create a service once and use it repeatedly.
+    Equivalent to:
+        sparql.Service(endpoint).raw_query(query)
+    except that the service (and its connection pool) is shared with the other calls
+    for the same endpoint and settings, see :data:`service_registry`.
 
     :param endpoint: HTTP endpoint to run the query against
     :param query_str: Query string
@@ -102,4 +266,4 @@ def raw_query(endpoint: str,
     :param timeout: Timeout in seconds
     :return: The result of the query
     """
-    return Service(endpoint, method, encoding, accept, max_redirects, timeout).raw_query(query_str)
+    return service_registry.get(endpoint, method, encoding, accept, max_redirects, timeout).raw_query(query_str)
@@ -1,10 +1,21 @@
 from abc import abstractmethod
+from copy import deepcopy
 from enum import Enum
-from typing import Any, Dict, List
+from io import IOBase
+from typing import Any, Dict, FrozenSet, List, Optional, Set
 
 from overrides import overrides
 from urllib3 import HTTPResponse
+from urllib3.exceptions import HTTPError
 
+from .circuit_breaker import CircuitBreaker
+from .config import ConfigSnapshot, ObservedDict, ObservedList
+from .endpoint_pool import EndpointPool
+from .hedging import HedgingPolicy
+from .rate_limit import RateLimiter
+from .result_cache import ResultCacheBase
+from .retry import RetryPolicy
+from .single_flight import SingleFlight
 from .version import VERSION
 
 HEADER_ACCEPT = 'Accept'
@@ -15,21 +26,66 @@ USER_AGENT = f"sparql-client/{VERSION} +https://github.com/vlastocom/sparql-conn
 RESULT_TYPE_SPARQL_XML = 'application/sparql-results+xml'
 RESULT_TYPE_SPARQL_JSON = 'application/sparql-results+json'
 RESULT_TYPE_XML_SCHEMA = 'application/x-ms-access-export+xml'
+RESULT_TYPE_TSV = 'text/tab-separated-values'
+RESULT_TYPE_CSV = 'text/csv'
+RESULT_TYPE_BINARY = 'application/x-binary-rdf-results-table'
 RESULTS_TYPES = {
     'xml': RESULT_TYPE_SPARQL_XML,
     'xmlschema': RESULT_TYPE_XML_SCHEMA,
     'json': RESULT_TYPE_SPARQL_JSON,
+    'tsv': RESULT_TYPE_TSV,
+    'csv': RESULT_TYPE_CSV,
+    'binary': RESULT_TYPE_BINARY,
 }
 DEFAULT_ACCEPT = RESULT_TYPE_SPARQL_XML
 DEFAULT_MAX_REDIRECTS: int = 5
 DEFAULT_TIMEOUT: float = 0.0
 DEFAULT_ENCODING: str = 'utf-8'
+# Longest GET request URI sent by SparqlMethod.AUTO, a limit most servers and proxies accept
+DEFAULT_MAX_GET_URI_LENGTH: int = 2048
+
+# Unread rest of a response up to this size is drained to return its connection to the pool,
+# a longer rest is discarded by closing the connection, as reading it would cost more than a new one.
+MAX_DRAIN: int = 64 * 1024
+DRAIN_CHUNK_SIZE: int = 16 * 1024
+
+
+def release_response(response: IOBase, max_drain: int = MAX_DRAIN) -> bool:
+    """
+    Finishes the response, returning its connection to the pool for reuse where possible.
+    The unread rest of the response is drained if it is not longer than `max_drain` bytes,
+    otherwise the connection is closed. Streams other than `HTTPResponse` are just closed.
+
+    :param response: Response (or any other stream) to finish
+    :param max_drain: Maximum number of bytes read to drain the response, 0 reads nothing
+    :return: True if the connection was returned to the pool, False if it was closed
+    """
+    release_conn = getattr(response, 'release_conn', None)
+    if release_conn is not None:
+        if response.closed:
+            # Fully read, there is nothing left on the connection
+            release_conn()
+            return True
+        try:
+            drained = 0
+            while drained < max_drain:
+                data = response.read(DRAIN_CHUNK_SIZE, decode_content=False)
+                if not data:
+                    release_conn()
+                    return True
+                drained += len(data)
+        except (HTTPError, OSError):
+            pass
+    response.close()
+    return False
 
 
 class SparqlMethod(Enum):
     GET = 1
     POST = 2
     POST_URL_ENCODED = 3
+    # GET, unless the URI is too long or the endpoint does not accept GET, then `auto_post_method`
+    AUTO = 4
 
     @overrides
     def __str__(self):
@@ -52,14 +108,30 @@ class ServiceBase(object):
         self._method: SparqlMethod = method
         self._endpoint: str = endpoint
         self._encoding: str = encoding
-        self._default_graphs: List[str] = []
-        self._named_graphs: List[str] = []
-        self._prefix_map: Dict[str, str] = dict()
-        self._headers_map: Dict[str, str] = {
+        self._used_prefixes_only: bool = False
+        self._max_get_uri_length: int = DEFAULT_MAX_GET_URI_LENGTH
+        self._auto_post_method: SparqlMethod = SparqlMethod.POST_URL_ENCODED
+        # Endpoints which answered a GET request with 414 (URI Too Long) or 405 (Method Not Allowed)
+        self._get_rejected: Set[str] = set()
+        # Any change of the containers drops the snapshot of the configuration
+        self._snapshot: Optional[ConfigSnapshot] = None
+        self._shared_config: bool = False
+        self._default_graphs: List[str] = ObservedList(self._changed)
+        self._named_graphs: List[str] = ObservedList(self._changed)
+        self._prefix_map: Dict[str, str] = ObservedDict(self._changed)
+        self._headers_map: Dict[str, str] = ObservedDict(self._changed, {
             HEADER_ACCEPT: accept,
             HEADER_USER_AGENT: USER_AGENT,
-        }
-        self._request_kwargs: Dict[str, Any] = dict()
+        })
+        self._request_kwargs: Dict[str, Any] = ObservedDict(self._changed)
+        self._result_cache: Optional[ResultCacheBase] = None
+        self._single_flight: Optional[SingleFlight] = None
+        self._retry_policy: Optional[RetryPolicy] = None
+        self._circuit_breaker: Optional[CircuitBreaker] = None
+        self._endpoint_pool: Optional[EndpointPool] = None
+        self._hedging_policy: Optional[HedgingPolicy] = None
+        self._rate_limiter: Optional[RateLimiter] = None
+        self._rate_limit_blocking: Optional[bool] = None
         self.timeout = timeout
         self.max_redirects = max_redirects
 
@@ -93,34 +165,82 @@ class ServiceBase(object):
 
     @accept.setter
     def accept(self, accept_str: str) -> None:
-        self._headers_map[HEADER_ACCEPT] = accept_str
+        self.headers[HEADER_ACCEPT] = accept_str
 
     @property
     def headers(self) -> Dict[str, str]:
+        self._own_config()
         return self._headers_map
 
     @property
     def default_graphs(self) -> List[str]:
+        self._own_config()
         return self._default_graphs
 
     @property
     def named_graphs(self) -> List[str]:
+        self._own_config()
         return self._named_graphs
 
     def set_prefix(self, prefix: str, uri: str):
-        self._prefix_map[prefix] = uri
+        self.prefixes[prefix] = uri
 
     @property
     def prefixes(self) -> Dict[str, str]:
+        self._own_config()
         return self._prefix_map
 
+    @property
+    def used_prefixes_only(self) -> bool:
+        """
+        Whether a query declares only the :attr:`prefixes` its statement uses (and does not declare
+        itself) rather than all of them, False by default. The statements are scanned once per text.
+        """
+        return self._used_prefixes_only
+
+    @used_prefixes_only.setter
+    def used_prefixes_only(self, used_prefixes_only: bool) -> None:
+        self._used_prefixes_only = used_prefixes_only
+
+    @property
+    def max_get_uri_length(self) -> int:
+        """
+        Longest URI of a GET request sent with :attr:`SparqlMethod.AUTO`, longer requests are POSTed
+        """
+        return self._max_get_uri_length
+
+    @max_get_uri_length.setter
+    def max_get_uri_length(self, max_get_uri_length: int) -> None:
+        self._max_get_uri_length = max_get_uri_length
+
+    @property
+    def auto_post_method(self) -> SparqlMethod:
+        """
+        Method used by :attr:`SparqlMethod.AUTO` instead of GET, POST_URL_ENCODED by default
+        """
+        return self._auto_post_method
+
+    @auto_post_method.setter
+    def auto_post_method(self, method: SparqlMethod) -> None:
+        if method not in (SparqlMethod.POST, SparqlMethod.POST_URL_ENCODED):
+            raise ValueError(f'Unsupported fallback method {method}, expected POST or POST_URL_ENCODED')
+        self._auto_post_method = method
+
+    @property
+    def get_rejected(self) -> FrozenSet[str]:
+        """
+        Endpoints to which :attr:`SparqlMethod.AUTO` no longer sends GET requests, as they answered one
+        with 414 (URI Too Long) or 405 (Method Not Allowed). Shared by the service and its queries.
+        """
+        return frozenset(self._get_rejected)
+
     @property
     def max_redirects(self) -> int:
         return self._request_kwargs[self.PARAM_MAX_REDIRECTS]
 
     @max_redirects.setter
     def max_redirects(self, max_redirects: int) -> None:
-        self._request_kwargs[self.PARAM_MAX_REDIRECTS] = max_redirects
+        self.request_kwargs[self.PARAM_MAX_REDIRECTS] = max_redirects
 
     @property
     def timeout(self) -> float:
@@ -129,14 +249,147 @@ class ServiceBase(object):
     @timeout.setter
     def timeout(self, timeout: float) -> None:
         if timeout > 0.0:
-            self._request_kwargs[self.PARAM_TIMEOUT] = timeout
+            self.request_kwargs[self.PARAM_TIMEOUT] = timeout
         elif self.PARAM_TIMEOUT in self._request_kwargs:
-            self._request_kwargs.pop(self.PARAM_TIMEOUT)
+            self.request_kwargs.pop(self.PARAM_TIMEOUT)
 
     @property
     def request_kwargs(self) -> Dict[str, Any]:
+        self._own_config()
         return self._request_kwargs
 
+    def snapshot(self) -> ConfigSnapshot:
+        """
+        :return: Copy of the current headers, prefixes, graphs and request arguments,
+                 made once and shared until they change
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self._snapshot = ConfigSnapshot(
+                self._headers_map, self._prefix_map, self._default_graphs, self._named_graphs, self._request_kwargs
+            )
+        return snapshot
+
+    def _share_config(self, snapshot: ConfigSnapshot) -> None:
+        """
+        Uses the configuration of the snapshot, which is copied once it is about to change
+        """
+        self._snapshot = snapshot
+        self._headers_map = snapshot.headers
+        self._prefix_map = snapshot.prefixes
+        self._default_graphs = snapshot.default_graphs
+        self._named_graphs = snapshot.named_graphs
+        self._request_kwargs = snapshot.request_kwargs
+        self._shared_config = True
+
+    def _own_config(self) -> None:
+        """
+        Replaces the containers shared with the snapshot by own copies, before they are handed out or changed
+        """
+        if self._shared_config:
+            self._default_graphs = ObservedList(self._changed, self._default_graphs)
+            self._named_graphs = ObservedList(self._changed, self._named_graphs)
+            self._prefix_map = ObservedDict(self._changed, self._prefix_map)
+            self._headers_map = ObservedDict(self._changed, self._headers_map)
+            self._request_kwargs = ObservedDict(self._changed, deepcopy(self._request_kwargs))
+            self._shared_config = False
+
+    def _changed(self) -> None:
+        self._snapshot = None
+
+    @property
+    def result_cache(self) -> Optional[ResultCacheBase]:
+        """
+        Cache of the query results, None (the default) sends every query to the endpoint
+        """
+        return self._result_cache
+
+    @result_cache.setter
+    def result_cache(self, result_cache: Optional[ResultCacheBase]) -> None:
+        self._result_cache = result_cache
+
+    @property
+    def single_flight(self) -> Optional[SingleFlight]:
+        """
+        Coalescing of the identical queries in progress into a single request, whose response
+        is received in full and shared; None (the default) sends each query on its own.
+        Not used by the :class:`AsyncService`.
+        """
+        return self._single_flight
+
+    @single_flight.setter
+    def single_flight(self, single_flight: Optional[SingleFlight]) -> None:
+        self._single_flight = single_flight
+
+    @property
+    def retry_policy(self) -> Optional[RetryPolicy]:
+        """
+        Policy sending the queries again after transient failures, None (the default) does not retry
+        """
+        return self._retry_policy
+
+    @retry_policy.setter
+    def retry_policy(self, retry_policy: Optional[RetryPolicy]) -> None:
+        self._retry_policy = retry_policy
+
+    @property
+    def circuit_breaker(self) -> Optional[CircuitBreaker]:
+        """
+        Circuit breaker failing the queries fast while their endpoint is failing, None (the default) has none
+        """
+        return self._circuit_breaker
+
+    @circuit_breaker.setter
+    def circuit_breaker(self, circuit_breaker: Optional[CircuitBreaker]) -> None:
+        self._circuit_breaker = circuit_breaker
+
+    @property
+    def endpoint_pool(self) -> Optional[EndpointPool]:
+        """
+        Replicas of the endpoint among which each request picks one, None (the default) sends the requests
+        to the :attr:`endpoint`, which still identifies the results in the :attr:`result_cache`
+        """
+        return self._endpoint_pool
+
+    @endpoint_pool.setter
+    def endpoint_pool(self, endpoint_pool: Optional[EndpointPool]) -> None:
+        self._endpoint_pool = endpoint_pool
+
+    @property
+    def hedging_policy(self) -> Optional[HedgingPolicy]:
+        """
+        Policy sending a query again when its response is late, the first response being used,
+        None (the default) does not hedge
+        """
+        return self._hedging_policy
+
+    @hedging_policy.setter
+    def hedging_policy(self, hedging_policy: Optional[HedgingPolicy]) -> None:
+        self._hedging_policy = hedging_policy
+
+    @property
+    def rate_limiter(self) -> Optional[RateLimiter]:
+        """
+        Limits of the rate and of the concurrency of the requests to each endpoint, None (the default) has none
+        """
+        return self._rate_limiter
+
+    @rate_limiter.setter
+    def rate_limiter(self, rate_limiter: Optional[RateLimiter]) -> None:
+        self._rate_limiter = rate_limiter
+
+    @property
+    def rate_limit_blocking(self) -> Optional[bool]:
+        """
+        Whether the requests wait for the :attr:`rate_limiter`, or fail right away if its limits are reached,
+        None (the default) as the limiter is `blocking`. Set on a query, it only applies to that query.
+        """
+        return self._rate_limit_blocking
+
+    @rate_limit_blocking.setter
+    def rate_limit_blocking(self, blocking: Optional[bool]) -> None:
+        self._rate_limit_blocking = blocking
+
     @abstractmethod
     def pool_request(self, method: SparqlMethod, url: str, **kwargs) -> HTTPResponse:
         pass
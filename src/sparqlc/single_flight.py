@@ -0,0 +1,73 @@
+from threading import Event, Lock
+from typing import Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class _Flight(Generic[T]):
+    """
+    Call in progress, awaited by the followers
+    """
+
+    def __init__(self):
+        self.done: Event = Event()
+        self.result: Optional[T] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[T]):
+    """
+    Coalesces the concurrent calls of the same key: while a call (the leader) is in progress,
+    the calls of the same key (the followers) wait for it and share its result, or its error,
+    rather than doing the work again. The next call after it has finished starts a new one.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight[T]] = {}
+        self._lock: Lock = Lock()
+        self._leaders: int = 0
+        self._followers: int = 0
+
+    def __len__(self) -> int:
+        """
+        :return: Number of the calls in progress
+        """
+        return len(self._flights)
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """
+        Calls `fn`, unless a call of the same key is in progress, then waits for that call
+        :return: The result of the call
+        :raise: The error raised by the call, also in the followers
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._leaders += 1
+            else:
+                self._followers += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Counters of the calls: the number of `leaders` which did the work,
+        and of the `followers` which shared the result of a leader.
+        """
+        return {'leaders': self._leaders, 'followers': self._followers}
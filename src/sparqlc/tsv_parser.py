@@ -0,0 +1,213 @@
+import codecs
+import csv
+import re
+from abc import abstractmethod
+from io import IOBase
+from itertools import chain
+from typing import Iterable, Iterator, List, Optional
+
+from .datatypes import BlankNode, Datatype, IRI, Literal, RDFTerm
+from .datatypes import XSD_BOOLEAN, XSD_DECIMAL, XSD_DOUBLE, XSD_INTEGER
+from .n3_parser import parse_n3_term
+from .result_parser import ResultParser
+
+# Name of the single variable some endpoints (e.g. Jena Fuseki) use to return the ASK result
+ASK_RESULT_VARIABLE = '_askResult'
+
+_tsv_integer = re.compile(r'[+-]?\d+$')
+_tsv_decimal = re.compile(r'[+-]?\d*\.\d+$')
+_tsv_double = re.compile(r'[+-]?(\d+\.?\d*|\.\d+)[eE][+-]?\d+$')
+_tsv_escape = re.compile(r'\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)')
+_tsv_escape_map = {
+    't': '\t',
+    'b': '\b',
+    'n': '\n',
+    'r': '\r',
+    'f': '\f',
+    '"': '"',
+    "'": "'",
+    '\\': '\\',
+}
+
+
+def _unescape(m: re.Match) -> str:
+    seq = m.group(1)
+    if len(seq) > 1:
+        return chr(int(seq[1:], 16))
+    if seq not in _tsv_escape_map:
+        raise ValueError(f'Invalid escape sequence "\\{seq}"')
+    return _tsv_escape_map[seq]
+
+
+def parse_tsv_term(src: str) -> RDFTerm:
+    """
+    Parse a single field of the SPARQL TSV result format into a RDFTerm object.
+
+    Unlike :func:`parse_n3_term`, this understands blank nodes and the abbreviated
+    numeric and boolean literals of the Turtle syntax, and it is optimised for
+    the common cases, falling back to :func:`parse_n3_term` for the rest.
+    """
+    first = src[0]
+    if first == '<':
+        if src[-1] != '>':
+            raise ValueError(f'Invalid IRI {src}')
+        return IRI(src[1:-1])
+    elif first == '"' or first == "'":
+        end = src.rfind(first)
+        if end == 0 or src.startswith(first * 3):
+            return parse_n3_term(src)
+        value = src[1:end]
+        if '\\' in value:
+            value = _tsv_escape.sub(_unescape, value)
+        suffix = src[end + 1:]
+        if not suffix:
+            return Literal(value)
+        elif suffix[0] == '@':
+            return Literal(value, lang=suffix[1:])
+        elif suffix.startswith('^^<') and suffix[-1] == '>':
+            return Literal(value, Datatype(suffix[3:-1]))
+        raise ValueError(f'Invalid literal {src}')
+    elif first == '_' and src.startswith('_:'):
+        return BlankNode(src[2:])
+    elif src == 'true' or src == 'false':
+        return Literal(src, XSD_BOOLEAN)
+    elif _tsv_integer.match(src):
+        return Literal(src, XSD_INTEGER)
+    elif _tsv_decimal.match(src):
+        return Literal(src, XSD_DECIMAL)
+    elif _tsv_double.match(src):
+        return Literal(src, XSD_DOUBLE)
+    return parse_n3_term(src)
+
+
+class _LineResultParser(ResultParser):
+    """
+    Common base of the parsers of the line-based SPARQL result formats.
+    The UTF-8 encoded stream is split into lines, only the line feed terminates a line
+    (a preceding carriage return is retained).
+    """
+    PARSE_ERRORS = (ValueError, csv.Error)
+
+    def __init__(self, file: IOBase, iri_cache_size: int = 0):
+        super().__init__(file, iri_cache_size)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        # Beginning of the line continued by the next chunk
+        self._rest: str = ''
+
+    @abstractmethod
+    def _records(self, lines: List[str]) -> Iterable[List[str]]:
+        """
+        :param lines: Lines of the stream, without their line feed
+        :return: The fields of each line (record) completed by the lines
+        """
+        pass
+
+    @staticmethod
+    def _variable(field: str) -> str:
+        return field
+
+    @abstractmethod
+    def _term(self, field: str) -> Optional[RDFTerm]:
+        """
+        :param field: Non-empty field of a record
+        :return: The term the field represents
+        """
+        pass
+
+    def _parse(self, data: bytes) -> None:
+        lines = (self._rest + self._decoder.decode(data, final=self._eof)).split('\n')
+        self._rest = lines.pop()
+        if self._eof and self._rest:
+            lines.append(self._rest)
+        records = iter(self._records(lines))
+        if not self._head_done:
+            records = self._parse_header(records)
+        width = len(self.variables)
+        term = self._term
+        pending = self._pending
+        for record in records:
+            if len(record) != width:
+                raise ValueError(f'Expected {width} fields, found {len(record)}: {record}')
+            pending.append(tuple([term(field) if field else None for field in record]))
+
+    def _parse_header(self, records: Iterator[List[str]]) -> Iterator[List[str]]:
+        """
+        Parses the header among the first records, and the result following it if it is the one of an ASK query
+        :return: The rest of the records
+        """
+        for record in records:
+            if self.variables != [ASK_RESULT_VARIABLE]:
+                if record != ['']:
+                    self.variables.extend(self._variable(f) for f in record)
+                if self.variables != [ASK_RESULT_VARIABLE]:
+                    self._head_done = True
+                    return records
+            else:
+                self._head_done = True
+                if record[0] in ('true', 'false'):
+                    self.variables.clear()
+                    self.has_result = record[0] == 'true'
+                    return records
+                # A SELECT projecting ?_askResult, the record is its first row
+                return chain([record], records)
+        return records
+
+
+class TsvResultParser(_LineResultParser):
+    """
+    Streaming parser of the SPARQL TSV result format
+    (https://www.w3.org/TR/sparql11-results-csv-tsv/).
+    The terms are encoded in the Turtle syntax, so the format is lossless.
+    """
+
+    def _records(self, lines: List[str]) -> Iterable[List[str]]:
+        return [line.rstrip('\r').split('\t') for line in lines]
+
+    @staticmethod
+    def _variable(field: str) -> str:
+        return field[1:] if field[:1] in ('?', '$') else field
+
+    def _term(self, field: str) -> Optional[RDFTerm]:
+        if field[0] == '<' and field[-1] == '>':
+            return self._iri(field[1:-1])
+        return parse_tsv_term(field)
+
+
+class CsvResultParser(_LineResultParser):
+    """
+    Streaming parser of the SPARQL CSV result format
+    (https://www.w3.org/TR/sparql11-results-csv-tsv/).
+
+    The format does not preserve the type of the terms: blank nodes are
+    recognised by their `_:` prefix, all other values are returned as plain
+    literals. Unbound values and empty strings are indistinguishable and
+    both come back as `None`.
+    """
+
+    def __init__(self, file: IOBase, iri_cache_size: int = 0):
+        super().__init__(file, iri_cache_size)
+        # Lines of the record continued by the next chunk
+        self._held: List[str] = []
+        self._quoted: bool = False
+
+    def _records(self, lines: List[str]) -> Iterable[List[str]]:
+        # A line feed within a quoted value does not end the record: the records are complete
+        # up to the last line ending outside of the quotes
+        held = self._held
+        end = 0
+        for line in lines:
+            held.append(line + '\n')
+            if line.count('"') % 2:
+                self._quoted = not self._quoted
+            if not self._quoted:
+                end = len(held)
+        if self._eof:
+            end = len(held)
+        complete, self._held = held[:end], held[end:]
+        # csv returns no fields for an empty line, i.e. a single unbound value
+        return (record or [''] for record in csv.reader(complete))
+
+    def _term(self, field: str) -> Optional[RDFTerm]:
+        if field.startswith('_:'):
+            return BlankNode(field[2:])
+        return Literal(field)
@@ -0,0 +1,174 @@
+from enum import Enum
+from io import IOBase
+from typing import cast, Dict, List, Optional
+from xml.dom import pulldom
+from xml.dom.minidom import Element
+from xml.parsers import expat
+from xml.parsers.expat import ExpatError
+from xml.sax import make_parser, SAXParseException
+from xml.sax.handler import feature_namespaces
+
+from .datatypes import BlankNode, Datatype, Literal, RDFTerm
+from .result_parser import ResultParser
+
+
+class XmlBackend(Enum):
+    """ Parser backends available for the SPARQL XML result format """
+    EXPAT = 1
+    PULLDOM = 2
+
+
+class ExpatXmlParser(ResultParser):
+    """
+    Streaming parser of the SPARQL XML result format, which drives
+    `xml.parsers.expat` directly. The element callbacks implement a small
+    state machine building the rows without creating any DOM nodes.
+    """
+    PARSE_ERRORS = (ExpatError,)
+
+    def __init__(self, file: IOBase, iri_cache_size: int = 0):
+        super().__init__(file, iri_cache_size)
+        self._parser = expat.ParserCreate()
+        self._parser.buffer_text = True
+        self._parser.StartElementHandler = self._start_element
+        self._parser.EndElementHandler = self._end_element
+        self._parser.CharacterDataHandler = self._characters
+        self._var_index: Dict[str, int] = {}
+        self._row: List[Optional[RDFTerm]] = []
+        self._idx: int = -1
+        self._text: Optional[List[str]] = None
+        self._lang: Optional[str] = None
+        self._datatype: Optional[str] = None
+        self._started: bool = False
+
+    def _parse(self, data: bytes) -> None:
+        if data:
+            self._started = True
+            self._parser.Parse(data, False)
+        elif self._started:
+            # An empty stream is not an error, it just has no results
+            self._parser.Parse(b'', True)
+
+    def _start_element(self, name: str, attrs: Dict[str, str]) -> None:
+        if name == 'binding':
+            self._idx = self._var_index[attrs['name']]
+        elif name == 'literal':
+            self._text = []
+            self._lang = attrs.get('xml:lang')
+            self._datatype = Datatype(attrs.get('datatype'))
+        elif name == 'uri' or name == 'bnode' or name == 'boolean':
+            self._text = []
+        elif name == 'result':
+            self._head_done = True
+            self._row = [None] * len(self.variables)
+        elif name == 'variable':
+            self._var_index[attrs['name']] = len(self.variables)
+            self.variables.append(attrs['name'])
+
+    def _end_element(self, name: str) -> None:
+        if name == 'literal':
+            self._row[self._idx] = Literal(''.join(self._text), self._datatype, self._lang)
+            self._text = None
+        elif name == 'uri':
+            self._row[self._idx] = self._iri(''.join(self._text))
+            self._text = None
+        elif name == 'result':
+            self._pending.append(tuple(self._row))
+        elif name == 'bnode':
+            self._row[self._idx] = BlankNode(''.join(self._text))
+            self._text = None
+        elif name == 'boolean':
+            self.has_result = (''.join(self._text).strip() == 'true')
+            self._text = None
+        elif name == 'head':
+            if self.variables:
+                self._head_done = True
+        elif name == 'sparql':
+            self._head_done = True
+
+    def _characters(self, data: str) -> None:
+        if self._text is not None:
+            self._text.append(data)
+
+
+class PullDomXmlParser(ResultParser):
+    """
+    Parser of the SPARQL XML result format based on `xml.dom.pulldom`: the events of each chunk
+    fed to the SAX parser are handled as they come. Slower than :class:`ExpatXmlParser`, kept as a fallback.
+    """
+    PARSE_ERRORS = (SAXParseException,)
+
+    def __init__(self, file: IOBase, iri_cache_size: int = 0):
+        super().__init__(file, iri_cache_size)
+        self._pulldom = pulldom.PullDOM()
+        self._sax_parser = make_parser()
+        self._sax_parser.setFeature(feature_namespaces, True)
+        self._sax_parser.setContentHandler(self._pulldom)
+        self._idx: int = -1
+        self._row: List[Optional[RDFTerm]] = []
+        # Element of the term whose text is collected
+        self._term: Optional[Element] = None
+        self._text: List[str] = []
+
+    def _parse(self, data: bytes) -> None:
+        if data:
+            self._sax_parser.feed(data)
+        else:
+            self._sax_parser.close()
+        # The events are linked from the first one, which is a placeholder
+        first = self._pulldom.firstEvent
+        while first[1]:
+            (event, node), first[1] = first[1]
+            if event == pulldom.START_ELEMENT:
+                self._start_element(node)
+            elif event == pulldom.END_ELEMENT:
+                self._end_element(node)
+            elif event == pulldom.CHARACTERS and self._term is not None:
+                self._text.append(node.data)
+        self._pulldom.lastEvent = first
+
+    def _start_element(self, node: Element) -> None:
+        name = node.tagName
+        if name == 'binding':
+            self._idx = self.variables.index(node.getAttribute('name'))
+        elif name == 'uri' or name == 'literal' or name == 'bnode' or name == 'boolean':
+            self._term = node
+            self._text = []
+        elif name == 'result':
+            self._head_done = True
+            self._row = [None] * len(self.variables)
+        elif name == 'variable':
+            self.variables.append(node.getAttribute('name'))
+
+    def _end_element(self, node: Element) -> None:
+        name = node.tagName
+        if node is self._term:
+            self._term = None
+            data = ''.join(self._text)
+            if name == 'uri':
+                self._row[self._idx] = self._iri(data)
+            elif name == 'literal':
+                lang = node.getAttribute('xml:lang') or None
+                datatype = Datatype(node.getAttribute('datatype')) or None
+                self._row[self._idx] = Literal(data, datatype, lang)
+            elif name == 'bnode':
+                self._row[self._idx] = BlankNode(data)
+            else:
+                self.has_result = (data == 'true')
+        elif name == 'result':
+            self._pending.append(tuple(self._row))
+        elif name == 'head':
+            if self.variables:
+                self._head_done = True
+        elif name == 'sparql':
+            self._head_done = True
+
+    @staticmethod
+    def error_message(error: Exception) -> str:
+        return cast(SAXParseException, error).getMessage()
+
+
+XML_PARSERS = {
+    XmlBackend.EXPAT: ExpatXmlParser,
+    XmlBackend.PULLDOM: PullDomXmlParser,
+}
@@ -0,0 +1,251 @@
+import asyncio
+import inspect
+from typing import Awaitable, Callable, Dict, List, Set, Tuple, Union
+
+import pytest
+
+from sparqlc.async_http import AsyncHTTPError, AsyncPoolManager
+
+RESPONSE = Tuple[int, Dict[str, str], bytes]
+
+
+class StandInRequest:
+    def __init__(self, method: str, target: str, headers: Dict[str, str], body: bytes):
+        self.method: str = method
+        self.target: str = target
+        self.headers: Dict[str, str] = headers
+        self.body: bytes = body
+
+
+class StandInEndpoint:
+    """
+    Local asyncio HTTP/1.1 endpoint standing in for a SPARQL endpoint in the tests.
+    The handler returns the status, headers and body of the response to each request.
+    The body is sent in chunks if the handler sets `Transfer-Encoding: chunked`,
+    the connection is closed after the response if it sets `Connection: close`,
+    or silently if it sets `X-Close` (which is not sent).
+    """
+
+    def __init__(self, handler: Callable[[StandInRequest], Union[RESPONSE, Awaitable[RESPONSE]]]):
+        self.handler = handler
+        self.requests: List[StandInRequest] = []
+        self.connections: int = 0
+        self.url: str = ''
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._server = None
+
+    async def __aenter__(self) -> 'StandInEndpoint':
+        self._server = await asyncio.start_server(self._serve, '127.0.0.1', 0)
+        self.url = f'http://127.0.0.1:{self._server.sockets[0].getsockname()[1]}'
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._server.close()
+        for writer in self._writers:
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        self._writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, _ = line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                request = StandInRequest(method, target, headers, await reader.readexactly(
+                    int(headers.get('content-length', 0))
+                ))
+                self.requests.append(request)
+                response = self.handler(request)
+                status, response_headers, body = await response if inspect.isawaitable(response) else response
+                response_headers = dict(response_headers)
+                close = response_headers.pop('X-Close', None) or response_headers.get('Connection') == 'close'
+                chunked = response_headers.get('Transfer-Encoding') == 'chunked'
+                if not chunked and 'Content-Length' not in response_headers:
+                    response_headers['Content-Length'] = str(len(body))
+                head = [f'HTTP/1.1 {status} Status'] + [f'{name}: {value}' for name, value in response_headers.items()]
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+                if chunked:
+                    for i in range(0, len(body), 1000):
+                        part = body[i:i + 1000]
+                        writer.write(b'%x\r\n%s\r\n' % (len(part), part))
+                    writer.write(b'0\r\n\r\n')
+                elif method != 'HEAD':
+                    writer.write(body)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+
+def ok(body: bytes = b'hello', headers: Dict[str, str] = None) -> Callable[[StandInRequest], RESPONSE]:
+    return lambda request: (200, headers or {}, body)
+
+
+class TestAsyncPoolManager:
+    def test_keep_alive(self):
+        async def run():
+            async with StandInEndpoint(ok()) as endpoint:
+                manager = AsyncPoolManager()
+                for _ in range(3):
+                    response = await manager.request('GET', f'{endpoint.url}/x?a=b')
+                    assert response.status == 200
+                    assert await response.read() == b'hello'
+                    assert response.released
+                assert endpoint.connections == 1
+                assert [r.target for r in endpoint.requests] == ['/x?a=b'] * 3
+                assert endpoint.requests[0].headers['host'] == endpoint.url[len('http://'):]
+                pool = manager.pools[0]
+                assert (pool.num_requests, pool.num_connections) == (3, 1)
+                manager.clear()
+        asyncio.run(run())
+
+    def test_chunked(self):
+        body = bytes(range(256)) * 20
+
+        async def run():
+            async with StandInEndpoint(ok(body, {'Transfer-Encoding': 'chunked'})) as endpoint:
+                manager = AsyncPoolManager()
+                for _ in range(2):
+                    response = await manager.request('GET', endpoint.url)
+                    parts = []
+                    while data := await response.read(300):
+                        parts.append(data)
+                    assert b''.join(parts) == body
+                    assert response.released
+                assert endpoint.connections == 1
+        asyncio.run(run())
+
+    def test_post(self):
+        async def run():
+            async with StandInEndpoint(ok()) as endpoint:
+                response = await AsyncPoolManager().request(
+                    'POST', endpoint.url, headers={'Content-Type': 'text/plain'}, body=b'data'
+                )
+                assert await response.read() == b'hello'
+                request = endpoint.requests[0]
+                assert (request.method, request.body) == ('POST', b'data')
+                assert request.headers['content-type'] == 'text/plain'
+                assert request.headers['content-length'] == '4'
+        asyncio.run(run())
+
+    def test_connection_close(self):
+        async def run():
+            async with StandInEndpoint(ok(headers={'Connection': 'close'})) as endpoint:
+                manager = AsyncPoolManager()
+                for _ in range(2):
+                    response = await manager.request('GET', endpoint.url)
+                    assert await response.read() == b'hello'
+                    assert not response.released
+                assert endpoint.connections == 2
+        asyncio.run(run())
+
+    def test_closed_by_server(self):
+        async def run():
+            async with StandInEndpoint(ok(headers={'X-Close': 'yes'})) as endpoint:
+                manager = AsyncPoolManager()
+                for _ in range(3):
+                    response = await manager.request('GET', endpoint.url)
+                    assert await response.read() == b'hello'
+                assert endpoint.connections == 3
+                assert manager.pools[0].num_requests == 3
+        asyncio.run(run())
+
+    def test_redirect(self):
+        def handler(request: StandInRequest) -> RESPONSE:
+            if request.target == '/a':
+                return 302, {'Location': '/b'}, b'moved'
+            if request.target == '/see-other':
+                return 303, {'Location': '/b'}, b''
+            return 200, {}, request.method.encode()
+
+        async def run():
+            async with StandInEndpoint(handler) as endpoint:
+                manager = AsyncPoolManager()
+                response = await manager.request('POST', f'{endpoint.url}/a', body=b'x')
+                assert await response.read() == b'POST'
+                response = await manager.request('POST', f'{endpoint.url}/see-other', body=b'x')
+                assert await response.read() == b'GET'
+                assert endpoint.requests[-1].body == b''
+                assert endpoint.connections == 1
+                with pytest.raises(AsyncHTTPError):
+                    await manager.request('GET', f'{endpoint.url}/a', retries=0)
+        asyncio.run(run())
+
+    def test_redirect_loop(self):
+        async def run():
+            async with StandInEndpoint(lambda request: (301, {'Location': request.target}, b'')) as endpoint:
+                with pytest.raises(AsyncHTTPError):
+                    await AsyncPoolManager().request('GET', f'{endpoint.url}/loop', retries=3)
+                assert len(endpoint.requests) == 4
+        asyncio.run(run())
+
+    def test_timeout(self):
+        async def slow(request: StandInRequest) -> RESPONSE:
+            await asyncio.sleep(1)
+            return 200, {}, b''
+
+        async def run():
+            async with StandInEndpoint(slow) as endpoint:
+                with pytest.raises(asyncio.TimeoutError):
+                    await AsyncPoolManager().request('GET', endpoint.url, timeout=0.05)
+        asyncio.run(run())
+
+    def test_release(self):
+        small = b'x' * 1000
+        large = b'x' * 200_000
+
+        async def run():
+            async with StandInEndpoint(lambda request: (200, {}, large if request.target == '/large' else small)) \
+                    as endpoint:
+                manager = AsyncPoolManager()
+                response = await manager.request('GET', f'{endpoint.url}/small')
+                assert await response.read(10) == small[:10]
+                assert await response.release() is True
+                response = await manager.request('GET', f'{endpoint.url}/large')
+                assert len(await response.read(10)) == 10
+                assert await response.release() is False
+                response = await manager.request('GET', f'{endpoint.url}/small')
+                assert await response.read() == small
+                assert endpoint.connections == 2
+        asyncio.run(run())
+
+    def test_no_body(self):
+        async def run():
+            async with StandInEndpoint(lambda request: (204, {}, b'')) as endpoint:
+                manager = AsyncPoolManager()
+                response = await manager.request('GET', endpoint.url)
+                assert response.status == 204
+                assert response.released
+                assert await response.read() == b''
+                response = await manager.request('HEAD', endpoint.url)
+                assert await response.read() == b''
+                assert endpoint.connections == 1
+        asyncio.run(run())
+
+    def test_incomplete(self):
+        async def run():
+            async with StandInEndpoint(ok(headers={'Content-Length': '100', 'X-Close': 'yes'})) as endpoint:
+                response = await AsyncPoolManager().request('GET', endpoint.url)
+                with pytest.raises(AsyncHTTPError):
+                    await response.read()
+        asyncio.run(run())
+
+    def test_unsupported_url(self):
+        async def run():
+            with pytest.raises(AsyncHTTPError):
+                await AsyncPoolManager().request('GET', 'ftp://a.b/c')
+        asyncio.run(run())
@@ -0,0 +1,370 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from async_http_test import RESPONSE, StandInEndpoint, StandInRequest
+from result_set_test import resource, W3C_SAMPLE_RESULT, W3C_SAMPLE_RESULT_RAW, W3C_SAMPLE_RESULT_VARS
+from service_test import sample_result
+from sparqlc import AsyncRawResultSet, AsyncResultSet, AsyncService, IRI, RESULT_TYPE_SPARQL_JSON
+from sparqlc import RESULT_TYPE_SPARQL_XML, ResultCache, RetryPolicy, SparqlException, SparqlMethod
+from sparqlc import CircuitBreaker, CircuitState, SparqlCircuitOpenException, SparqlProtocolException
+from sparqlc import Balancing, EndpointPool, HedgingPolicy, RateLimiter, SparqlRateLimitException
+
+W3C_SAMPLE_XML = resource('w3c_sample_result.srx').encode('utf-8')
+W3C_SAMPLE_JSON = resource('w3c_sample_result.srj').encode('utf-8')
+
+
+def sparql_handler(request: StandInRequest) -> RESPONSE:
+    path = urlsplit(request.target).path
+    if path == '/json':
+        return 200, {'Content-Type': RESULT_TYPE_SPARQL_JSON}, W3C_SAMPLE_JSON
+    if path == '/error':
+        return 400, {'Content-Type': 'text/plain'}, b'Syntax error'
+    if path == '/large':
+        return 200, {'Content-Type': RESULT_TYPE_SPARQL_XML, 'Transfer-Encoding': 'chunked'}, sample_result(3000)
+    return 200, {'Content-Type': RESULT_TYPE_SPARQL_XML}, W3C_SAMPLE_XML
+
+
+class TestAsyncService:
+    def test_raw_query(self):
+        async def run():
+            async with StandInEndpoint(sparql_handler) as endpoint, AsyncService(endpoint.url) as service:
+                rs = await service.raw_query('SELECT * {?s ?p ?o}')
+                assert isinstance(rs, AsyncRawResultSet)
+                assert rs.variables == W3C_SAMPLE_RESULT_VARS
+                assert [row async for row in rs] == W3C_SAMPLE_RESULT_RAW
+        asyncio.run(run())
+
+    def test_query(self):
+        async def run():
+            async with StandInEndpoint(sparql_handler) as endpoint, AsyncService(f'{endpoint.url}/json') as service:
+                async with await service.query('SELECT * {?s ?p ?o}') as rs:
+                    assert isinstance(rs, AsyncResultSet)
+                    assert [row async for row in rs] == W3C_SAMPLE_RESULT
+                assert rs.closed
+        asyncio.run(run())
+
+    def test_large_result(self):
+        async def run():
+            async with StandInEndpoint(sparql_handler) as endpoint, AsyncService(f'{endpoint.url}/large') as service:
+                rows = [row async for row in await service.raw_query('SELECT * {?s ?p ?o}')]
+                assert len(rows) == 3000
+                assert rows[-1] == (IRI('http://example.org/resource/2999'),)
+        asyncio.run(run())
+
+    def test_configuration(self):
+        async def run():
+            async with StandInEndpoint(sparql_handler) as endpoint:
+                service = AsyncService(endpoint.url, SparqlMethod.GET, timeout=5)
+                service.set_prefix('ex', 'http://example.org/')
+                service.default_graphs.append('http://example.org/g1')
+                service.named_graphs.append('http://example.org/g2')
+                service.headers['X-Custom'] = 'custom'
+                await service.raw_query('SELECT * {?s ex:p ?o}')
+
+                request = endpoint.requests[0]
+                assert request.method == 'GET'
+                assert request.headers['accept'] == RESULT_TYPE_SPARQL_XML
+                assert request.headers['x-custom'] == 'custom'
+                params = parse_qs(urlsplit(request.target).query)
+                assert params == {
+                    'query': ['PREFIX ex: <http://example.org/> SELECT * {?s ex:p ?o}'],
+                    'default-graph-uri': ['http://example.org/g1'],
+                    'named-graph-uri': ['http://example.org/g2'],
+                }
+
+                service.method = SparqlMethod.POST
+                await service.raw_query('ASK {}')
+                request = endpoint.requests[1]
+                assert request.method == 'POST'
+                assert request.body == b'PREFIX ex: <http://example.org/> ASK {}'
+                assert request.headers['content-type'] == 'application/sparql-query'
+        asyncio.run(run())
+
+    def test_protocol_error(self):
+        async def run():
+            async with StandInEndpoint(sparql_handler) as endpoint, AsyncService(f'{endpoint.url}/error') as service:
+                with pytest.raises(SparqlProtocolException) as exc_info:
+                    await service.raw_query('SELECT')
+                assert exc_info.value.code == 400
+                assert exc_info.value.message == 'Syntax error'
+                with pytest.raises(SparqlProtocolException):
+                    await service.raw_query('SELECT')
+                assert service.connection_stats == {'requests': 2, 'connections': 1, 'reused': 1}
+        asyncio.run(run())
+
+    def test_connection_error(self):
+        async def run():
+            async with StandInEndpoint(sparql_handler) as endpoint:
+                url = endpoint.url
+            with pytest.raises(SparqlException):
+                await AsyncService(url).raw_query('SELECT * {?s ?p ?o}')
+        asyncio.run(run())
+
+    def test_concurrent_queries(self):
+        async def run():
+            async with StandInEndpoint(sparql_handler) as endpoint, AsyncService(endpoint.url) as service:
+                async def fetch():
+                    return [row async for row in await service.raw_query('SELECT * {?s ?p ?o}')]
+
+                results = await asyncio.gather(*[fetch() for _ in range(1000)])
+                assert all(rows == W3C_SAMPLE_RESULT_RAW for rows in results)
+                stats = service.connection_stats
+                assert stats['requests'] == 1000
+                assert stats['connections'] == endpoint.connections
+
+                for _ in range(5):
+                    await fetch()
+                assert service.connection_stats['connections'] == stats['connections']
+        asyncio.run(run())
+
+    def test_streaming(self):
+        """ The rows are returned as the body is received """
+        body = sample_result(100)
+        first_rows = asyncio.Event()
+
+        async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            await reader.readuntil(b'\r\n\r\n')
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: %s\r\nContent-Length: %d\r\n\r\n%s' % (
+                RESULT_TYPE_SPARQL_XML.encode(), len(body), body[:len(body) // 2]
+            ))
+            await first_rows.wait()
+            writer.write(body[len(body) // 2:])
+            await writer.drain()
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(serve, '127.0.0.1', 0)
+            async with server, AsyncService(f'http://127.0.0.1:{server.sockets[0].getsockname()[1]}') as service:
+                rows = []
+                async with await service.raw_query('SELECT * {?s ?p ?o}') as rs:
+                    async for row in rs:
+                        rows.append(row)
+                        first_rows.set()
+                assert rows == [(IRI(f'http://example.org/resource/{i}'),) for i in range(100)]
+        asyncio.run(asyncio.wait_for(run(), 10))
+
+    def test_iteration_stopped(self):
+        async def run():
+            async with StandInEndpoint(sparql_handler) as endpoint, AsyncService(f'{endpoint.url}/large') as service:
+                async with await service.raw_query('SELECT * {?s ?p ?o}') as rs:
+                    async for _ in rs:
+                        break
+                assert rs.closed
+                rows = [row async for row in await service.raw_query('SELECT * {?s ?p ?o}')]
+                assert len(rows) == 3000
+        asyncio.run(asyncio.wait_for(run(), 10))
+
+    def test_nested_queries(self):
+        """ No thread is held by the iteration, queries sent while iterating do not wait for one """
+        async def iterate(service: AsyncService) -> int:
+            count = 0
+            async with await service.raw_query('SELECT * {?s ?p ?o}') as rs:
+                async for _ in rs:
+                    count += 1
+                    if count % 500 == 0:
+                        assert len([row async for row in await service.raw_query('SELECT * {?s ?p ?o}')]) == 3000
+            return count
+
+        async def run():
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(1))
+            async with StandInEndpoint(sparql_handler) as endpoint, AsyncService(f'{endpoint.url}/large') as service:
+                assert await asyncio.gather(*(iterate(service) for _ in range(4))) == [3000] * 4
+        asyncio.run(asyncio.wait_for(run(), 10))
+
+    def test_rows_read_synchronously(self):
+        async def run():
+            async with StandInEndpoint(sparql_handler) as endpoint, AsyncService(endpoint.url) as service:
+                async with await service.raw_query('SELECT * {?s ?p ?o}') as rs:
+                    assert rs.variables == W3C_SAMPLE_RESULT_VARS
+                    with pytest.raises(RuntimeError):
+                        rs.fetch_rows()
+        asyncio.run(run())
+
+    def test_result_cache(self):
+        async def run():
+            async with StandInEndpoint(sparql_handler) as endpoint, AsyncService(f'{endpoint.url}/json') as service:
+                service.result_cache = ResultCache()
+                for _ in range(3):
+                    rs = await service.query('SELECT * {?s ?p ?o}')
+                    assert [row async for row in rs] == W3C_SAMPLE_RESULT
+                assert len(endpoint.requests) == 1
+                assert service.result_cache.stats['hits'] == 2
+        asyncio.run(run())
+
+    def test_result_cache_chunked(self):
+        """ The end of a chunked body is read by the iteration, completing the cached copy """
+        async def run():
+            async with StandInEndpoint(sparql_handler) as endpoint, AsyncService(f'{endpoint.url}/large') as service:
+                service.result_cache = ResultCache()
+                for _ in range(2):
+                    async with await service.raw_query('SELECT * {?s ?p ?o}') as rs:
+                        assert len([row async for row in rs]) == 3000
+                assert len(endpoint.requests) == 1
+        asyncio.run(run())
+
+    def test_revalidation(self):
+        def handler(request: StandInRequest) -> RESPONSE:
+            if request.headers.get('if-none-match') == '"v1"':
+                return 304, {'ETag': '"v1"'}, b''
+            return 200, {'Content-Type': RESULT_TYPE_SPARQL_JSON, 'ETag': '"v1"'}, W3C_SAMPLE_JSON
+
+        async def run():
+            async with StandInEndpoint(handler) as endpoint, AsyncService(endpoint.url) as service:
+                service.result_cache = ResultCache(ttl=0)
+                for _ in range(3):
+                    rs = await service.query('SELECT * {?s ?p ?o}')
+                    assert [row async for row in rs] == W3C_SAMPLE_RESULT
+                assert [r.headers.get('if-none-match') for r in endpoint.requests] == [None, '"v1"', '"v1"']
+                assert service.result_cache.stats['revalidations'] == 2
+                assert endpoint.connections == 1
+        asyncio.run(run())
+
+    def test_auto_method(self):
+        def handler(request: StandInRequest) -> RESPONSE:
+            if request.method == 'GET' and len(request.target) > 200:
+                return 414, {'Content-Type': 'text/plain'}, b'URI Too Long'
+            return 200, {'Content-Type': RESULT_TYPE_SPARQL_JSON}, W3C_SAMPLE_JSON
+
+        async def run():
+            async with StandInEndpoint(handler) as endpoint, AsyncService(endpoint.url, SparqlMethod.AUTO) as service:
+                await service.raw_query('ASK {}')
+                await service.raw_query('SELECT * {?s ?p ?o} # ' + 'x' * 200)
+                await service.raw_query('ASK {}')
+                assert [r.method for r in endpoint.requests] == ['GET', 'GET', 'POST', 'POST']
+                assert endpoint.requests[2].headers['content-type'] == 'application/x-www-form-urlencoded'
+                assert service.get_rejected == {endpoint.url}
+        asyncio.run(run())
+
+    def test_retry(self):
+        statuses = [503, 429, 200]
+
+        def handler(request: StandInRequest) -> RESPONSE:
+            status = statuses.pop(0)
+            if status != 200:
+                return status, {'Content-Type': 'text/plain', 'Retry-After': '0'}, b'Busy'
+            return 200, {'Content-Type': RESULT_TYPE_SPARQL_JSON}, W3C_SAMPLE_JSON
+
+        async def run():
+            async with StandInEndpoint(handler) as endpoint, AsyncService(endpoint.url) as service:
+                service.retry_policy = RetryPolicy(backoff=0.01)
+                rs = await service.query('SELECT * {?s ?p ?o}')
+                assert [row async for row in rs] == W3C_SAMPLE_RESULT
+                assert len(endpoint.requests) == 3
+        asyncio.run(run())
+
+    def test_circuit_breaker(self):
+        def handler(request: StandInRequest) -> RESPONSE:
+            return 503, {'Content-Type': 'text/plain'}, b'Busy'
+
+        async def run():
+            async with StandInEndpoint(handler) as endpoint, AsyncService(endpoint.url) as service:
+                service.circuit_breaker = CircuitBreaker(window_size=2, min_calls=2)
+                for _ in range(2):
+                    with pytest.raises(SparqlProtocolException):
+                        await service.raw_query('SELECT * {?s ?p ?o}')
+                assert service.circuit_breaker.state(endpoint.url) is CircuitState.OPEN
+                with pytest.raises(SparqlCircuitOpenException):
+                    await service.raw_query('SELECT * {?s ?p ?o}')
+                assert len(endpoint.requests) == 2
+        asyncio.run(run())
+
+    def test_endpoint_pool(self):
+        def handler(request: StandInRequest) -> RESPONSE:
+            if request.target.startswith('/down'):
+                return 503, {'Content-Type': 'text/plain'}, b'Busy'
+            return 200, {'Content-Type': RESULT_TYPE_SPARQL_JSON}, W3C_SAMPLE_JSON
+
+        async def run():
+            async with StandInEndpoint(handler) as endpoint, AsyncService(endpoint.url + '/up') as service:
+                pool = EndpointPool([endpoint.url + '/down', endpoint.url + '/up'], Balancing.ROUND_ROBIN)
+                service.endpoint_pool = pool
+                service.retry_policy = RetryPolicy(backoff=0.01)
+                for _ in range(4):
+                    rs = await service.query('SELECT * {?s ?p ?o}')
+                    assert [row async for row in rs] == W3C_SAMPLE_RESULT
+                assert pool.stats[endpoint.url + '/down']['failures'] == 3
+                assert pool.stats[endpoint.url + '/down']['ejected']
+        asyncio.run(run())
+
+    def test_endpoint_pool_outstanding_until_read(self):
+        body = sample_result(100)
+        first_rows = asyncio.Event()
+
+        async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            await reader.readuntil(b'\r\n\r\n')
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: %s\r\nContent-Length: %d\r\n\r\n%s' % (
+                RESULT_TYPE_SPARQL_XML.encode(), len(body), body[:len(body) // 2]
+            ))
+            await first_rows.wait()
+            writer.write(body[len(body) // 2:])
+            await writer.drain()
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(serve, '127.0.0.1', 0)
+            url = f'http://127.0.0.1:{server.sockets[0].getsockname()[1]}'
+            async with server, AsyncService(url) as service:
+                pool = service.endpoint_pool = EndpointPool([url])
+                async with await service.raw_query('SELECT * {?s ?p ?o}') as rs:
+                    async for _ in rs:
+                        if not first_rows.is_set():
+                            assert (pool.stats[url]['outstanding'], pool.stats[url]['requests']) == (1, 0)
+                            first_rows.set()
+                assert (pool.stats[url]['outstanding'], pool.stats[url]['requests']) == (0, 1)
+        asyncio.run(asyncio.wait_for(run(), 10))
+
+    def test_hedging(self):
+        async def handler(request: StandInRequest) -> RESPONSE:
+            if len(endpoint.requests) == 1:
+                await asyncio.sleep(5.0)
+            return 200, {'Content-Type': RESULT_TYPE_SPARQL_JSON}, W3C_SAMPLE_JSON
+
+        async def run():
+            nonlocal endpoint
+            async with StandInEndpoint(handler) as endpoint, AsyncService(endpoint.url) as service:
+                service.hedging_policy = HedgingPolicy(min_samples=1, max_extra_load=1.0)
+                service.hedging_policy.record(0.05)
+                rs = await asyncio.wait_for(service.query('SELECT * {?s ?p ?o}'), 1.0)
+                assert [row async for row in rs] == W3C_SAMPLE_RESULT
+                assert len(endpoint.requests) == 2
+                assert service.hedging_policy.stats['won'] == 1
+        endpoint = None
+        asyncio.run(run())
+
+    def test_rate_limiter(self):
+        running = []
+        most = []
+
+        async def handler(request: StandInRequest) -> RESPONSE:
+            running.append(request)
+            most.append(len(running))
+            await asyncio.sleep(0.02)
+            running.remove(request)
+            return 200, {'Content-Type': RESULT_TYPE_SPARQL_JSON}, W3C_SAMPLE_JSON
+
+        async def run():
+            async with StandInEndpoint(handler) as endpoint, AsyncService(endpoint.url) as service:
+                service.rate_limiter = RateLimiter(max_concurrent=2)
+                results = await asyncio.gather(*(service.query('SELECT * {?s ?p ?o}') for _ in range(6)))
+                for rs in results:
+                    assert [row async for row in rs] == W3C_SAMPLE_RESULT
+                assert max(most) == 2
+                assert service.rate_limiter.stats['delayed'] == 4
+        asyncio.run(run())
+
+    def test_rate_limiter_slot_held_until_read(self):
+        async def run():
+            async with StandInEndpoint(sparql_handler) as endpoint, AsyncService(f'{endpoint.url}/large') as service:
+                service.rate_limiter = RateLimiter(max_concurrent=1, blocking=False)
+                async with await service.raw_query('SELECT * {?s ?p ?o}') as rs:
+                    rows = rs.__aiter__()
+                    await rows.__anext__()
+                    with pytest.raises(SparqlRateLimitException):
+                        await service.raw_query('SELECT * {?s ?p ?o}')
+                    assert len([row async for row in rows]) == 2999
+                rows = [row async for row in await service.raw_query('SELECT * {?s ?p ?o}')]
+                assert len(rows) == 3000
+        asyncio.run(asyncio.wait_for(run(), 10))
@@ -0,0 +1,103 @@
+from threading import Lock
+from time import sleep
+
+from service_test import endpoint  # noqa: F401 (fixture)
+from sparqlc import BatchResult, IRI, Literal, QueryBatch, Service, SparqlMethod, SparqlProtocolException
+
+STATEMENT = 'SELECT * {?s ?p ?o}'
+
+
+class TestQueryBatch:
+    def test_ordered(self, endpoint: str):
+        service = Service(f'{endpoint}/small', SparqlMethod.GET)
+        statements = [f'{STATEMENT} LIMIT {i}' for i in range(20)]
+        batch = service.query_many(statements, max_workers=4)
+        assert len(batch) == 20
+        results = batch.results()
+        assert [r.index for r in results] == list(range(20))
+        assert [r.statement for r in results] == statements
+        assert all(r.ok for r in results)
+        assert results[0].rows == [(f'http://example.org/resource/{i}',) for i in range(3)]
+        assert service.pool_size == 4
+        stats = service.connection_stats
+        assert stats['requests'] == 20
+        assert stats['connections'] <= 4
+
+    def test_raw(self, endpoint: str):
+        service = Service(f'{endpoint}/small', SparqlMethod.GET)
+        results = service.query_many([STATEMENT], raw=True).results()
+        assert results[0].rows[0] == (IRI('http://example.org/resource/0'),)
+
+    def test_as_completed(self, endpoint: str):
+        service = Service(f'{endpoint}/small', SparqlMethod.GET)
+        results = list(service.query_many([f'{STATEMENT} SLOW', STATEMENT, STATEMENT], max_workers=3, ordered=False))
+        assert sorted(r.index for r in results) == [0, 1, 2]
+        assert results[-1].index == 0
+
+    def test_errors(self, endpoint: str):
+        service = Service(f'{endpoint}/small', SparqlMethod.GET)
+        batch = service.query_many([STATEMENT, f'{STATEMENT} FAIL', STATEMENT], max_workers=2)
+        results = batch.results()
+        assert [r.ok for r in results] == [True, False, True]
+        assert isinstance(results[1].error, SparqlProtocolException)
+        assert results[1].rows is None
+        stats = batch.stats
+        assert stats['queries'] == stats['completed'] == 3
+        assert stats['errors'] == 1
+        assert stats['rows'] == 6
+        assert 0 < stats['min'] <= stats['mean'] <= stats['max'] <= stats['elapsed']
+
+    def test_stats_before_iteration(self, endpoint: str):
+        batch = Service(f'{endpoint}/small', SparqlMethod.GET).query_many([STATEMENT])
+        stats = batch.stats
+        assert (stats['queries'], stats['completed'], stats['mean']) == (1, 0, 0.0)
+        batch.results()
+
+    def test_pool_size_not_reduced(self):
+        service = Service('http://a.b/c')
+        service.pool_size = 10
+        service.query_many([], max_workers=2).results()
+        assert service.pool_size == 10
+
+    def test_pool_size_contacted_host(self, endpoint: str):
+        service = Service(f'{endpoint}/small', SparqlMethod.GET)
+        service.query(STATEMENT).fetch_rows()
+        service.query_many([STATEMENT] * 8, max_workers=4).results()
+        pools = service._pool_manager.pools
+        assert [pools[key].pool.maxsize for key in pools.keys()] == [4]
+
+    def test_concurrency_bound(self):
+        lock = Lock()
+        running = [0, 0]
+
+        class FakeResultSet:
+            def __enter__(self):
+                with lock:
+                    running[0] += 1
+                    running[1] = max(running[1], running[0])
+                return self
+
+            def __exit__(self, *exc_info):
+                with lock:
+                    running[0] -= 1
+
+            @staticmethod
+            def fetch_rows():
+                return [(Literal('x'),)]
+
+        results = QueryBatch(lambda statement: FakeResultSet(), ['a'] * 50, max_workers=3).results()
+        assert len(results) == 50
+        assert running[1] <= 3
+
+    def test_break_cancels(self, endpoint: str):
+        service = Service(f'{endpoint}/small', SparqlMethod.GET)
+        batch = service.query_many([f'{STATEMENT} SLOW'] * 10, max_workers=1)
+        for _ in batch:
+            break
+        sleep(0.5)
+        assert batch.stats['completed'] == 1
+        assert service.connection_stats['requests'] <= 2
+
+    def test_repr(self):
+        assert repr(BatchResult(1, 'x', [], None, 0.5)) == '<BatchResult #1 0 rows in 0.500s>'
+        assert repr(BatchResult(2, 'x', None, ValueError('y'), 1)) == "<BatchResult #2 ValueError('y') in 1.000s>"
@@ -0,0 +1,127 @@
+from io import BytesIO
+from struct import pack
+
+import pytest
+
+from result_set_test import W3C_SAMPLE_RESULT_RAW, W3C_SAMPLE_RESULT_VARS
+from sparqlc import IRI, Literal, RawResultSet, RESULT_TYPE_BINARY, SparqlParseException
+from sparqlc.binary_parser import BinaryResultParser
+
+
+def int32(value: int) -> bytes:
+    return pack('>i', value)
+
+
+def string(value: str) -> bytes:
+    data = value.encode('utf-8')
+    return int32(len(data)) + data
+
+
+def utf(value: str) -> bytes:
+    """ Java's DataOutput.writeUTF """
+    surrogates = ''.join(
+        ch if ord(ch) < 0x10000 else
+        chr(0xd800 + ((ord(ch) - 0x10000) >> 10)) + chr(0xdc00 + ((ord(ch) - 0x10000) & 0x3ff))
+        for ch in value
+    )
+    data = surrogates.encode('utf-8', 'surrogatepass').replace(b'\0', b'\xc0\x80')
+    return pack('>H', len(data)) + data
+
+
+def header(variables, version: int = 2) -> bytes:
+    s = utf if version == 1 else string
+    return b'BRTR' + int32(version) + int32(len(variables)) + b''.join(s(v) for v in variables)
+
+
+def w3c_sample_result() -> bytes:
+    """ W3C sample result, using all value record types """
+    return header(W3C_SAMPLE_RESULT_VARS) + b''.join([
+        b'\x02', int32(0), string('http://work.example.org/'),
+        b'\x05', string('r1'),
+        b'\x03', int32(0), string('alice/'),
+        b'\x06', string('Alice'),
+        b'\x06', string(''),
+        b'\x00',
+        b'\x08', string('<p xmlns="http://www.w3.org/1999/xhtml">My name is <b>alice</b></p>'),
+        b'\x04', string('http://www.w3.org/1999/02/22-rdf-syntax-ns#XMLLiteral'),
+        b'\x05', string('r2'),
+        b'\x02', int32(3), string('http://www.w3.org/2001/XMLSchema#'),
+        b'\x05', string('r2'),
+        b'\x03', int32(0), string('bob/'),
+        b'\x07', string('Bob'), string('en'),
+        b'\x04', string('mailto:bob@work.example.org'),
+        b'\x08', string('30'), b'\x03', int32(3), string('integer'),
+        b'\x00',
+        b'\x05', string('r1'),
+        b'\x7f',
+    ])
+
+
+def binary_result_set(content: bytes) -> RawResultSet:
+    return RawResultSet(BytesIO(content), content_type=RESULT_TYPE_BINARY)
+
+
+class TestBinaryResultParser:
+    def test_w3_result(self):
+        rs = binary_result_set(w3c_sample_result())
+        assert rs.variables == W3C_SAMPLE_RESULT_VARS
+        assert rs.fetch_rows() == W3C_SAMPLE_RESULT_RAW
+        assert rs.has_result() is None
+
+    def test_small_chunks(self, monkeypatch):
+        monkeypatch.setattr(BinaryResultParser, 'CHUNK_SIZE', 3)
+        assert binary_result_set(w3c_sample_result()).fetch_rows() == W3C_SAMPLE_RESULT_RAW
+
+    def test_repeat(self):
+        rs = binary_result_set(header(['a', 'b']) + b''.join([
+            b'\x04', string('http://a.b/c'),
+            b'\x06', string('x'),
+            b'\x01',
+            b'\x06', string('y'),
+            b'\x01',
+            b'\x01',
+            b'\x7f',
+        ]))
+        rows = rs.fetch_rows()
+        assert rows == [
+            (IRI('http://a.b/c'), Literal('x')),
+            (IRI('http://a.b/c'), Literal('y')),
+            (IRI('http://a.b/c'), Literal('y')),
+        ]
+        assert rows[0][0] is rows[1][0] is rows[2][0]
+        assert rows[1][1] is rows[2][1]
+
+    def test_empty_rows(self):
+        rs = binary_result_set(header([]) + b'\x09\x09\x7f')
+        assert rs.fetch_rows() == [(), ()]
+
+    def test_version_1(self):
+        value = 'nul\0 and \U0001F600 Германия'
+        rs = binary_result_set(header(['a'], version=1) + b'\x06' + utf(value) + b'\x7f')
+        assert rs.variables == ['a']
+        assert rs.fetch_rows() == [(Literal(value),)]
+
+    def test_empty(self):
+        rs = binary_result_set(b'')
+        assert rs.variables == []
+        assert rs.fetch_rows() == []
+
+    TEST_INVALID = [
+        b'XXXX' + int32(2) + int32(0),
+        header([], version=5),
+        header(['a']) + b'\x06' + string('x'),
+        header(['a']) + b'\x0a',
+        header(['a']) + b'\x03' + int32(1) + string('local') + b'\x7f',
+        header(['a']) + b'\x08' + string('1') + b'\x06' + string('x') + b'\x7f',
+        header(['a']) + b'\x7e\x02' + string('Out of memory') + b'\x7f',
+    ]
+
+    @pytest.mark.parametrize('content', TEST_INVALID)
+    def test_invalid(self, content: bytes):
+        with pytest.raises(SparqlParseException):
+            binary_result_set(content).fetch_rows()
+
+    def test_error_message(self):
+        with pytest.raises(SparqlParseException) as exc_info:
+            binary_result_set(header(['a']) + b'\x7e\x01' + string('Syntax error') + b'\x7f').fetch_rows()
+        assert exc_info.value.message == 'Malformed query: Syntax error'
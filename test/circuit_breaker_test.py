@@ -0,0 +1,114 @@
+from contextlib import nullcontext
+
+import pytest
+
+import sparqlc.circuit_breaker
+from result_cache_test import Clock
+from sparqlc import CircuitBreaker, CircuitState, SparqlCircuitOpenException, SparqlException
+from sparqlc import SparqlProtocolException
+
+ENDPOINT = 'http://a.b/sparql'
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(sparqlc.circuit_breaker, 'monotonic', clock)
+    return clock
+
+
+def call(breaker: CircuitBreaker, error: SparqlException = None, clock: Clock = None, duration: float = 0.0):
+    with pytest.raises(type(error)) if error is not None else nullcontext():
+        with breaker.call(ENDPOINT):
+            if clock is not None:
+                clock.now += duration
+            if error is not None:
+                raise error
+
+
+class TestCircuitBreaker:
+    def test_opens_on_failure_rate(self, clock):
+        breaker = CircuitBreaker(failure_rate=0.5, window_size=4, min_calls=4)
+        for error in (None, SparqlProtocolException(503, 'Busy'), None):
+            call(breaker, error)
+        assert breaker.state(ENDPOINT) is CircuitState.CLOSED
+        call(breaker, SparqlException('HTTP Error occurred.'))
+        assert breaker.state(ENDPOINT) is CircuitState.OPEN
+        with pytest.raises(SparqlCircuitOpenException) as exc_info:
+            breaker.call(ENDPOINT)
+        assert (exc_info.value.endpoint, exc_info.value.retry_in) == (ENDPOINT, 30.0)
+        assert breaker.stats == {'opened': 1, 'half_opened': 0, 'closed': 0, 'rejected': 1}
+
+    def test_client_errors_ignored(self, clock):
+        breaker = CircuitBreaker(window_size=4, min_calls=4)
+        for _ in range(4):
+            call(breaker, SparqlProtocolException(400, 'Syntax error'))
+        assert breaker.state(ENDPOINT) is CircuitState.CLOSED
+        assert CircuitBreaker.failure(SparqlProtocolException(429, 'Too many requests'))
+
+    def test_window(self, clock):
+        breaker = CircuitBreaker(failure_rate=0.5, window_size=4, min_calls=4)
+        for _ in range(10):
+            call(breaker, SparqlProtocolException(500, 'Error'))
+            call(breaker)
+            call(breaker)
+            call(breaker)
+            assert breaker.state(ENDPOINT) is CircuitState.CLOSED
+
+    def test_opens_on_slow_calls(self, clock):
+        breaker = CircuitBreaker(slow_call_duration=5.0, slow_call_rate=0.5, window_size=2, min_calls=2)
+        call(breaker, clock=clock, duration=4.9)
+        call(breaker, clock=clock, duration=5.0)
+        assert breaker.state(ENDPOINT) is CircuitState.OPEN
+
+    def test_recovers(self, clock):
+        transitions = []
+        breaker = CircuitBreaker(window_size=2, min_calls=2, open_duration=10.0,
+                                 on_transition=lambda *transition: transitions.append(transition))
+        call(breaker, SparqlProtocolException(503, 'Busy'))
+        call(breaker, SparqlProtocolException(503, 'Busy'))
+        clock.now += 9.9
+        with pytest.raises(SparqlCircuitOpenException):
+            breaker.call(ENDPOINT)
+        clock.now += 0.1
+        # A single probe at a time, the others fail fast
+        probe = breaker.call(ENDPOINT)
+        assert probe.probe
+        assert breaker.state(ENDPOINT) is CircuitState.HALF_OPEN
+        with pytest.raises(SparqlCircuitOpenException):
+            breaker.call(ENDPOINT)
+        with probe:
+            pass
+        assert breaker.states == {ENDPOINT: CircuitState.CLOSED}
+        assert [(old.value, new.value) for _, old, new in transitions] == [
+            ('closed', 'open'), ('open', 'half-open'), ('half-open', 'closed')
+        ]
+        assert breaker.stats == {'opened': 1, 'half_opened': 1, 'closed': 1, 'rejected': 2}
+
+    def test_failed_probe_opens(self, clock):
+        breaker = CircuitBreaker(window_size=1, min_calls=1, open_duration=10.0)
+        call(breaker, SparqlProtocolException(503, 'Busy'))
+        clock.now += 10.0
+        call(breaker, SparqlProtocolException(503, 'Busy'))
+        assert breaker.state(ENDPOINT) is CircuitState.OPEN
+        with pytest.raises(SparqlCircuitOpenException) as exc_info:
+            breaker.call(ENDPOINT)
+        assert exc_info.value.retry_in == 10.0
+
+    def test_cancelled_probe_released(self, clock):
+        breaker = CircuitBreaker(window_size=1, min_calls=1, open_duration=10.0)
+        call(breaker, SparqlProtocolException(503, 'Busy'))
+        clock.now += 10.0
+        with pytest.raises(KeyboardInterrupt):
+            with breaker.call(ENDPOINT):
+                raise KeyboardInterrupt
+        assert breaker.call(ENDPOINT).probe
+
+    def test_endpoints_independent(self, clock):
+        breaker = CircuitBreaker(window_size=1, min_calls=1)
+        call(breaker, SparqlProtocolException(503, 'Busy'))
+        with breaker.call('http://other/sparql'):
+            pass
+        assert breaker.states == {ENDPOINT: CircuitState.OPEN, 'http://other/sparql': CircuitState.CLOSED}
+        breaker.reset()
+        assert breaker.state(ENDPOINT) is CircuitState.CLOSED
@@ -0,0 +1,104 @@
+import pickle
+from copy import deepcopy
+from urllib.parse import quote_plus
+
+from sparqlc.config import ConfigSnapshot, ObservedDict, ObservedList
+
+
+class Counter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self) -> None:
+        self.count += 1
+
+
+class TestObservedDict:
+    def test_changes(self):
+        counter = Counter()
+        d = ObservedDict(counter, {'a': 1})
+        d['b'] = 2
+        del d['a']
+        d.update(c=3)
+        d |= {'d': 4}
+        d.setdefault('e', 5)
+        d.pop('b')
+        d.popitem()
+        d.clear()
+        assert counter.count == 8
+        assert d == {}
+
+    def test_reads(self):
+        counter = Counter()
+        d = ObservedDict(counter, {'a': 1})
+        assert (d['a'], d.get('b'), list(d), d | {'b': 2}) == (1, None, ['a'], {'a': 1, 'b': 2})
+        assert counter.count == 0
+
+    def test_copy(self):
+        d = ObservedDict(Counter(), {'a': 1})
+        for copy in (deepcopy(d), pickle.loads(pickle.dumps(d))):
+            assert type(copy) is dict
+            assert copy == {'a': 1}
+
+
+class TestObservedList:
+    def test_changes(self):
+        counter = Counter()
+        items = ObservedList(counter, [3])
+        items.append(1)
+        items.extend([2])
+        items.insert(0, 0)
+        items += [4]
+        items[0] = 5
+        del items[0]
+        items.remove(4)
+        items.pop()
+        items.sort()
+        items.reverse()
+        items *= 2
+        items.clear()
+        assert counter.count == 12
+        assert items == []
+
+    def test_copy(self):
+        items = ObservedList(Counter(), [1, 2])
+        assert type(deepcopy(items)) is list
+        assert pickle.loads(pickle.dumps(items)) == [1, 2]
+
+
+class TestConfigSnapshot:
+    def test_copies(self):
+        headers = {'Accept': 'x'}
+        graphs = ['g1']
+        kwargs = {'retries': 5, 'nested': {'a': 1}}
+        snapshot = ConfigSnapshot(headers, {}, graphs, [], kwargs)
+        headers['Accept'] = 'y'
+        graphs.append('g2')
+        kwargs['nested']['a'] = 2
+        assert snapshot.headers == {'Accept': 'x'}
+        assert snapshot.default_graphs == ['g1']
+        assert snapshot.request_kwargs == {'retries': 5, 'nested': {'a': 1}}
+
+    def test_derived(self):
+        snapshot = ConfigSnapshot({'Accept': 'x'}, {}, ['g1'], ['gé'], {})
+        params = snapshot.graph_params('utf-8')
+        assert params == [('default-graph-uri', b'g1'), ('named-graph-uri', 'gé'.encode('utf-8'))]
+        assert snapshot.graph_params('utf-8') is params
+        assert snapshot.graph_params('latin-1')[1] == ('named-graph-uri', b'g\xe9')
+        headers = snapshot.request_headers('text/plain')
+        assert headers == {'Accept': 'x', 'Content-Type': 'text/plain'}
+        assert snapshot.request_headers('text/plain') is headers
+        assert snapshot.request_headers(None) == {'Accept': 'x'}
+        assert snapshot.header_items(None) == (('Accept', 'x'),)
+
+    def test_preamble(self):
+        snapshot = ConfigSnapshot({}, {'a': 'http://a/#', 'é': 'http://é/'}, ['g1'], [], {})
+        assert snapshot.prefix_preamble() == 'PREFIX a: <http://a/#> PREFIX é: <http://é/> '
+        assert snapshot.prefix_preamble() is snapshot.prefix_preamble()
+        statement = 'SELECT * WHERE { ?s a:p "é & ü" }'
+        for encoding in ('utf-8', 'latin-1'):
+            quoted = snapshot.quoted_preamble(encoding) + quote_plus(statement.encode(encoding))
+            assert quoted == quote_plus((snapshot.prefix_preamble() + statement).encode(encoding))
+        assert snapshot.graph_string('utf-8') == 'default-graph-uri=g1'
+        empty = ConfigSnapshot({}, {}, [], [], {})
+        assert (empty.prefix_preamble(), empty.quoted_preamble('utf-8'), empty.graph_string('utf-8')) == ('', '', '')
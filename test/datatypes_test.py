@@ -1,7 +1,10 @@
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
 from sparqlc import BlankNode, Datatype, IRI, Literal, RDFTerm
-from sparqlc.datatypes import datatype_dict
+from sparqlc.datatypes import datatype_dict, datatype_table, InternTable, XSD_STRING
 
 
 def test_datatype_none():
@@ -24,6 +27,63 @@ def test_datatype_nonexistent():
     datatype_dict.pop(new_dt)
 
 
+def test_datatype_shared():
+    dt = ''.join(['http://example.com/', 'datatype'])
+    assert Datatype(dt) is Datatype('http://example.com/datatype')
+    datatype_table.pop(dt)
+
+
+class TestInternTable:
+    def test_shared_instance(self):
+        table = InternTable(10, IRI)
+        iri = table('http://a.b/c')
+        assert iri == IRI('http://a.b/c')
+        assert table(''.join(['http://a.b/', 'c'])) is iri
+        assert len(table) == 1
+
+    def test_bounded(self):
+        table = InternTable(8, IRI)
+        first = table('0')
+        for i in range(100):
+            assert table(str(i)) == IRI(str(i))
+            assert len(table) <= 8
+        assert '99' in table
+        assert '0' not in table
+        assert table('0') is not first
+
+    def test_pinned(self):
+        table = InternTable(4, pinned=['a', 'b'])
+        for i in range(100):
+            table(str(i))
+        assert 'a' in table
+        assert 'b' in table
+        assert len(table) <= 4
+
+    def test_all_pinned(self):
+        table = InternTable(2, pinned=['a', 'b'])
+        assert table('c') == 'c'
+        assert 'c' not in table
+        assert len(table) == 2
+
+    def test_clear(self):
+        table = InternTable(4, pinned=['a'])
+        table('b')
+        table.clear()
+        assert list(table.items()) == [('a', 'a')]
+
+    def test_threads(self):
+        table = InternTable(64, IRI)
+        values = [str(i % 100) for i in range(10_000)]
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(table, values))
+        assert results == [IRI(v) for v in values]
+        assert len(table) <= 64
+
+    def test_datatype_table_pinned(self):
+        assert XSD_STRING in datatype_table
+        assert datatype_table.maxsize > 0
+
+
 class TestRDFTerm:
     def test_init(self):
         term = RDFTerm()
@@ -244,3 +304,48 @@ class TestBlankNode:
         assert bn1 == bn2
         assert bn1 != bn3
         assert bn1 != iri
+
+
+class TestHash:
+    TEST_TERMS = [
+        IRI('http://example.com/a'),
+        BlankNode('b0'),
+        Literal('1234'),
+        Literal('1234', 'special_type'),
+        Literal('1234', lang='en'),
+        Literal('1234', 'special_type', 'en'),
+    ]
+
+    @pytest.mark.parametrize('term', TEST_TERMS)
+    def test_consistent_with_eq(self, term: RDFTerm):
+        copy = pickle.loads(pickle.dumps(term))
+        assert copy == term
+        assert copy is not term
+        assert hash(copy) == hash(term)
+        assert hash(term) == hash(term)
+
+    def test_set(self):
+        terms = self.TEST_TERMS + [IRI('http://example.com/a'), Literal('1234', lang='en'), IRI('b0')]
+        assert set(terms) == set(self.TEST_TERMS + [IRI('b0')])
+        assert len(set(terms)) == len(self.TEST_TERMS) + 1
+
+    def test_dict_key(self):
+        d = {IRI('x'): 1, BlankNode('x'): 2, Literal('x'): 3}
+        assert d[IRI('x')] == 1
+        assert d[BlankNode('x')] == 2
+        assert d[Literal('x')] == 3
+        assert Literal('x', lang='en') not in d
+
+    @pytest.mark.parametrize('term', TEST_TERMS)
+    def test_slots(self, term: RDFTerm):
+        assert not hasattr(term, '__dict__')
+        with pytest.raises(AttributeError):
+            term.other = 1
+
+    def test_pickle_drops_cached_hash(self):
+        term = Literal('1234', 'special_type', 'en')
+        hash(term)
+        copy = pickle.loads(pickle.dumps(term))
+        with pytest.raises(AttributeError):
+            getattr(copy, '_hash')
+        assert (copy.value, copy.datatype, copy.lang) == ('1234', 'special_type', 'en')
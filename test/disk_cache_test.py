@@ -0,0 +1,182 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+import sparqlc.disk_cache
+from sparqlc import DiskResultCache, RESULT_TYPE_SPARQL_JSON
+from sparqlc.disk_cache import ENTRY_SUFFIX
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def write_and_read(directory: str, worker: int) -> bool:
+    cache = DiskResultCache(directory)
+    body = bytes([worker]) * 100_000
+    complete = True
+    for i in range(20):
+        cache.put('shared', body, RESULT_TYPE_SPARQL_JSON)
+        cache.put(('own', worker, i), body, None)
+        cached = cache.get('shared')
+        # Any writer's body, but never a partial one
+        complete = complete and cached is not None and len(set(cached.body)) == 1 and cached.size == len(cached.body)
+    return complete
+
+
+class TestDiskResultCache:
+    def test_hit_and_miss(self, tmp_path):
+        cache = DiskResultCache(str(tmp_path))
+        assert cache.get(('a', b'body')) is None
+        assert cache.put(('a', b'body'), b'0123456789' * 100, RESULT_TYPE_SPARQL_JSON)
+        cached = cache.get(('a', b'body'))
+        assert cached.content_type == RESULT_TYPE_SPARQL_JSON
+        assert cached.size == 1000
+        with cached.open() as file:
+            assert file.read(15) == b'012345678901234'
+            assert file.read() == (b'0123456789' * 100)[15:]
+        assert cached.body == b'0123456789' * 100
+        assert ('a', b'body') in cache
+        assert ('a', b'other') not in cache
+        stats = cache.stats
+        assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+        # Compressed on disk
+        assert stats['size'] < 1000
+
+    def test_persistent(self, tmp_path):
+        DiskResultCache(str(tmp_path)).put('a', b'body', None)
+        cached = DiskResultCache(str(tmp_path)).get('a')
+        assert (cached.body, cached.content_type) == (b'body', None)
+
+    def test_ttl(self, tmp_path, monkeypatch):
+        clock = Clock()
+        monkeypatch.setattr(sparqlc.disk_cache, 'time', clock)
+        cache = DiskResultCache(str(tmp_path), ttl=10)
+        cache.put('a', b'body', None)
+        os.utime(cache.path('a'), (clock.now, clock.now))
+        clock.now += 9.9
+        assert cache.get('a') is not None
+        clock.now += 0.1
+        assert 'a' not in cache
+        assert cache.get('a') is None
+        assert not os.path.exists(cache.path('a'))
+        assert cache.stats['expirations'] == 1
+
+    def test_revalidation(self, tmp_path, monkeypatch):
+        clock = Clock()
+        monkeypatch.setattr(sparqlc.disk_cache, 'time', clock)
+        cache = DiskResultCache(str(tmp_path), ttl=10)
+        cache.put('a', b'body', None, etag='"v1"')
+        cache.put('b', b'body', None)
+        for key in 'ab':
+            os.utime(cache.path(key), (clock.now, clock.now))
+        assert cache.stale('a') is None
+        clock.now += 10
+        assert cache.get('a') is None
+        # The stale results with a validator are kept, the others are dropped on the next scan of the directory
+        assert len(cache) == 1
+        assert os.path.exists(cache.path('a'))
+        assert not os.path.exists(cache.path('b'))
+        stale = cache.stale('a')
+        assert (stale.etag, stale.last_modified, stale.body) == ('"v1"', None, b'body')
+        assert cache.refresh('a')
+        clock.now = os.stat(cache.path('a')).st_mtime
+        assert cache.get('a').body == b'body'
+        assert cache.stats['revalidations'] == 1
+
+    def test_size_eviction(self, tmp_path):
+        cache = DiskResultCache(str(tmp_path), max_size=3 * 1024, ttl=None, max_entry_size=4096)
+        for key in 'abc':
+            cache.put(key, os.urandom(900), None)
+            os.utime(cache.path(key), (1000 + ord(key), 1000))
+        cache.get('a')
+        cache.put('d', os.urandom(900), None)
+        assert ('a' in cache, 'b' in cache, 'c' in cache, 'd' in cache) == (True, False, True, True)
+        assert cache.stats['evictions'] == 1
+        assert cache.size <= 3 * 1024
+
+    def test_scans(self, tmp_path, monkeypatch):
+        scans = []
+        scandir = os.scandir
+        monkeypatch.setattr(os, 'scandir', lambda path: scans.append(path) or scandir(path))
+        monkeypatch.setattr(sparqlc.disk_cache, 'RESCAN_INTERVAL', 10)
+        cache = DiskResultCache(str(tmp_path), max_size=4 * 1024, ttl=None, max_entry_size=4096)
+        other = DiskResultCache(str(tmp_path), ttl=None)
+        for i in range(9):
+            cache.put(i, os.urandom(900), None)
+        # Scanned on the first write only, evicting by the sizes kept in memory
+        assert len(scans) == 1
+        assert cache.stats['evictions'] == 5
+        # The entries of the other process are taken in by the next scan
+        for key in 'ab':
+            other.put(key, os.urandom(900), None)
+        os.utime(other.path('a'), (1000, 1000))
+        scans.clear()
+        cache.put(9, os.urandom(900), None)
+        assert len(scans) == 1
+        assert 'a' not in cache
+        assert cache.stats['evictions'] == 8
+
+    def test_max_entry_size(self, tmp_path):
+        cache = DiskResultCache(str(tmp_path), max_size=4000)
+        assert not cache.put('a', b'x' * 1001, None)
+        assert len(cache) == 0
+
+    def test_damaged_entry(self, tmp_path):
+        cache = DiskResultCache(str(tmp_path))
+        for content in (b'', b'garbage\n'):
+            with open(cache.path('a'), 'wb') as file:
+                file.write(content)
+            assert cache.get('a') is None
+
+    def test_pop_and_clear(self, tmp_path):
+        cache = DiskResultCache(str(tmp_path))
+        for key in 'abc':
+            cache.put(key, b'body', None)
+        assert cache.pop('a')
+        assert not cache.pop('a')
+        cache.clear()
+        assert len(cache) == 0
+        assert [name for name in os.listdir(tmp_path) if name.endswith(ENTRY_SUFFIX)] == []
+
+    def test_key_serialized(self, tmp_path):
+        cache = DiskResultCache(str(tmp_path))
+        key = ('GET', 'http://a.b/c?query=x', None, (('Accept', 'text/csv'),))
+        assert cache.path(key) == cache.path(list(key))
+        assert cache.path(('POST', 'http://a.b/c', b'query=x')) != cache.path(('POST', 'http://a.b/c', 'query=x'))
+        with pytest.raises(TypeError):
+            cache.path(object())
+
+    @pytest.mark.skipif(not os.path.exists('/proc/self/maps'), reason='Lists the mappings of the process')
+    def test_unmapped(self, tmp_path):
+        def mapped(path: str) -> bool:
+            with open('/proc/self/maps') as maps:
+                return any(line.rstrip('\n').endswith(path) for line in maps)
+        cache = DiskResultCache(str(tmp_path))
+        cache.put('a', b'body', None)
+        cached = cache.get('a')
+        path = cache.path('a')
+        with cached.open() as first, cached.open() as second:
+            assert first.read() == second.read() == b'body'
+        assert not mapped(path)
+        # Mapped again to be read again, as long as the entry has not been replaced
+        assert cached.body == b'body'
+        assert mapped(path)
+        cached.close()
+        assert not mapped(path)
+        cache.put('a', b'new body', None)
+        with pytest.raises(OSError):
+            cached.open()
+        assert cache.get('a').body == b'new body'
+
+    def test_processes(self, tmp_path):
+        with ProcessPoolExecutor(4) as executor:
+            assert all(executor.map(write_and_read, [str(tmp_path)] * 4, range(4)))
+        assert len(DiskResultCache(str(tmp_path))) == 81
+        # No temporary files left behind
+        assert all(name.endswith(ENTRY_SUFFIX) for name in os.listdir(tmp_path))
@@ -0,0 +1,102 @@
+from typing import List
+
+import pytest
+
+import sparqlc.endpoint_pool
+from result_cache_test import Clock
+from sparqlc import Balancing, EndpointPool, SparqlException, SparqlProtocolException
+
+ENDPOINTS = ['http://a/sparql', 'http://b/sparql', 'http://c/sparql']
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(sparqlc.endpoint_pool, 'monotonic', clock)
+    return clock
+
+
+def picks(pool: EndpointPool, count: int) -> List[str]:
+    endpoints = []
+    for _ in range(count):
+        with pool.acquire() as call:
+            endpoints.append(call.endpoint)
+    return endpoints
+
+
+def fail(pool: EndpointPool, error: SparqlException = SparqlProtocolException(503, 'Busy')) -> str:
+    with pytest.raises(type(error)):
+        with pool.acquire() as call:
+            raise error
+    return call.endpoint
+
+
+class TestEndpointPool:
+    def test_round_robin(self, clock):
+        pool = EndpointPool(ENDPOINTS, Balancing.ROUND_ROBIN)
+        assert picks(pool, 6) == ENDPOINTS * 2
+
+    def test_least_outstanding(self, clock):
+        pool = EndpointPool(ENDPOINTS, Balancing.LEAST_OUTSTANDING)
+        a = pool.acquire()
+        b = pool.acquire()
+        assert (a.endpoint, b.endpoint) == (ENDPOINTS[0], ENDPOINTS[1])
+        assert picks(pool, 3) == [ENDPOINTS[2]] * 3
+        with a:
+            pass
+        assert picks(pool, 1) != [ENDPOINTS[1]]
+        assert pool.stats[ENDPOINTS[1]]['outstanding'] == 1
+
+    def test_ewma(self, clock):
+        pool = EndpointPool(ENDPOINTS, Balancing.EWMA, decay=0.5)
+        for endpoint, duration in zip(ENDPOINTS, (2.5, 1.0, 4.0)):
+            call = pool.acquire()
+            assert call.endpoint == endpoint
+            clock.now += duration
+            with call:
+                pass
+        assert [pool.stats[endpoint]['latency'] for endpoint in ENDPOINTS] == [2.5, 1.0, 4.0]
+        # The fastest replica is weighted by its requests in progress
+        calls = [pool.acquire() for _ in range(3)]
+        assert [call.endpoint for call in calls] == [ENDPOINTS[1], ENDPOINTS[1], ENDPOINTS[0]]
+
+    def test_ejection(self, clock):
+        pool = EndpointPool(ENDPOINTS[:2], Balancing.ROUND_ROBIN, max_failures=2, ejection_duration=10.0)
+        assert fail(pool) == ENDPOINTS[0]
+        # A client error is not a failure of the replica
+        assert fail(pool, SparqlProtocolException(400, 'Syntax error')) == ENDPOINTS[1]
+        assert fail(pool, SparqlException('HTTP Error occurred.')) == ENDPOINTS[0]
+        assert pool.stats[ENDPOINTS[0]]['ejected']
+        assert pool.stats[ENDPOINTS[1]]['failures'] == 0
+        assert picks(pool, 3) == [ENDPOINTS[1]] * 3
+        clock.now += 10.0
+        # Readmitted on trial, a single failure ejects it again
+        assert fail(pool) == ENDPOINTS[0]
+        assert picks(pool, 2) == [ENDPOINTS[1]] * 2
+        clock.now += 10.0
+        # Confirmed by a successful request
+        assert sorted(picks(pool, 2)) == ENDPOINTS[:2]
+        assert pool.stats[ENDPOINTS[0]] | {'latency': None} == {
+            'outstanding': 0, 'requests': 4, 'failures': 0, 'latency': None, 'ejected': False, 'ejections': 2
+        }
+
+    def test_all_ejected(self, clock):
+        pool = EndpointPool(ENDPOINTS[:2], Balancing.ROUND_ROBIN, max_failures=1, ejection_duration=10.0)
+        fail(pool)
+        clock.now += 1.0
+        fail(pool)
+        assert all(stats['ejected'] for stats in pool.stats.values())
+        assert picks(pool, 2) == [ENDPOINTS[0]] * 2
+
+    def test_cancelled(self, clock):
+        pool = EndpointPool(ENDPOINTS, max_failures=1)
+        with pytest.raises(KeyboardInterrupt):
+            with pool.acquire():
+                raise KeyboardInterrupt
+        assert pool.stats[ENDPOINTS[0]] == {
+            'outstanding': 0, 'requests': 0, 'failures': 0, 'latency': None, 'ejected': False, 'ejections': 0
+        }
+
+    def test_no_endpoint(self):
+        with pytest.raises(ValueError):
+            EndpointPool([])
@@ -0,0 +1,175 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from threading import current_thread, Event
+from time import sleep
+from typing import Callable, List
+
+import pytest
+
+from sparqlc import HedgingPolicy, SparqlProtocolException
+
+
+def policy(latency: float = 0.01, **kwargs) -> HedgingPolicy:
+    hedging = HedgingPolicy(min_samples=1, max_extra_load=1.0, **kwargs)
+    hedging.record(latency)
+    return hedging
+
+
+def slow_first(first: Event) -> Callable[[], str]:
+    """ The first request waits for the event, the others are answered right away """
+    calls = count()
+
+    def send() -> str:
+        call = next(calls)
+        if call == 0:
+            first.wait(5.0)
+        return f'response {call}'
+    return send
+
+
+class TestHedgingPolicy:
+    def test_delay(self):
+        hedging = HedgingPolicy(percentile=0.9, window_size=10, min_samples=5)
+        for latency in (0.5, 0.1, 0.4, 0.2):
+            hedging.record(latency)
+        assert hedging.delay() is None
+        hedging.record(0.3)
+        assert hedging.delay() == 0.5
+        for _ in range(10):
+            hedging.record(1.0)
+        assert hedging.delay() == 1.0
+
+    @pytest.mark.parametrize('statement, hedgeable', [
+        ('SELECT * {?s ?p ?o}', True),
+        ('INSERT DATA { <http://a> <http://b> <http://c> }', False),
+    ])
+    def test_hedgeable(self, statement, hedgeable):
+        assert HedgingPolicy.hedgeable(statement) is hedgeable
+
+    def test_not_hedged(self):
+        hedging = policy(latency=1.0)
+        assert hedging.send(lambda: 'response', lambda response: None) == 'response'
+        assert hedging.stats == {'requests': 1, 'hedged': 0, 'won': 0, 'denied': 0}
+
+    def test_hedge_wins(self):
+        hedging = policy()
+        first = Event()
+        discarded = []
+        discarding = Event()
+
+        def discard(response: str) -> None:
+            discarded.append(response)
+            discarding.set()
+        assert hedging.send(slow_first(first), discard) == 'response 1'
+        assert hedging.stats == {'requests': 1, 'hedged': 1, 'won': 1, 'denied': 0}
+        # The late response is discarded
+        first.set()
+        assert discarding.wait(5.0)
+        assert discarded == ['response 0']
+
+    def test_first_wins(self):
+        hedging = policy()
+        responses: List[Event] = [Event(), Event()]
+        calls = count()
+
+        def send() -> int:
+            call = next(calls)
+            if call == 1:
+                responses[0].set()
+                responses[1].wait(5.0)
+            else:
+                responses[0].wait(5.0)
+            return call
+        discarded = []
+        assert hedging.send(send, discarded.append) == 0
+        responses[1].set()
+        assert hedging.stats['won'] == 0
+
+    def test_load_cap(self):
+        hedging = HedgingPolicy(percentile=0.0, min_samples=1, max_extra_load=0.5, max_burst=1.0)
+        hedging.record(0.01)
+        for _ in range(4):
+            assert hedging.send(lambda: sleep(0.05) or 'response', lambda response: None) == 'response'
+        # A hedge per two requests
+        assert hedging.stats | {'won': None} == {'requests': 4, 'hedged': 2, 'won': None, 'denied': 2}
+
+    def test_max_threads(self):
+        hedging = policy(max_threads=1)
+        # The thread sending the first request is busy, the hedge is denied
+        assert hedging.send(lambda: sleep(0.05) or 'response', lambda response: None) == 'response'
+        assert hedging.stats == {'requests': 1, 'hedged': 0, 'won': 0, 'denied': 1}
+        first = Event()
+        sending = Event()
+        threads = []
+
+        def send() -> str:
+            threads.append(current_thread())
+            sending.set()
+            first.wait(5.0)
+            return 'first'
+        with ThreadPoolExecutor(1) as executor:
+            future = executor.submit(hedging.send, send, lambda response: None)
+            assert sending.wait(5.0)
+            # No thread is free, the query is sent without being hedged in the calling thread
+            assert hedging.send(lambda: threads.append(current_thread()) or 'second', lambda response: None) == 'second'
+            first.set()
+            assert future.result() == 'first'
+        assert threads[1] is current_thread()
+
+    def test_failures(self):
+        hedging = policy()
+        calls = count()
+
+        def send() -> str:
+            if next(calls) == 0:
+                raise SparqlProtocolException(503, 'Busy')
+            return 'response'
+        # Failing before the hedging delay, the request is not hedged
+        with pytest.raises(SparqlProtocolException):
+            hedging.send(send, lambda response: None)
+        assert hedging.stats['hedged'] == 0
+
+        def failing() -> str:
+            call = next(calls)
+            if call == 1:
+                sleep(0.05)
+            raise SparqlProtocolException(503, f'Busy {call}')
+        # Both fail, the error of the first one is raised
+        calls = count(1)
+        with pytest.raises(SparqlProtocolException, match='Busy 1'):
+            hedging.send(failing, lambda response: None)
+        assert hedging.stats['hedged'] == 1
+
+    def test_async(self):
+        hedging = policy()
+        calls = count()
+        cancelled = []
+
+        async def send() -> str:
+            call = next(calls)
+            if call == 0:
+                try:
+                    await asyncio.sleep(5.0)
+                except asyncio.CancelledError:
+                    cancelled.append(call)
+                    raise
+            return f'response {call}'
+
+        async def run():
+            response = await hedging.send_async(send, lambda response: None)
+            await asyncio.sleep(0)
+            return response
+        assert asyncio.run(run()) == 'response 1'
+        assert cancelled == [0]
+        assert hedging.stats == {'requests': 1, 'hedged': 1, 'won': 1, 'denied': 0}
+
+    def test_async_failures(self):
+        hedging = policy()
+
+        async def send() -> str:
+            await asyncio.sleep(0.05)
+            raise SparqlProtocolException(503, 'Busy')
+        with pytest.raises(SparqlProtocolException):
+            asyncio.run(hedging.send_async(send, lambda response: None))
+        assert hedging.stats['hedged'] == 1
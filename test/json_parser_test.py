@@ -0,0 +1,102 @@
+from io import BytesIO
+
+import pytest
+
+from result_set_test import resource, tmp_file, W3C_SAMPLE_RESULT, W3C_SAMPLE_RESULT_RAW, W3C_SAMPLE_RESULT_VARS
+from sparqlc import IRI, Literal, RawResultSet, ResultSet, RESULT_TYPE_SPARQL_JSON, SparqlParseException, XSD_STRING
+from sparqlc.json_parser import JsonResultParser
+
+
+def json_result_set(content: str, result_set_type: type = RawResultSet) -> RawResultSet:
+    return result_set_type(BytesIO(content.encode('utf-8')), content_type=RESULT_TYPE_SPARQL_JSON)
+
+
+class TestJsonResultParser:
+    def test_w3_result(self, tmp_path):
+        rs = RawResultSet(tmp_file(tmp_path, resource('w3c_sample_result.srj')), content_type=RESULT_TYPE_SPARQL_JSON)
+        assert rs.fetch_rows() == W3C_SAMPLE_RESULT_RAW
+        assert rs.variables == W3C_SAMPLE_RESULT_VARS
+        assert rs.has_result() is None
+
+    def test_w3_result_converted(self, tmp_path):
+        rs = ResultSet(tmp_file(tmp_path, resource('w3c_sample_result.srj')), content_type=RESULT_TYPE_SPARQL_JSON)
+        assert rs.fetch_rows() == W3C_SAMPLE_RESULT
+
+    def test_content_type_parameters(self, tmp_path):
+        rs = RawResultSet(
+            tmp_file(tmp_path, resource('w3c_sample_result.srj')),
+            content_type='Application/SPARQL-Results+JSON; charset=utf-8'
+        )
+        assert rs.fetch_rows() == W3C_SAMPLE_RESULT_RAW
+
+    def test_utf_8(self, tmp_path):
+        r = RawResultSet(tmp_file(tmp_path, resource('utf_8_result.srj')), content_type='application/json').fetch_rows()
+        assert r == [(
+            IRI('http://aims.fao.org/aos/geopolitical.owl#Germany'),
+            Literal('Germany', XSD_STRING),
+            Literal('Германия', XSD_STRING),
+        )]
+
+    def test_has_response_positive(self, tmp_path):
+        rs = RawResultSet(tmp_file(tmp_path, resource('ask_result_positive.srj')), content_type=RESULT_TYPE_SPARQL_JSON)
+        assert rs.has_result() is True
+        assert rs.fetch_rows() == []
+
+    def test_has_response_negative(self, tmp_path):
+        rs = RawResultSet(tmp_file(tmp_path, resource('ask_result_negative.srj')), content_type=RESULT_TYPE_SPARQL_JSON)
+        assert rs.has_result() is False
+
+    def test_empty(self):
+        rs = json_result_set('')
+        assert rs.variables == []
+        assert rs.has_result() is None
+        assert rs.fetch_rows() == []
+
+    def test_no_bindings(self):
+        rs = json_result_set('{"head": {"vars": ["a"]}, "results": {"bindings": []}}')
+        assert rs.variables == ['a']
+        assert rs.fetch_rows() == []
+
+    def test_resume_iteration(self, tmp_path):
+        rs = RawResultSet(tmp_file(tmp_path, resource('w3c_sample_result.srj')), content_type=RESULT_TYPE_SPARQL_JSON)
+        assert rs.fetch_rows(1) == W3C_SAMPLE_RESULT_RAW[:1]
+        assert rs.fetch_rows() == W3C_SAMPLE_RESULT_RAW[1:]
+
+    @pytest.mark.parametrize('chunk_size', [1, 3, 17])
+    def test_small_chunks(self, tmp_path, monkeypatch, chunk_size: int):
+        """
+        Tokens, numbers and multibyte characters split in between the chunks must not matter
+        """
+        monkeypatch.setattr(JsonResultParser, 'CHUNK_SIZE', chunk_size)
+        rs = RawResultSet(tmp_file(tmp_path, resource('w3c_sample_result.srj')), content_type=RESULT_TYPE_SPARQL_JSON)
+        assert rs.fetch_rows() == W3C_SAMPLE_RESULT_RAW
+        rs = RawResultSet(tmp_file(tmp_path, resource('utf_8_result.srj')), content_type=RESULT_TYPE_SPARQL_JSON)
+        assert rs.fetch_rows()[0][2] == Literal('Германия', XSD_STRING)
+        rs = json_result_set('{"head": {}, "ignored": 12345678, "boolean": true}')
+        assert rs.has_result() is True
+
+    def test_results_before_head(self):
+        rs = json_result_set(
+            '{"results": {"bindings": [{"a": {"type": "uri", "value": "http://x"}}, {}]}, "head": {"vars": ["b", "a"]}}'
+        )
+        assert rs.variables == ['b', 'a']
+        assert rs.fetch_rows() == [(None, IRI('http://x')), (None, None)]
+
+    TEST_INVALID = [
+        '{"head": {"vars": ["a"]}, "results": {"bindings": [{"a": {"type": "uri", "value": "x"}}',
+        '{"head": {"vars": ["a"]}, "results": {"bindings": [{"a": {"type": "uri"}}]}}',
+        '{"head": {"vars": ["a"]}, "results": {"bindings": [{"b": {"type": "uri", "value": "x"}}]}}',
+        '{"head": {"vars": ["a"]}, "results": {"bindings": [{"a": {"type": "triple", "value": "x"}}]}}',
+        '{"results": {"bindings": []}}',
+        '{"head": ["a"], "results": {"bindings": []}}',
+        '{"head": {"vars": "a"}}',
+        '{"results": [], "head": {"vars": ["a"]}}',
+        '{"head": {"vars": ["a"]}, "results": {"bindings": ["a"]}}',
+        '{"head": {"vars": ["a"]}, "results": {"bindings": [{"a": "x"}]}}',
+        '["head"]',
+    ]
+
+    @pytest.mark.parametrize('content', TEST_INVALID)
+    def test_invalid(self, content: str):
+        with pytest.raises(SparqlParseException):
+            json_result_set(content).fetch_rows()
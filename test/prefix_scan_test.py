@@ -0,0 +1,21 @@
+import pytest
+
+from sparqlc.prefix_scan import used_prefixes
+
+
+class TestUsedPrefixes:
+    @pytest.mark.parametrize('statement, expected', [
+        ('SELECT ?l WHERE { ?s rdfs:label ?l }', {'rdfs'}),
+        ('SELECT * { ?s a owl:Class ; ex:p ex2:a:b . ?s :p _:b1 }', {'owl', 'ex', 'ex2', ''}),
+        ('SELECT * { ?s dc.terms:title ?t . ?t foaf:name. }', {'dc.terms', 'foaf'}),
+        ('SELECT * { <http://a/b:c> ?p "x:y", \'z:w\', """q:r""" } # foaf:name', set()),
+        ('SELECT ?s { ?s ?p ?o FILTER(?o < 5 && ?o > 1 && ?o < ex:z) }', {'ex'}),
+        ('PREFIX ex: <http://ex/> prefix : <http://e/> ASK { ex:a :b dc:c }', {'dc'}),
+        ('ASK {}', set()),
+    ])
+    def test_used_prefixes(self, statement, expected):
+        assert used_prefixes(statement) == expected
+
+    def test_cached(self):
+        statement = 'SELECT ?l WHERE { ?s skos:prefLabel ?l }'
+        assert used_prefixes(statement) is used_prefixes(statement)
@@ -7,7 +7,8 @@ from urllib3 import HTTPResponse
 from urllib3.exceptions import ConnectTimeoutError
 
 from service_mixin_test import MyService
-from sparqlc import Query, RawResultSet, ResultSet, SparqlException, SparqlMethod, SparqlProtocolException
+from sparqlc import Query, RawResultSet, ResultSet, RESULT_TYPE_SPARQL_JSON, SparqlException, SparqlMethod
+from sparqlc import SparqlProtocolException
 from sparqlc.service_base import HEADER_ACCEPT, HEADER_USER_AGENT, USER_AGENT
 
 
@@ -91,6 +92,7 @@ class TestQuery:
 
         mock_response = MagicMock(spec=HTTPResponse, name="Mock response")
         mock_response.status = error_code
+        mock_response.headers = {}
         mock_response.read.return_value = error_message.encode()
         service = self.MyTestService(method)
         service.endpoint = endpoint
@@ -117,6 +119,7 @@ class TestQuery:
     def mock_response_fixture(self) -> HTTPResponse:
         mock_response = MagicMock(spec=HTTPResponse, name="Mock response")
         mock_response.status = self.RESPONSE_HTTP_STATUS
+        mock_response.headers = {}
         mock_response.read.return_value = self.RESPONSE_HTTP_BODY.encode()
         return mock_response
 
@@ -247,6 +250,7 @@ class TestQuery:
 
         mock_response = MagicMock(spec=HTTPResponse, name="Mock response")
         mock_response.status = error_code
+        mock_response.headers = {}
         mock_response.read.return_value = error_message.encode()
         service = self.MyTestService(method)
         service.endpoint = endpoint
@@ -275,6 +279,7 @@ class TestQuery:
 
         mock_response = MagicMock(spec=HTTPResponse, name="Mock response")
         mock_response.status = http_status
+        mock_response.headers = {}
         mock_response.read.return_value = http_body.encode()
         service = self.MyTestService(method)
         service.endpoint = endpoint
@@ -293,6 +298,14 @@ class TestQuery:
             retries=MyService.MAX_REDIRECTS
         )
 
+    def test_query_content_type(self):
+        mock_response = self.mock_response_fixture()
+        mock_response.headers = {'Content-Type': RESULT_TYPE_SPARQL_JSON}
+        svc = self.MyTestService.get_fixture(SparqlMethod.GET)
+        svc.pool_request = MagicMock(return_value=mock_response)
+        assert Query(svc).query(self.REQUEST_STATEMENT).content_type == RESULT_TYPE_SPARQL_JSON
+        assert Query(svc).raw_query(self.REQUEST_STATEMENT).content_type == RESULT_TYPE_SPARQL_JSON
+
     def test_raw_query_exception(self):
         method = SparqlMethod.GET
         endpoint = 'http://a.b/c'
@@ -317,6 +330,41 @@ class TestQuery:
             retries=MyService.MAX_REDIRECTS
         )
 
+    def test_shared_snapshot(self):
+        service = MyService(0.0)
+        service.set_prefix('a', '1')
+        q1 = Query(service)
+        q2 = Query(service)
+        assert q1.snapshot() is q2.snapshot() is service.snapshot()
+        assert q1.query_string('ASK {}') == 'PREFIX a: <1> ASK {}'
+
+        # Changing the service does not change the existing queries
+        service.set_prefix('b', '2')
+        service.headers['X-Custom'] = 'custom'
+        assert q1.query_string('ASK {}') == 'PREFIX a: <1> ASK {}'
+        assert 'X-Custom' not in q1.request_headers()
+        q3 = Query(service)
+        assert q3.snapshot() is not q1.snapshot()
+        assert q3.query_string('ASK {}') == 'PREFIX a: <1> PREFIX b: <2> ASK {}'
+        assert q3.request_headers()['X-Custom'] == 'custom'
+
+        # Changing a query changes neither the service nor the other queries
+        q1.default_graphs.append('g')
+        q1.accept = 'text/csv'
+        assert q1.snapshot() is not q2.snapshot()
+        assert q1.snapshot().default_graphs == ['g']
+        assert q1.request_headers()[HEADER_ACCEPT] == 'text/csv'
+        assert service.default_graphs == []
+        assert service.accept == MyService.ACCEPT
+        assert q2.snapshot().default_graphs == []
+
+    def test_held_container(self):
+        service = MyService(0.0)
+        graphs = service.default_graphs
+        Query(service)
+        graphs.append('g')
+        assert Query(service).default_graphs == ['g']
+
     @staticmethod
     def set_prefixes(q: Query) -> Query:
         q.set_prefix('a', 'url/1')
@@ -480,3 +528,22 @@ class TestQuery:
     def test_query_string_no_prefix(self):
         q = Query(self.MyTestService())
         assert q.query_string(self.STATEMENT_PLAIN) == self.STATEMENT_PLAIN
+
+    def test_query_string_used_prefixes_only(self):
+        service = self.MyTestService()
+        service.set_prefix('rdfs', 'R')
+        service.set_prefix('owl', 'O')
+        service.set_prefix('ex', 'E')
+        service.set_prefix('', 'D')
+        service.used_prefixes_only = True
+        q = Query(service)
+        assert q.used_prefixes_only
+        assert q.query_string('SELECT ?l { ?s rdfs:label ?l }') == 'PREFIX rdfs: <R> SELECT ?l { ?s rdfs:label ?l }'
+        assert q.query_string('ASK { :a owl:p "ex:b" }') == 'PREFIX owl: <O> PREFIX : <D> ASK { :a owl:p "ex:b" }'
+        # The prefixes declared by the statement are left alone
+        statement = 'PREFIX rdfs: <X> SELECT ?l { ?s rdfs:label ?l ; ex:p 1 }'
+        assert q.query_string(statement) == 'PREFIX ex: <E> ' + statement
+        assert q.query_string('ASK {}') == 'ASK {}'
+        assert q.param_string('ASK { ?s owl:p 1 }') == 'query=' + quote_plus('PREFIX owl: <O> ASK { ?s owl:p 1 }')
+        q.used_prefixes_only = False
+        assert q.query_string('ASK {}') == 'PREFIX rdfs: <R> PREFIX owl: <O> PREFIX ex: <E> PREFIX : <D> ASK {}'
@@ -0,0 +1,195 @@
+import asyncio
+from threading import Thread
+from typing import List
+
+import pytest
+
+import sparqlc.rate_limit
+from result_cache_test import Clock
+from sparqlc import RateLimiter, SparqlRateLimitException
+
+ENDPOINT = 'http://a.b/sparql'
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(sparqlc.rate_limit, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def sleeps(monkeypatch, clock) -> List[float]:
+    """ The waits for the tokens, which advance the clock """
+    sleeps = []
+
+    def sleep(delay: float) -> None:
+        sleeps.append(delay)
+        clock.now += delay
+    monkeypatch.setattr(sparqlc.rate_limit, 'sleep', sleep)
+    return sleeps
+
+
+class TestRateLimiter:
+    def test_rate(self, clock, sleeps):
+        limiter = RateLimiter(rate=2.0)
+        for _ in range(5):
+            with limiter.acquire(ENDPOINT):
+                pass
+        # A burst of two requests, then one every half second
+        assert sleeps == [0.5, 0.5, 0.5]
+        assert limiter.stats == {'requests': 5, 'delayed': 3, 'rejected': 0, 'wait_time': 1.5, 'max_wait_time': 0.5}
+
+    def test_refill(self, clock, sleeps):
+        limiter = RateLimiter(rate=1.0, burst=3.0)
+        for _ in range(3):
+            limiter.acquire(ENDPOINT)
+        clock.now += 2.0
+        for _ in range(3):
+            limiter.acquire(ENDPOINT)
+        assert sleeps == [1.0]
+        assert limiter.acquire('http://other/sparql').wait == 0.0
+
+    def test_on_wait(self, clock, sleeps):
+        waits = []
+        limiter = RateLimiter(rate=2.0, burst=1.0, max_concurrent=1, on_wait=lambda *wait: waits.append(wait))
+        for _ in range(2):
+            with limiter.acquire(ENDPOINT):
+                pass
+        assert waits == [(ENDPOINT, 0.0), (ENDPOINT, 0.5)]
+
+    def test_on_wait_failed(self, clock, sleeps):
+        calls = []
+
+        def on_wait(endpoint: str, wait: float) -> None:
+            calls.append(endpoint)
+            if len(calls) == 1:
+                raise ValueError(endpoint)
+        limiter = RateLimiter(max_concurrent=1, blocking=False, on_wait=on_wait)
+        with pytest.raises(ValueError):
+            limiter.acquire(ENDPOINT)
+        # The slot of the request has been released
+        limiter.acquire(ENDPOINT)
+        assert calls == [ENDPOINT, ENDPOINT]
+
+    def test_non_blocking(self, clock, sleeps):
+        limiter = RateLimiter(rate=4.0, burst=1.0, blocking=False)
+        limiter.acquire(ENDPOINT)
+        with pytest.raises(SparqlRateLimitException) as exc_info:
+            limiter.acquire(ENDPOINT)
+        assert (exc_info.value.endpoint, exc_info.value.retry_in) == (ENDPOINT, 0.25)
+        clock.now += 0.25
+        limiter.acquire(ENDPOINT)
+        assert limiter.stats['rejected'] == 1
+
+    def test_blocking_per_request(self, clock, sleeps):
+        limiter = RateLimiter(rate=4.0, burst=1.0)
+        limiter.acquire(ENDPOINT)
+        with pytest.raises(SparqlRateLimitException):
+            limiter.acquire(ENDPOINT, blocking=False)
+        limiter.acquire(ENDPOINT)
+        assert sleeps == [0.25]
+        limiter = RateLimiter(rate=4.0, burst=1.0, blocking=False)
+        limiter.acquire(ENDPOINT)
+        limiter.acquire(ENDPOINT, blocking=True)
+        assert sleeps == [0.25, 0.25]
+
+    def test_blocking_per_request_async(self):
+        limiter = RateLimiter(max_concurrent=1)
+
+        async def run():
+            with await limiter.acquire_async(ENDPOINT):
+                with pytest.raises(SparqlRateLimitException):
+                    await limiter.acquire_async(ENDPOINT, blocking=False)
+                waiting = asyncio.ensure_future(limiter.acquire_async(ENDPOINT))
+                await asyncio.sleep(0.01)
+                assert not waiting.done()
+            with await waiting:
+                pass
+        asyncio.run(run())
+        assert limiter.stats['rejected'] == 1
+
+    def test_max_wait(self, clock, monkeypatch):
+        sleeps = []
+        monkeypatch.setattr(sparqlc.rate_limit, 'sleep', sleeps.append)
+        limiter = RateLimiter(rate=1.0, burst=1.0, max_wait=1.5)
+        limiter.acquire(ENDPOINT)
+        limiter.acquire(ENDPOINT)
+        # The next token has already been taken by a request which is waiting for it
+        with pytest.raises(SparqlRateLimitException) as exc_info:
+            limiter.acquire(ENDPOINT)
+        assert exc_info.value.retry_in == 2.0
+        assert sleeps == [1.0]
+
+    def test_concurrency(self):
+        limiter = RateLimiter(max_concurrent=2)
+        first = limiter.acquire(ENDPOINT)
+        second = limiter.acquire(ENDPOINT)
+        acquired = []
+        waiting = Thread(target=lambda: acquired.append(limiter.acquire(ENDPOINT)))
+        waiting.start()
+        waiting.join(0.1)
+        assert not acquired
+        with first:
+            pass
+        waiting.join(5.0)
+        assert len(acquired) == 1 and acquired[0].wait > 0
+        with second:
+            pass
+
+    def test_concurrency_non_blocking(self):
+        limiter = RateLimiter(max_concurrent=1, blocking=False)
+        with limiter.acquire(ENDPOINT):
+            with pytest.raises(SparqlRateLimitException):
+                limiter.acquire(ENDPOINT)
+        limiter.acquire(ENDPOINT)
+
+    def test_concurrency_max_wait(self):
+        limiter = RateLimiter(max_concurrent=1, max_wait=0.05)
+        with limiter.acquire(ENDPOINT):
+            with pytest.raises(SparqlRateLimitException) as exc_info:
+                limiter.acquire(ENDPOINT)
+            assert exc_info.value.retry_in is None
+        # The slot is not handed over to the request which has given up
+        limiter.acquire(ENDPOINT)
+        assert limiter.stats['rejected'] == 1
+
+    def test_async(self):
+        limiter = RateLimiter(rate=50.0, burst=1.0, max_concurrent=2)
+        running = []
+        most = []
+
+        async def request() -> float:
+            with await limiter.acquire_async(ENDPOINT) as permit:
+                running.append(permit)
+                most.append(len(running))
+                await asyncio.sleep(0.05)
+                running.remove(permit)
+                return permit.wait
+
+        async def run() -> List[float]:
+            return await asyncio.gather(*(request() for _ in range(6)))
+        waits = asyncio.run(run())
+        assert max(most) == 2
+        assert waits[0] == 0.0 and all(wait > 0 for wait in waits[1:])
+        assert limiter.stats['delayed'] == 5
+
+    def test_async_cancelled(self):
+        limiter = RateLimiter(max_concurrent=1)
+
+        async def run():
+            permit = await limiter.acquire_async(ENDPOINT)
+            waiting = asyncio.ensure_future(limiter.acquire_async(ENDPOINT))
+            await asyncio.sleep(0.01)
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+            with permit:
+                pass
+            # The slot is free again
+            await asyncio.wait_for(limiter.acquire_async(ENDPOINT), 1.0)
+        asyncio.run(run())
+
+    def test_invalid_rate(self):
+        with pytest.raises(ValueError):
+            RateLimiter(rate=0.0)
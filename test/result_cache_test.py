@@ -0,0 +1,187 @@
+from io import BytesIO
+
+import pytest
+
+import sparqlc.result_cache
+from result_set_test import resource, W3C_SAMPLE_RESULT_RAW
+from sparqlc import RawResultSet, RESULT_TYPE_SPARQL_JSON, ResultCache, ResultCacheBase
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestResultCache:
+    def test_hit_and_miss(self):
+        cache = ResultCache()
+        assert cache.get('a') is None
+        assert cache.put('a', b'body', 'text/csv')
+        cached = cache.get('a')
+        assert (cached.body, cached.content_type) == (b'body', 'text/csv')
+        assert 'a' in cache
+        assert cache.stats == {'hits': 1, 'misses': 1, 'evictions': 0, 'expirations': 0, 'revalidations': 0,
+                               'entries': 1, 'size': 4}
+
+    def test_size_eviction(self):
+        cache = ResultCache(max_size=10, max_entry_size=10)
+        cache.put('a', b'aaaa', None)
+        cache.put('b', b'bbbb', None)
+        cache.get('a')
+        cache.put('c', b'cc', None)
+        assert len(cache) == 3
+        cache.put('d', b'dd', None)
+        assert 'b' not in cache
+        assert ('a' in cache, 'c' in cache, 'd' in cache) == (True, True, True)
+        assert cache.size == 8
+        assert cache.stats['evictions'] == 1
+
+    def test_replace(self):
+        cache = ResultCache(max_size=10, max_entry_size=10)
+        cache.put('a', b'aaaa', None)
+        cache.put('a', b'aaaaaa', None)
+        assert (len(cache), cache.size) == (1, 6)
+        assert cache.get('a').body == b'aaaaaa'
+
+    def test_max_entry_size(self):
+        cache = ResultCache(max_size=100)
+        assert cache.max_entry_size == 25
+        assert not cache.put('a', b'x' * 26, None)
+        assert cache.put('a', b'x' * 25, None)
+        assert ResultCache(max_size=100, max_entry_size=1000).max_entry_size == 100
+
+    def test_ttl(self, monkeypatch):
+        clock = Clock()
+        monkeypatch.setattr(sparqlc.result_cache, 'monotonic', clock)
+        cache = ResultCache(ttl=10)
+        cache.put('a', b'body', None)
+        clock.now += 9.9
+        assert cache.get('a') is not None
+        clock.now += 0.1
+        assert 'a' not in cache
+        assert cache.get('a') is None
+        assert cache.stats == {'hits': 1, 'misses': 1, 'evictions': 0, 'expirations': 1, 'revalidations': 0,
+                               'entries': 0, 'size': 0}
+
+    def test_revalidation(self, monkeypatch):
+        clock = Clock()
+        monkeypatch.setattr(sparqlc.result_cache, 'monotonic', clock)
+        cache = ResultCache(ttl=10)
+        cache.put('a', b'body', None, etag='"v1"')
+        cache.put('b', b'body', None, last_modified='Wed, 21 Oct 2015 07:28:00 GMT')
+        assert cache.stale('a') is None
+        clock.now += 10
+        assert cache.get('a') is None
+        assert cache.stale('a').etag == '"v1"'
+        assert cache.stale('b').last_modified == 'Wed, 21 Oct 2015 07:28:00 GMT'
+        assert cache.refresh('a')
+        assert cache.get('a').body == b'body'
+        assert cache.stale('a') is None
+        assert not cache.refresh('c')
+        stats = cache.stats
+        assert (stats['hits'], stats['misses'], stats['revalidations'], stats['entries']) == (1, 1, 1, 2)
+
+    def test_no_ttl(self, monkeypatch):
+        clock = Clock()
+        monkeypatch.setattr(sparqlc.result_cache, 'monotonic', clock)
+        cache = ResultCache(ttl=None)
+        cache.put('a', b'body', None)
+        clock.now += 1e9
+        assert cache.get('a') is not None
+
+    def test_pop_and_clear(self):
+        cache = ResultCache()
+        cache.put('a', b'aa', None)
+        cache.put('b', b'bb', None)
+        assert cache.pop('a')
+        assert not cache.pop('a')
+        cache.clear()
+        assert (len(cache), cache.size) == (0, 0)
+
+
+class TestRecordingResponse:
+    def test_fully_read(self):
+        cache = ResultCache()
+        response = cache.record('a', BytesIO(b'0123456789'), 'text/csv')
+        while response.read(3):
+            pass
+        assert cache.get('a').body == b'0123456789'
+        assert not response.recording
+
+    def test_read_at_once(self):
+        cache = ResultCache()
+        assert cache.record('a', BytesIO(b'0123456789'), None).read() == b'0123456789'
+        assert cache.get('a').body == b'0123456789'
+
+    def test_partially_read(self):
+        cache = ResultCache()
+        response = cache.record('a', BytesIO(b'0123456789'), None)
+        response.read(3)
+        response.close()
+        assert response.closed
+        assert 'a' not in cache
+
+    def test_too_large(self):
+        cache = ResultCache(max_size=100)
+        response = cache.record('a', BytesIO(b'x' * 50), None)
+        while response.read(10):
+            pass
+        assert 'a' not in cache
+
+    def test_read_to_length(self):
+        """ The reader stops at the end of the document, without reading past the body """
+        class Response(BytesIO):
+            @property
+            def length_remaining(self) -> int:
+                return len(self.getbuffer()) - self.tell()
+
+        cache = ResultCache()
+        response = cache.record('a', Response(b'0123456789'), None)
+        response.read(4)
+        assert 'a' not in cache
+        response.read(6)
+        assert cache.get('a').body == b'0123456789'
+
+    def test_chunked_drained(self):
+        """ The reader stops at the last row of a chunked document, the drain on closing reads the end of the body """
+        class ChunkedResponse(BytesIO):
+            length_remaining = None
+
+            def read(self, amt: int = None, decode_content: bool = True) -> bytes:
+                return super().read(amt)
+
+            def release_conn(self) -> None:
+                pass
+
+        body = resource('w3c_sample_result.srj').encode('utf-8')
+        cache = ResultCache()
+        with RawResultSet(cache.record('a', ChunkedResponse(body), None), content_type=RESULT_TYPE_SPARQL_JSON) as rs:
+            assert rs.fetch_rows(len(W3C_SAMPLE_RESULT_RAW)) == W3C_SAMPLE_RESULT_RAW
+            assert 'a' not in cache
+        assert cache.get('a').body == body
+
+    def test_drained_rest_not_recorded(self):
+        class Response(BytesIO):
+            def read(self, amt: int = None, decode_content: bool = True) -> bytes:
+                return super().read(amt)
+
+        cache = ResultCache()
+        response = cache.record('a', Response(b'0123456789'), None)
+        response.read(4)
+        while response.read(4, decode_content=False):
+            pass
+        assert 'a' not in cache
+
+
+class TestResultCacheBase:
+    def test_incomplete_subclass(self):
+        class SizeOnlyCache(ResultCacheBase):
+            @property
+            def size(self) -> int:
+                return 0
+
+        with pytest.raises(TypeError):
+            SizeOnlyCache(100, None, None)
@@ -1,4 +1,4 @@
-from datetime import date, datetime, time
+from datetime import date, datetime, time, timedelta, timezone
 from decimal import Decimal
 from io import IOBase
 from os import path
@@ -7,9 +7,11 @@ from tempfile import NamedTemporaryFile
 from typing import cast
 
 import pytest
+from dateutil.parser import parse as dt_parse
 
 from sparqlc import BlankNode, IRI, Literal, SparqlParseException, RawResultSet
-from sparqlc import ResultSet, XSD_FLOAT, XSD_INTEGER, XSD_STRING
+from sparqlc import ResultSet, XSD_DATE, XSD_DATETIME, XSD_FLOAT, XSD_INTEGER, XSD_STRING, XSD_TIME
+from sparqlc import RESULT_TYPE_SPARQL_JSON, RESULT_TYPE_TSV
 
 
 TYPE_MILLION_USD = 'http://aims.fao.org/aos/geopolitical.owl#MillionUSD'
@@ -264,6 +266,37 @@ class TestRawResultSet:
         with pytest.raises(SparqlParseException):
             RawResultSet(tmp_file(tmp_path, resource('invalid_chars.srx'))).fetch_rows()
 
+    REPEATED_IRI = [
+        [
+            '<sparql xmlns="http://www.w3.org/2005/sparql-results#"><head><variable name="a"/></head><results>'
+            '<result><binding name="a"><uri>http://a.b/c</uri></binding></result>'
+            '<result><binding name="a"><uri>http://a.b/c</uri></binding></result>'
+            '</results></sparql>',
+            None
+        ],
+        [
+            '{"head": {"vars": ["a"]}, "results": {"bindings": ['
+            '{"a": {"type": "uri", "value": "http://a.b/c"}}, {"a": {"type": "uri", "value": "http://a.b/c"}}'
+            ']}}',
+            RESULT_TYPE_SPARQL_JSON
+        ],
+        ['?a\n<http://a.b/c>\n<http://a.b/c>\n', RESULT_TYPE_TSV],
+    ]
+
+    @pytest.mark.parametrize('content, content_type', REPEATED_IRI)
+    def test_iri_cache(self, tmp_path, content: str, content_type: str):
+        rows = RawResultSet(tmp_file(tmp_path, content), content_type=content_type).fetch_rows()
+        assert rows == [(IRI('http://a.b/c'),), (IRI('http://a.b/c'),)]
+        assert rows[0][0] is rows[1][0]
+
+    @pytest.mark.parametrize('content, content_type', REPEATED_IRI)
+    def test_iri_cache_disabled(self, tmp_path, content: str, content_type: str):
+        rs = RawResultSet(tmp_file(tmp_path, content), content_type=content_type, iri_cache_size=0)
+        assert rs.iri_cache_size == 0
+        rows = rs.fetch_rows()
+        assert rows == [(IRI('http://a.b/c'),), (IRI('http://a.b/c'),)]
+        assert rows[0][0] is not rows[1][0]
+
 
 class TestResultSet:
     def test_simple_query_fetch_rows(self, tmp_path):
@@ -339,3 +372,106 @@ class TestResultSet:
         extras = {'typeX': float}
         raw = (Literal('123', datatype='typeX'),)
         assert ResultSet.unpack_row(raw, additional_types=extras) == (123.0,)
+
+    def test_conversion_plan_resources(self, tmp_path):
+        plan = ResultSet.conversion_plan()
+        for name in ('simple_result.srx', 'w3c_sample_result.srx', 'xsd_types.srx', 'big_text.srx'):
+            for raw in RawResultSet(tmp_file(tmp_path, resource(name))):
+                assert plan.unpack_row(raw) == ResultSet.unpack_row(raw)
+
+    def test_conversion_plan_mixed_column(self):
+        """
+        The plan learns new datatypes and term types appearing in a column
+        """
+        class MyLiteral(Literal):
+            pass
+
+        def convert_fn(value: str, new_type: str) -> str:
+            return f'{value}:{new_type}'
+
+        extras = {'typeX': float}
+        rows = [
+            (Literal('1', XSD_INTEGER), Literal('a')),
+            (Literal('2.5', XSD_FLOAT), IRI('http://a.b/c')),
+            (Literal('3', 'typeX'), None),
+            (Literal('4', 'typeY'), BlankNode('b1')),
+            (MyLiteral('5', XSD_INTEGER), Literal('a', lang='en')),
+            (None, Literal('6', 'typeY')),
+        ]
+        plan = ResultSet.conversion_plan(convert_fn, extras)
+        converted = [plan.unpack_row(raw) for raw in rows]
+        assert converted == [ResultSet.unpack_row(raw, convert_fn, extras) for raw in rows]
+        assert converted[3] == ('4:typeY', 'b1')
+        assert plan.unpack_row(()) == ()
+
+    def test_conversion_plan_learns_late_columns(self):
+        plan = ResultSet.conversion_plan()
+        assert plan.unpack_row((None, Literal('1', XSD_INTEGER))) == (None, 1)
+        assert plan.unpack_row((Literal('2.5', XSD_FLOAT), None)) == (2.5, None)
+        assert plan.unpack_row((Literal('3.5', XSD_FLOAT), Literal('4', XSD_INTEGER))) == (3.5, 4)
+        assert plan.unpack_row((IRI('http://a.b/c'), Literal('5', XSD_STRING))) == ('http://a.b/c', '5')
+        assert plan.unpack_row((Literal('6', XSD_INTEGER),)) == (6,)
+
+    def test_unpack_row_overridden(self, tmp_path):
+        class UpperResultSet(ResultSet):
+            @classmethod
+            def unpack_row(cls, raw, convert_fn=None, additional_types=None):
+                return tuple(str(value).upper() for value in super().unpack_row(raw, convert_fn, additional_types))
+
+        r = UpperResultSet(tmp_file(tmp_path, resource('simple_result.srx'))).fetch_rows()
+        expected = ResultSet(tmp_file(tmp_path, resource('simple_result.srx'))).fetch_rows()
+        assert r == [tuple(str(value).upper() for value in row) for row in expected]
+
+    def test_conversion_plan_basic_types_unchanged(self):
+        ResultSet.conversion_plan(additional_types={'typeX': float})
+        assert 'typeX' not in ResultSet.BASIC_TYPES
+
+    TEST_DATETIME = [
+        ['2009-11-02T14:31:40', datetime(2009, 11, 2, 14, 31, 40)],
+        ['2009-11-02 14:31:40', datetime(2009, 11, 2, 14, 31, 40)],
+        ['2009-11-02T14:31:40Z', datetime(2009, 11, 2, 14, 31, 40, tzinfo=timezone.utc)],
+        ['2009-11-02T14:31:40.5', datetime(2009, 11, 2, 14, 31, 40, 500000)],
+        ['2009-11-02T14:31:40.123456789+02:00',
+         datetime(2009, 11, 2, 14, 31, 40, 123456, tzinfo=timezone(timedelta(hours=2)))],
+        ['2009-11-02T14:31:40.25-05:30',
+         datetime(2009, 11, 2, 14, 31, 40, 250000, tzinfo=timezone(-timedelta(hours=5, minutes=30)))],
+        # Non-canonical values are parsed by dateutil
+        ['Nov 2 2009 14:31:40', datetime(2009, 11, 2, 14, 31, 40)],
+        ['2009-11-02T14:31', datetime(2009, 11, 2, 14, 31)],
+    ]
+
+    @pytest.mark.parametrize('value, expected', TEST_DATETIME)
+    def test_parse_datetime(self, value: str, expected: datetime):
+        result = ResultSet.BASIC_TYPES[XSD_DATETIME](value)
+        assert result == expected
+        assert result.utcoffset() == expected.utcoffset()
+        assert result == dt_parse(value)
+
+    TEST_DATE = [
+        ['1991-08-20', date(1991, 8, 20)],
+        ['1991-08-20Z', date(1991, 8, 20)],
+        ['1991-08-20+02:00', date(1991, 8, 20)],
+        ['20 Aug 1991', date(1991, 8, 20)],
+    ]
+
+    @pytest.mark.parametrize('value, expected', TEST_DATE)
+    def test_parse_date(self, value: str, expected: date):
+        assert ResultSet.BASIC_TYPES[XSD_DATE](value) == expected
+
+    TEST_TIME = [
+        ['18:58:21', time(18, 58, 21)],
+        ['18:58:21.5Z', time(18, 58, 21, 500000)],
+        ['18:58:21.123-05:00', time(18, 58, 21, 123000)],
+        ['6:58 PM', time(18, 58)],
+    ]
+
+    @pytest.mark.parametrize('value, expected', TEST_TIME)
+    def test_parse_time(self, value: str, expected: time):
+        result = ResultSet.BASIC_TYPES[XSD_TIME](value)
+        assert result == expected
+        assert result.tzinfo is None
+        assert result == dt_parse(value).time()
+
+    def test_parse_datetime_invalid(self):
+        with pytest.raises(ValueError):
+            ResultSet.BASIC_TYPES[XSD_DATETIME]('2009-11-02T24:00:00')
@@ -0,0 +1,93 @@
+from email.utils import formatdate
+from time import time
+
+import pytest
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ReadTimeoutError
+
+import sparqlc.retry
+from result_cache_test import Clock
+from sparqlc import RetryPolicy, SparqlException, SparqlProtocolException
+from sparqlc.retry import parse_retry_after
+
+
+def http_error(cause: BaseException) -> SparqlException:
+    try:
+        raise SparqlException('HTTP Error occurred.') from cause
+    except SparqlException as error:
+        return error
+
+
+class TestParseRetryAfter:
+    def test_seconds(self):
+        assert parse_retry_after('120') == 120.0
+        assert parse_retry_after(' 0 ') == 0.0
+
+    def test_date(self):
+        assert 58 <= parse_retry_after(formatdate(time() + 60, usegmt=True)) <= 60
+        assert parse_retry_after(formatdate(time() - 60, usegmt=True)) == 0.0
+
+    @pytest.mark.parametrize('value', [None, '', '-1', '1.5', 'soon'])
+    def test_invalid(self, value):
+        assert parse_retry_after(value) is None
+
+
+class TestRetryPolicy:
+    @pytest.mark.parametrize('statement, idempotent', [
+        ('SELECT * {?s ?p ?o}', True),
+        ('  ask {}', True),
+        ('# comment\nPREFIX ex: <http://ex/>\nPREFIX : <http://e/> BASE <http://b/> CONSTRUCT {} WHERE {}', True),
+        ('DESCRIBE <http://ex/a>', True),
+        ('INSERT DATA { <http://a> <http://b> <http://c> }', False),
+        ('PREFIX ex: <http://ex/> DELETE WHERE { ?s ex:p ?o }', False),
+        ('SELECTED', False),
+    ])
+    def test_idempotent(self, statement, idempotent):
+        assert RetryPolicy.idempotent(statement) is idempotent
+
+    def test_retryable(self):
+        policy = RetryPolicy()
+        assert policy.retryable(SparqlProtocolException(503, 'Busy'))
+        assert policy.retryable(SparqlProtocolException(429, 'Too many'))
+        assert not policy.retryable(SparqlProtocolException(400, 'Syntax error'))
+        assert policy.retryable(http_error(ConnectionResetError()))
+        assert policy.retryable(http_error(MaxRetryError(None, '/', NewConnectionError(None, 'refused'))))
+        assert not policy.retryable(http_error(ReadTimeoutError(None, '/', 'timed out')))
+        assert not policy.retryable(SparqlException('Other'))
+        assert RetryPolicy(exceptions=(ReadTimeoutError,)).retryable(http_error(ReadTimeoutError(None, '/', '')))
+
+    def test_not_started(self):
+        assert RetryPolicy().start('INSERT DATA {}') is None
+        assert RetryPolicy(max_retries=0).start('ASK {}') is None
+
+    def test_backoff(self, monkeypatch):
+        monkeypatch.setattr(sparqlc.retry, 'uniform', lambda low, high: high)
+        retry = RetryPolicy(max_retries=5, backoff=1.0, max_backoff=5.0, budget=None).start('ASK {}')
+        error = SparqlProtocolException(503, 'Busy')
+        assert [retry.delay(error) for _ in range(6)] == [1.0, 2.0, 4.0, 5.0, 5.0, None]
+        assert retry.retries == 5
+
+    def test_jitter(self):
+        retry = RetryPolicy(max_retries=100, backoff=1.0, budget=None).start('ASK {}')
+        delays = [retry.delay(SparqlProtocolException(503, 'Busy')) for _ in range(100)]
+        assert all(0.0 <= delay <= 10.0 for delay in delays)
+        assert len(set(delays)) > 1
+
+    def test_retry_after(self, monkeypatch):
+        monkeypatch.setattr(sparqlc.retry, 'uniform', lambda low, high: high)
+        retry = RetryPolicy(backoff=1.0).start('ASK {}')
+        assert retry.delay(SparqlProtocolException(503, 'Busy', retry_after=7.0)) == 7.0
+        assert retry.delay(SparqlProtocolException(503, 'Busy', retry_after=0.0)) == 2.0
+        ignoring = RetryPolicy(backoff=1.0, respect_retry_after=False).start('ASK {}')
+        assert ignoring.delay(SparqlProtocolException(503, 'Busy', retry_after=7.0)) == 1.0
+
+    def test_budget(self, monkeypatch):
+        clock = Clock()
+        monkeypatch.setattr(sparqlc.retry, 'monotonic', clock)
+        retry = RetryPolicy(max_retries=10, budget=10.0).start('ASK {}')
+        assert retry.delay(SparqlProtocolException(503, 'Busy', retry_after=6.0)) == 6.0
+        clock.now += 6.0
+        # The endpoint asks for a wait beyond the budget
+        assert retry.delay(SparqlProtocolException(503, 'Busy', retry_after=5.0)) is None
+        assert retry.delay(SparqlProtocolException(503, 'Busy', retry_after=3.0)) == 3.0
+        clock.now += 10.0
+        assert retry.delay(SparqlProtocolException(503, 'Busy')) is None
@@ -0,0 +1,637 @@
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Barrier, Thread
+from time import perf_counter, sleep
+from typing import Dict, Generator, List
+
+import pytest
+
+import sparqlc
+from binary_parser_test import w3c_sample_result
+from rate_limit_test import clock, sleeps  # noqa: F401 (fixtures)
+from result_set_test import resource
+from sparqlc import IRI, RESULT_TYPE_SPARQL_JSON, RESULT_TYPE_SPARQL_XML, Service, ServiceRegistry, SparqlMethod
+from sparqlc import RESULT_TYPE_BINARY, RESULT_TYPE_CSV, RESULT_TYPE_TSV
+from sparqlc import Balancing, CircuitBreaker, CircuitState, DiskResultCache, ReplicaService, ResultCache, RetryPolicy
+from sparqlc import HedgingPolicy, RateLimiter, SingleFlight, SparqlRateLimitException
+from sparqlc import SparqlCircuitOpenException, SparqlException, SparqlProtocolException
+
+
+def sample_result(rows: int) -> bytes:
+    return (
+        '<?xml version="1.0"?>'
+        '<sparql xmlns="http://www.w3.org/2005/sparql-results#"><head><variable name="s"/></head><results>'
+        + ''.join(
+            f'<result><binding name="s"><uri>http://example.org/resource/{i}</uri></binding></result>'
+            for i in range(rows)
+        )
+        + '</results></sparql>'
+    ).encode('utf-8')
+
+
+class SparqlHandler(BaseHTTPRequestHandler):
+    """ Keep-alive endpoint serving a result of the size given by the path """
+    protocol_version = 'HTTP/1.1'
+    RESPONSES = {
+        '/small': (200, sample_result(3)),
+        '/medium': (200, sample_result(1200)),
+        '/large': (200, sample_result(5000)),
+        '/error': (500, b'Internal error'),
+        '/flaky': (200, sample_result(3)),
+        '/truncated': (200, sample_result(1200)),
+    }
+    # The W3C sample result in each format, with its content type
+    FORMATS = {
+        '/w3c.srx': (RESULT_TYPE_SPARQL_XML, resource('w3c_sample_result.srx').encode('utf-8')),
+        '/w3c.srj': (RESULT_TYPE_SPARQL_JSON, resource('w3c_sample_result.srj').encode('utf-8')),
+        '/w3c.tsv': (RESULT_TYPE_TSV, resource('w3c_sample_result.tsv').encode('utf-8')),
+        '/w3c.csv': (RESULT_TYPE_CSV, resource('w3c_sample_result.csv').encode('utf-8')),
+        '/w3c.brt': (RESULT_TYPE_BINARY, w3c_sample_result()),
+    }
+
+    # Number of the next requests to /flaky (answered 503) and /truncated (cut short) which fail
+    FAILURES: Dict[str, int] = {}
+
+    # Longer GET request URIs are answered with 414 (URI Too Long), /post-only answers GET with 405
+    MAX_URI_LENGTH = 1000
+
+    # Validators of the responses to /etag and /last-modified
+    ETAG = '"v1"'
+    LAST_MODIFIED = 'Wed, 21 Oct 2015 07:28:00 GMT'
+
+    def do_GET(self) -> None:
+        path = self.path.split('?', 1)[0]
+        if path in ('/etag', '/last-modified'):
+            self.send_validated(path)
+            return
+        if path in self.FORMATS:
+            content_type, body = self.FORMATS[path]
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if path == '/post-only' or len(self.path) > self.MAX_URI_LENGTH:
+            self.send_status(405 if path == '/post-only' else 414)
+            return
+        status, body = self.RESPONSES[path]
+        if self.FAILURES.get(path, 0) > 0:
+            self.FAILURES[path] -= 1
+            self.send_failure(path, body)
+            return
+        # The statement can ask for a slow or failing response
+        if 'SLOW' in self.path:
+            sleep(0.3)
+        if 'FAIL' in self.path:
+            status, body = self.RESPONSES['/error']
+        self.send_response(status)
+        self.send_header('Content-Type', RESULT_TYPE_SPARQL_XML)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        self.rfile.read(int(self.headers['Content-Length']))
+        body = self.RESPONSES['/small'][1]
+        self.send_response(200)
+        self.send_header('Content-Type', RESULT_TYPE_SPARQL_XML)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_failure(self, path: str, body: bytes) -> None:
+        if path == '/flaky':
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '4')
+            self.end_headers()
+            self.wfile.write(b'Busy')
+        else:
+            self.send_response(200)
+            self.send_header('Content-Type', RESULT_TYPE_SPARQL_XML)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+
+    def send_status(self, status: int) -> None:
+        body = self.responses[status][0].encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_validated(self, path: str) -> None:
+        """ Small result with a validator, Not Modified if the request has the validator """
+        if path == '/etag':
+            header, value, modified = 'ETag', self.ETAG, self.headers.get('If-None-Match') != self.ETAG
+        else:
+            header, value, modified = 'Last-Modified', self.LAST_MODIFIED, 'If-Modified-Since' not in self.headers
+        body = self.RESPONSES['/small'][1] if modified else b''
+        self.send_response(200 if modified else 304)
+        self.send_header(header, value)
+        if modified:
+            self.send_header('Content-Type', RESULT_TYPE_SPARQL_XML)
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture(scope='module')
+def endpoint() -> Generator[str, None, None]:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SparqlHandler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+class TestConnectionReuse:
+    def test_fully_read(self, endpoint: str):
+        service = Service(f'{endpoint}/small', SparqlMethod.GET)
+        for _ in range(3):
+            assert len(service.raw_query('SELECT * {?s ?p ?o}').fetch_rows()) == 3
+        assert service.connection_stats == {'requests': 3, 'connections': 1, 'reused': 2}
+
+    def test_partially_read_drained(self, endpoint: str):
+        service = Service(f'{endpoint}/medium', SparqlMethod.GET)
+        for _ in range(3):
+            with service.raw_query('SELECT * {?s ?p ?o}') as rs:
+                assert rs.fetch_rows(1) == [(IRI('http://example.org/resource/0'),)]
+        assert service.connection_stats == {'requests': 3, 'connections': 1, 'reused': 2}
+
+    def test_partially_read_discarded(self, endpoint: str):
+        service = Service(f'{endpoint}/large', SparqlMethod.GET)
+        with service.raw_query('SELECT * {?s ?p ?o}') as rs:
+            assert rs.fetch_rows(1) == [(IRI('http://example.org/resource/0'),)]
+        assert len(service.raw_query('SELECT * {?s ?p ?o}').fetch_rows()) == 5000
+        assert service.connection_stats == {'requests': 2, 'connections': 2, 'reused': 0}
+
+    def test_error_response(self, endpoint: str):
+        service = Service(f'{endpoint}/error', SparqlMethod.GET)
+        for _ in range(2):
+            with pytest.raises(SparqlProtocolException):
+                service.raw_query('SELECT * {?s ?p ?o}')
+        assert service.connection_stats == {'requests': 2, 'connections': 1, 'reused': 1}
+
+    def test_no_requests(self):
+        assert Service('http://a.b/c').connection_stats == {'requests': 0, 'connections': 0, 'reused': 0}
+
+
+class TestServiceRegistry:
+    def test_shared_service(self):
+        registry = ServiceRegistry()
+        service = registry.get('http://a.b/c')
+        assert registry.get('http://a.b/c') is service
+        assert registry.get('http://a.b/c', SparqlMethod.GET) is not service
+        assert registry.get('http://a.b/c', accept=RESULT_TYPE_SPARQL_JSON) is not service
+        assert len(registry) == 3
+
+    def test_eviction(self):
+        registry = ServiceRegistry(2)
+        first = registry.get('http://a.b/1')
+        second = registry.get('http://a.b/2')
+        assert registry.get('http://a.b/1') is first
+        registry.get('http://a.b/3')
+        assert len(registry) == 2
+        assert registry.get('http://a.b/1') is first
+        assert registry.get('http://a.b/2') is not second
+
+    def test_clear(self):
+        registry = ServiceRegistry()
+        service = registry.get('http://a.b/c')
+        registry.clear()
+        assert len(registry) == 0
+        assert registry.get('http://a.b/c') is not service
+
+    def test_fork(self, monkeypatch):
+        registry = ServiceRegistry()
+        service = registry.get('http://a.b/c')
+        monkeypatch.setattr(sparqlc.service, 'getpid', lambda: -1)
+        assert registry.get('http://a.b/c') is not service
+        assert len(registry) == 1
+
+    def test_module_query(self, endpoint: str, monkeypatch):
+        monkeypatch.setattr(sparqlc.service, 'service_registry', ServiceRegistry())
+        statement = 'SELECT * {?s ?p ?o}'
+        for _ in range(3):
+            assert len(sparqlc.raw_query(f'{endpoint}/small', statement, SparqlMethod.GET).fetch_rows()) == 3
+        assert len(sparqlc.query(f'{endpoint}/small', statement, SparqlMethod.GET).fetch_rows()) == 3
+        service = sparqlc.service.service_registry.get(f'{endpoint}/small', SparqlMethod.GET)
+        assert service.connection_stats == {'requests': 4, 'connections': 1, 'reused': 3}
+
+
+class TestResultCache:
+    STATEMENT = 'SELECT * {?s ?p ?o}'
+
+    def test_hit(self, endpoint: str):
+        service = Service(f'{endpoint}/small', SparqlMethod.GET)
+        service.result_cache = ResultCache()
+        rows = service.raw_query(self.STATEMENT).fetch_rows()
+        for _ in range(3):
+            with service.raw_query(self.STATEMENT) as rs:
+                assert rs.variables == ['s']
+                assert rs.content_type == RESULT_TYPE_SPARQL_XML
+                assert rs.fetch_rows() == rows
+            assert rs.closed
+        assert service.query(self.STATEMENT).fetch_rows() == [('http://example.org/resource/0',),
+                                                              ('http://example.org/resource/1',),
+                                                              ('http://example.org/resource/2',)]
+        assert service.connection_stats['requests'] == 1
+        assert service.result_cache.stats['hits'] == 4
+
+    @pytest.mark.parametrize('path', list(SparqlHandler.FORMATS))
+    def test_hit_formats(self, endpoint: str, path: str):
+        service = Service(f'{endpoint}{path}', SparqlMethod.GET)
+        service.result_cache = ResultCache()
+        rows = service.raw_query(self.STATEMENT).fetch_rows()
+        assert len(rows) > 0
+        with service.raw_query(self.STATEMENT) as rs:
+            assert rs.content_type == SparqlHandler.FORMATS[path][0]
+            assert rs.fetch_rows() == rows
+        assert service.connection_stats['requests'] == 1
+        assert service.result_cache.stats['hits'] == 1
+
+    def test_key(self, endpoint: str):
+        service = Service(f'{endpoint}/small', SparqlMethod.GET)
+        service.result_cache = ResultCache()
+        service.raw_query(self.STATEMENT).fetch_rows()
+        service.raw_query('ASK {}').fetch_rows()
+        service.default_graphs.append('http://example.org/g')
+        service.raw_query(self.STATEMENT).fetch_rows()
+        service.accept = RESULT_TYPE_SPARQL_JSON
+        service.raw_query(self.STATEMENT).fetch_rows()
+        service.accept = RESULT_TYPE_SPARQL_XML
+        service.raw_query(self.STATEMENT).fetch_rows()
+        assert service.connection_stats['requests'] == 4
+        assert service.result_cache.stats['entries'] == 4
+
+    def test_key_user_agent(self, endpoint: str, tmp_path):
+        """ The disk cache outlives the version of the library, which is part of the User-Agent """
+        service = Service(f'{endpoint}/small', SparqlMethod.GET)
+        service.result_cache = DiskResultCache(str(tmp_path))
+        service.raw_query(self.STATEMENT).fetch_rows()
+        other = Service(f'{endpoint}/small', SparqlMethod.GET)
+        other.headers['User-Agent'] = 'sparql-client/0.0'
+        other.result_cache = DiskResultCache(str(tmp_path))
+        assert len(other.raw_query(f' {self.STATEMENT}\n').fetch_rows()) == 3
+        assert other.connection_stats['requests'] == 0
+        assert other.result_cache.stats['hits'] == 1
+
+    def test_partially_read(self, endpoint: str):
+        service = Service(f'{endpoint}/medium', SparqlMethod.GET)
+        service.result_cache = ResultCache()
+        with service.raw_query(self.STATEMENT) as rs:
+            rs.fetch_rows(1)
+        assert len(service.result_cache) == 0
+        assert len(service.raw_query(self.STATEMENT).fetch_rows()) == 1200
+        assert len(service.raw_query(self.STATEMENT).fetch_rows()) == 1200
+        assert service.connection_stats['requests'] == 2
+
+    @pytest.mark.parametrize('path', ['/etag', '/last-modified'])
+    def test_revalidation(self, endpoint: str, path: str):
+        service = Service(f'{endpoint}{path}', SparqlMethod.GET)
+        service.result_cache = ResultCache(ttl=0)
+        rows = service.raw_query(self.STATEMENT).fetch_rows()
+        assert len(rows) == 3
+        for _ in range(2):
+            with service.raw_query(self.STATEMENT) as rs:
+                assert rs.content_type == RESULT_TYPE_SPARQL_XML
+                assert rs.fetch_rows() == rows
+        assert service.connection_stats == {'requests': 3, 'connections': 1, 'reused': 2}
+        assert service.result_cache.stats['revalidations'] == 2
+
+    def test_revalidation_single_flight(self, endpoint: str, tmp_path):
+        service = Service(f'{endpoint}/etag', SparqlMethod.GET)
+        service.result_cache = DiskResultCache(str(tmp_path), ttl=0)
+        service.single_flight = SingleFlight()
+        for _ in range(3):
+            assert len(service.raw_query(self.STATEMENT).fetch_rows()) == 3
+        assert service.result_cache.stats['revalidations'] == 2
+
+    def test_error_not_cached(self, endpoint: str):
+        service = Service(f'{endpoint}/error', SparqlMethod.GET)
+        service.result_cache = ResultCache()
+        for _ in range(2):
+            with pytest.raises(SparqlProtocolException):
+                service.raw_query(self.STATEMENT)
+        assert service.connection_stats['requests'] == 2
+        assert len(service.result_cache) == 0
+
+    def test_disk_cache(self, endpoint: str, tmp_path):
+        service = Service(f'{endpoint}/medium', SparqlMethod.GET)
+        service.result_cache = DiskResultCache(str(tmp_path))
+        rows = service.raw_query(self.STATEMENT).fetch_rows()
+        assert len(rows) == 1200
+
+        restarted = Service(f'{endpoint}/medium', SparqlMethod.GET)
+        restarted.result_cache = DiskResultCache(str(tmp_path))
+        with restarted.raw_query('  ' + self.STATEMENT + '\n') as rs:
+            assert rs.content_type == RESULT_TYPE_SPARQL_XML
+            assert rs.fetch_rows() == rows
+        assert restarted.connection_stats['requests'] == 0
+
+
+class TestSingleFlight:
+    @staticmethod
+    def concurrent_rows(service: Service, statement: str, count: int) -> List:
+        barrier = Barrier(count)
+
+        def run():
+            barrier.wait()
+            return service.query(statement).fetch_rows()
+
+        with ThreadPoolExecutor(count) as executor:
+            futures = [executor.submit(run) for _ in range(count)]
+        return [future.exception() or future.result() for future in futures]
+
+    def test_coalesced(self, endpoint: str):
+        service = Service(f'{endpoint}/small', SparqlMethod.GET)
+        service.single_flight = SingleFlight()
+        results = self.concurrent_rows(service, 'SELECT * {?s ?p ?o} # SLOW', 10)
+        assert all(rows == results[0] for rows in results)
+        assert len(results[0]) == 3
+        assert service.connection_stats['requests'] == 1
+        assert service.single_flight.stats == {'leaders': 1, 'followers': 9}
+
+    def test_shared_error(self, endpoint: str):
+        service = Service(f'{endpoint}/small', SparqlMethod.GET)
+        service.single_flight = SingleFlight()
+        results = self.concurrent_rows(service, 'SELECT * {?s ?p ?o} # SLOW FAIL', 10)
+        assert all(isinstance(error, SparqlProtocolException) for error in results)
+        assert service.connection_stats['requests'] == 1
+
+    def test_with_cache(self, endpoint: str):
+        service = Service(f'{endpoint}/small', SparqlMethod.GET)
+        service.single_flight = SingleFlight()
+        service.result_cache = ResultCache()
+        self.concurrent_rows(service, 'SELECT * {?s ?p ?o} # SLOW', 10)
+        assert len(service.query('SELECT * {?s ?p ?o} # SLOW').fetch_rows()) == 3
+        assert service.connection_stats['requests'] == 1
+        assert service.result_cache.stats['hits'] == 1
+
+
+class TestAutoMethod:
+    SHORT = 'SELECT * {?s ?p ?o}'
+    LONG = 'SELECT * { VALUES ?s { ' + ' '.join(f'<http://example.org/resource/{i}>' for i in range(100)) + ' } }'
+
+    def test_get(self, endpoint: str):
+        service = Service(f'{endpoint}/small', SparqlMethod.AUTO)
+        assert service.create_query().request_method(self.SHORT) is SparqlMethod.GET
+        assert len(service.query(self.SHORT).fetch_rows()) == 3
+        assert service.connection_stats['requests'] == 1
+        assert service.get_rejected == frozenset()
+
+    def test_long_uri_posted(self, endpoint: str):
+        service = Service(f'{endpoint}/small', SparqlMethod.AUTO)
+        service.auto_post_method = SparqlMethod.POST
+        query = service.create_query()
+        assert query.request_method(self.LONG) is SparqlMethod.POST
+        assert query.query_uri(self.LONG) == f'{endpoint}/small'
+        assert len(query.query(self.LONG).fetch_rows()) == 3
+        assert service.connection_stats['requests'] == 1
+
+    @pytest.mark.parametrize('path, statement', [('/post-only', SHORT), ('/small', LONG)])
+    def test_rejected_get_remembered(self, endpoint: str, path: str, statement: str):
+        service = Service(endpoint + path, SparqlMethod.AUTO)
+        # The server rejects the long URI before the service does
+        service.max_get_uri_length = 10_000
+        assert len(service.query(statement).fetch_rows()) == 3
+        assert service.connection_stats['requests'] == 2
+        assert service.get_rejected == {endpoint + path}
+        assert service.create_query().request_method(self.SHORT) is SparqlMethod.POST_URL_ENCODED
+        assert len(service.query(statement).fetch_rows()) == 3
+        assert service.connection_stats['requests'] == 3
+
+    def test_explicit_get_not_retried(self, endpoint: str):
+        service = Service(f'{endpoint}/post-only', SparqlMethod.GET)
+        with pytest.raises(SparqlProtocolException):
+            service.query(self.SHORT)
+        assert service.get_rejected == frozenset()
+
+    def test_auto_post_method(self):
+        service = Service('http://a.b/c', SparqlMethod.AUTO)
+        with pytest.raises(ValueError):
+            service.auto_post_method = SparqlMethod.GET
+
+
+class TestRetry:
+    STATEMENT = 'SELECT * {?s ?p ?o}'
+
+    @staticmethod
+    def service(endpoint: str, failures: int, **policy) -> Service:
+        path = '/' + endpoint.rsplit('/', 1)[1]
+        SparqlHandler.FAILURES[path] = failures
+        service = Service(endpoint, SparqlMethod.GET)
+        service.retry_policy = RetryPolicy(backoff=0.01, **policy)
+        return service
+
+    def test_retried(self, endpoint: str):
+        service = self.service(f'{endpoint}/flaky', 2)
+        assert len(service.query(self.STATEMENT).fetch_rows()) == 3
+        assert service.connection_stats['requests'] == 3
+
+    def test_max_retries(self, endpoint: str):
+        service = self.service(f'{endpoint}/flaky', 3, max_retries=2)
+        with pytest.raises(SparqlProtocolException) as exc_info:
+            service.query(self.STATEMENT)
+        assert (exc_info.value.code, exc_info.value.retry_after) == (503, 0.0)
+        assert service.connection_stats['requests'] == 3
+
+    def test_update_not_retried(self, endpoint: str):
+        service = self.service(f'{endpoint}/flaky', 1)
+        with pytest.raises(SparqlProtocolException):
+            service.query('INSERT DATA { <http://a> <http://b> <http://c> }')
+        assert service.connection_stats['requests'] == 1
+
+    def test_no_policy(self):
+        assert Service('http://a.b/c').retry_policy is None
+        assert Service('http://a.b/c').create_query().retry_policy is None
+
+    def test_connection_error(self):
+        service = Service('http://127.0.0.1:9/sparql', SparqlMethod.GET, max_redirects=0)
+        service.retry_policy = RetryPolicy(max_retries=2, backoff=0.01)
+        with pytest.raises(SparqlException):
+            service.query(self.STATEMENT)
+
+    def test_failure_mid_stream_not_retried(self, endpoint: str):
+        service = self.service(f'{endpoint}/truncated', 1)
+        result = service.raw_query(self.STATEMENT)
+        rows = []
+        with pytest.raises(Exception):
+            for row in result.fetch_next():
+                rows.append(row)
+        assert 0 < len(rows) < 1200
+        assert service.connection_stats['requests'] == 1
+
+    def test_failure_receiving_retried(self, endpoint: str):
+        service = self.service(f'{endpoint}/truncated', 1)
+        service.single_flight = SingleFlight()
+        assert len(service.raw_query(self.STATEMENT).fetch_rows()) == 1200
+        assert service.connection_stats['requests'] == 2
+
+
+class TestCircuitBreaker:
+    STATEMENT = 'SELECT * {?s ?p ?o}'
+
+    def test_fails_fast(self, endpoint: str):
+        service = Service(f'{endpoint}/error', SparqlMethod.GET)
+        service.circuit_breaker = CircuitBreaker(window_size=3, min_calls=3)
+        for _ in range(3):
+            with pytest.raises(SparqlProtocolException):
+                service.query(self.STATEMENT)
+        assert service.circuit_breaker.state(f'{endpoint}/error') is CircuitState.OPEN
+        with pytest.raises(SparqlCircuitOpenException):
+            service.query(self.STATEMENT)
+        assert service.connection_stats['requests'] == 3
+
+    def test_not_retried_when_open(self, endpoint: str):
+        SparqlHandler.FAILURES['/flaky'] = 10
+        service = Service(f'{endpoint}/flaky', SparqlMethod.GET)
+        service.retry_policy = RetryPolicy(max_retries=5, backoff=0.01)
+        service.circuit_breaker = CircuitBreaker(window_size=2, min_calls=2)
+        # Two failures open the circuit, the next attempt fails fast and is not retried
+        with pytest.raises(SparqlCircuitOpenException):
+            service.query(self.STATEMENT)
+        assert service.connection_stats['requests'] == 2
+        SparqlHandler.FAILURES['/flaky'] = 0
+        service.circuit_breaker.reset()
+        assert len(service.query(self.STATEMENT).fetch_rows()) == 3
+        assert service.circuit_breaker.state(f'{endpoint}/flaky') is CircuitState.CLOSED
+
+
+class TestReplicaService:
+    STATEMENT = 'SELECT * {?s ?p ?o}'
+
+    def test_balanced(self, endpoint: str):
+        service = ReplicaService([f'{endpoint}/small', f'{endpoint}/medium'], SparqlMethod.GET,
+                                 balancing=Balancing.ROUND_ROBIN)
+        assert service.endpoint == f'{endpoint}/small'
+        assert [len(service.query(self.STATEMENT).fetch_rows()) for _ in range(4)] == [3, 1200, 3, 1200]
+        assert [stats['requests'] for stats in service.endpoint_pool.stats.values()] == [2, 2]
+
+    def test_failing_replica_ejected(self, endpoint: str):
+        SparqlHandler.FAILURES['/flaky'] = 100
+        try:
+            service = ReplicaService([f'{endpoint}/flaky', f'{endpoint}/small'], SparqlMethod.GET,
+                                     balancing=Balancing.ROUND_ROBIN)
+            service.retry_policy = RetryPolicy(backoff=0.01)
+            # The failed requests are retried on the other replica
+            for _ in range(6):
+                assert len(service.query(self.STATEMENT).fetch_rows()) == 3
+            stats = service.endpoint_pool.stats
+            assert stats[f'{endpoint}/flaky'] == {
+                'outstanding': 0, 'requests': 3, 'failures': 3, 'latency': None, 'ejected': True, 'ejections': 1
+            }
+            assert stats[f'{endpoint}/small']['requests'] == 6
+        finally:
+            SparqlHandler.FAILURES['/flaky'] = 0
+
+    def test_outstanding_until_read(self, endpoint: str):
+        service = ReplicaService([f'{endpoint}/large'], SparqlMethod.GET)
+        with service.query(self.STATEMENT) as rs:
+            assert next(rs.fetch_next()) == ('http://example.org/resource/0',)
+            stats = service.endpoint_pool.stats[f'{endpoint}/large']
+            assert (stats['outstanding'], stats['requests']) == (1, 0)
+            assert len(list(rs.fetch_next())) == 4999
+        stats = service.endpoint_pool.stats[f'{endpoint}/large']
+        assert (stats['outstanding'], stats['requests'], stats['failures']) == (0, 1, 0)
+        assert stats['latency'] is not None
+
+    def test_outstanding_until_closed(self, endpoint: str):
+        service = ReplicaService([f'{endpoint}/large'], SparqlMethod.GET)
+        # The rest of the body is too long to be drained
+        with service.query(self.STATEMENT) as rs:
+            next(rs.fetch_next())
+            assert service.endpoint_pool.stats[f'{endpoint}/large']['outstanding'] == 1
+        stats = service.endpoint_pool.stats[f'{endpoint}/large']
+        assert (stats['outstanding'], stats['requests'], stats['failures']) == (0, 0, 0)
+
+
+class TestHedging:
+    STATEMENT = 'SELECT * {?s ?p ?o}'
+
+    def test_slow_replica_hedged(self, endpoint: str):
+        # The statements sent to the first replica get a slow response
+        service = ReplicaService([f'{endpoint}/small?SLOW', f'{endpoint}/small'], SparqlMethod.GET,
+                                 balancing=Balancing.ROUND_ROBIN)
+        service.hedging_policy = HedgingPolicy(min_samples=1, max_extra_load=1.0)
+        service.hedging_policy.record(0.05)
+        start = perf_counter()
+        assert len(service.query(self.STATEMENT).fetch_rows()) == 3
+        assert perf_counter() - start < 0.3
+        assert service.hedging_policy.stats == {'requests': 1, 'hedged': 1, 'won': 1, 'denied': 0}
+        # The response of the slow replica is discarded once received, without recording an outcome
+        slow = f'{endpoint}/small?SLOW'
+        deadline = perf_counter() + 5.0
+        while service.endpoint_pool.stats[slow]['outstanding'] and perf_counter() < deadline:
+            sleep(0.01)
+        stats = service.endpoint_pool.stats[slow]
+        assert (stats['outstanding'], stats['requests']) == (0, 0)
+
+    def test_update_not_hedged(self, endpoint: str):
+        service = Service(f'{endpoint}/small', SparqlMethod.GET)
+        service.hedging_policy = HedgingPolicy(min_samples=1, max_extra_load=1.0)
+        service.hedging_policy.record(0.0)
+        service.query('INSERT DATA { <http://a> <http://b> <http://c> }').fetch_rows()
+        assert service.hedging_policy.stats['requests'] == 0
+
+
+class TestRateLimiter:
+    STATEMENT = 'SELECT * {?s ?p ?o}'
+
+    def test_rate(self, endpoint: str, sleeps: List[float]):
+        waits = []
+        service = Service(f'{endpoint}/small', SparqlMethod.GET)
+        service.rate_limiter = RateLimiter(rate=20.0, burst=1.0, on_wait=lambda *wait: waits.append(wait))
+        for _ in range(5):
+            assert len(service.query(self.STATEMENT).fetch_rows()) == 3
+        # The clock only advances while the requests wait for a token
+        assert sleeps == pytest.approx([0.05] * 4)
+        assert waits == [(f'{endpoint}/small', 0.0)] + [(f'{endpoint}/small', pytest.approx(0.05))] * 4
+        stats = service.rate_limiter.stats
+        assert (stats['requests'], stats['delayed']) == (5, 4)
+        assert stats['wait_time'] == pytest.approx(0.2)
+
+    def test_slot_held_until_read(self, endpoint: str):
+        service = Service(f'{endpoint}/large', SparqlMethod.GET)
+        service.rate_limiter = RateLimiter(max_concurrent=1, blocking=False)
+        with service.query(self.STATEMENT) as rs:
+            next(rs.fetch_next())
+            with pytest.raises(SparqlRateLimitException):
+                service.query(self.STATEMENT)
+            assert len(list(rs.fetch_next())) == 4999
+        assert len(service.query(self.STATEMENT).fetch_rows()) == 5000
+        # Released as well by a result set closed before the end
+        with service.query(self.STATEMENT) as rs:
+            next(rs.fetch_next())
+        assert len(service.query(self.STATEMENT).fetch_rows()) == 5000
+
+    def test_non_blocking_query(self, endpoint: str, sleeps: List[float]):
+        service = Service(f'{endpoint}/small', SparqlMethod.GET)
+        service.rate_limiter = RateLimiter(rate=1.0, burst=1.0)
+        service.query(self.STATEMENT).fetch_rows()
+        query = service.create_query()
+        query.rate_limit_blocking = False
+        with pytest.raises(SparqlRateLimitException):
+            query.query(self.STATEMENT)
+        # The other queries of the service still wait
+        assert len(service.query(self.STATEMENT).fetch_rows()) == 3
+        assert sleeps == [pytest.approx(1.0)]
+        assert service.connection_stats['requests'] == 2
+
+    def test_non_blocking(self, endpoint: str):
+        service = ReplicaService([f'{endpoint}/small'], SparqlMethod.GET)
+        service.rate_limiter = RateLimiter(rate=0.01, blocking=False)
+        service.retry_policy = RetryPolicy(backoff=0.01)
+        service.query(self.STATEMENT).fetch_rows()
+        with pytest.raises(SparqlRateLimitException):
+            service.query(self.STATEMENT)
+        # Neither sent nor retried, nor counted as a failure of the replica
+        assert service.connection_stats['requests'] == 1
+        assert service.endpoint_pool.stats[f'{endpoint}/small']['failures'] == 0
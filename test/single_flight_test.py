@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+
+import pytest
+
+from sparqlc import SingleFlight
+
+
+class TestSingleFlight:
+    def test_coalesced(self):
+        single_flight = SingleFlight()
+        release = Event()
+        calls = []
+
+        def work():
+            calls.append(1)
+            release.wait()
+            return 'result'
+
+        with ThreadPoolExecutor(8) as executor:
+            futures = [executor.submit(single_flight.do, 'key', work) for _ in range(8)]
+            while single_flight.stats['followers'] < 7:
+                pass
+            release.set()
+            assert [future.result() for future in futures] == ['result'] * 8
+        assert len(calls) == 1
+        assert len(single_flight) == 0
+        assert single_flight.stats == {'leaders': 1, 'followers': 7}
+
+    def test_shared_error(self):
+        single_flight = SingleFlight()
+
+        def fail():
+            while single_flight.stats['followers'] < 3:
+                pass
+            raise ValueError('failed')
+
+        with ThreadPoolExecutor(4) as executor:
+            leader = executor.submit(single_flight.do, 'key', fail)
+            while len(single_flight) == 0:
+                pass
+            followers = [executor.submit(single_flight.do, 'key', lambda: 'not called') for _ in range(3)]
+            for future in [leader] + followers:
+                with pytest.raises(ValueError):
+                    future.result()
+        assert single_flight.stats == {'leaders': 1, 'followers': 3}
+
+    def test_sequential(self):
+        single_flight = SingleFlight()
+        assert single_flight.do('key', lambda: 1) == 1
+        assert single_flight.do('key', lambda: 2) == 2
+        assert single_flight.stats == {'leaders': 2, 'followers': 0}
@@ -0,0 +1,141 @@
+from io import BytesIO
+
+import pytest
+
+from result_set_test import resource, tmp_file, W3C_SAMPLE_RESULT_RAW, W3C_SAMPLE_RESULT_VARS
+from sparqlc import BlankNode, IRI, Literal, RawResultSet, RESULT_TYPE_CSV, RESULT_TYPE_TSV, SparqlParseException
+from sparqlc import XSD_BOOLEAN, XSD_DECIMAL, XSD_DOUBLE, XSD_INTEGER, XSD_STRING
+from sparqlc.tsv_parser import CsvResultParser, parse_tsv_term, TsvResultParser
+
+W3C_SAMPLE_RESULT_CSV = [
+    (
+        BlankNode('r1'),
+        Literal('http://work.example.org/alice/'),
+        Literal('Alice'),
+        None,
+        None,
+        Literal('<p xmlns="http://www.w3.org/1999/xhtml">My name is <b>alice</b></p>'),
+        BlankNode('r2'),
+    ),
+    (
+        BlankNode('r2'),
+        Literal('http://work.example.org/bob/'),
+        Literal('Bob'),
+        Literal('mailto:bob@work.example.org'),
+        Literal('30'),
+        None,
+        BlankNode('r1'),
+    ),
+]
+
+
+def line_result_set(content: str, content_type: str) -> RawResultSet:
+    return RawResultSet(BytesIO(content.encode('utf-8')), content_type=content_type)
+
+
+class TestParseTsvTerm:
+    TEST_TERMS = [
+        ['<http://a.b/c>', IRI('http://a.b/c')],
+        ['_:b0', BlankNode('b0')],
+        ['"plain"', Literal('plain')],
+        ['""', Literal('')],
+        ["'single'", Literal('single')],
+        ['"Германия"@ru', Literal('Германия', lang='ru')],
+        ['"x"^^<http://www.w3.org/2001/XMLSchema#string>', Literal('x', XSD_STRING)],
+        ['"a\\tb\\nc\\"d\\\\e\\u00e9\\U0001F600"', Literal('a\tb\nc"d\\eé\U0001F600')],
+        ['"with "inner" quotes"@en', Literal('with "inner" quotes', lang='en')],
+        ['"""long"""', Literal('long')],
+        ['true', Literal('true', XSD_BOOLEAN)],
+        ['false', Literal('false', XSD_BOOLEAN)],
+        ['-42', Literal('-42', XSD_INTEGER)],
+        ['+3.14', Literal('+3.14', XSD_DECIMAL)],
+        ['.5', Literal('.5', XSD_DECIMAL)],
+        ['1.5E-3', Literal('1.5E-3', XSD_DOUBLE)],
+        ['2e10', Literal('2e10', XSD_DOUBLE)],
+    ]
+
+    @pytest.mark.parametrize('src, expected', TEST_TERMS)
+    def test_terms(self, src: str, expected):
+        assert parse_tsv_term(src) == expected
+
+    TEST_ERRORS = [
+        '<http://a.b/c',
+        '"x"^^http://a.b/c',
+        '"x"garbage',
+        '"bad \\escape"',
+        'prefixed:name',
+        '1.2.3',
+    ]
+
+    @pytest.mark.parametrize('src', TEST_ERRORS)
+    def test_errors(self, src: str):
+        with pytest.raises(ValueError):
+            parse_tsv_term(src)
+
+
+class TestTsvResultParser:
+    def test_w3_result(self, tmp_path):
+        rs = RawResultSet(tmp_file(tmp_path, resource('w3c_sample_result.tsv')), content_type=RESULT_TYPE_TSV)
+        assert rs.fetch_rows() == W3C_SAMPLE_RESULT_RAW
+        assert rs.variables == W3C_SAMPLE_RESULT_VARS
+
+    def test_small_chunks(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(TsvResultParser, 'CHUNK_SIZE', 5)
+        rs = RawResultSet(tmp_file(tmp_path, resource('w3c_sample_result.tsv')), content_type=RESULT_TYPE_TSV)
+        assert rs.fetch_rows() == W3C_SAMPLE_RESULT_RAW
+
+    def test_crlf_no_final_newline(self):
+        rs = line_result_set('?a\t?b\r\n<x>\t1\r\n\t"y"', RESULT_TYPE_TSV)
+        assert rs.variables == ['a', 'b']
+        assert rs.fetch_rows() == [(IRI('x'), Literal('1', XSD_INTEGER)), (None, Literal('y'))]
+
+    def test_single_unbound_column(self):
+        rs = line_result_set('?a\n\n"y"\n', RESULT_TYPE_TSV)
+        assert rs.fetch_rows() == [(None,), (Literal('y'),)]
+
+    def test_empty(self):
+        rs = line_result_set('', RESULT_TYPE_TSV)
+        assert rs.variables == []
+        assert rs.has_result() is None
+        assert rs.fetch_rows() == []
+
+    @pytest.mark.parametrize('value', [True, False])
+    def test_ask(self, value: bool):
+        rs = line_result_set(f'?_askResult\n{str(value).lower()}\n', RESULT_TYPE_TSV)
+        assert rs.has_result() is value
+        assert rs.variables == []
+        assert rs.fetch_rows() == []
+
+    def test_ask_result_variable_selected(self):
+        rs = line_result_set('?_askResult\n<http://a>\n<http://b>\n', RESULT_TYPE_TSV)
+        assert rs.variables == ['_askResult']
+        assert rs.fetch_rows() == [(IRI('http://a'),), (IRI('http://b'),)]
+
+    def test_wrong_field_count(self):
+        with pytest.raises(SparqlParseException):
+            line_result_set('?a\t?b\n<x>\n', RESULT_TYPE_TSV).fetch_rows()
+
+
+class TestCsvResultParser:
+    def test_w3_result(self, tmp_path):
+        rs = RawResultSet(tmp_file(tmp_path, resource('w3c_sample_result.csv')), content_type=RESULT_TYPE_CSV)
+        assert rs.fetch_rows() == W3C_SAMPLE_RESULT_CSV
+        assert rs.variables == W3C_SAMPLE_RESULT_VARS
+
+    def test_quoted_newline(self):
+        rs = line_result_set('a,b\r\n"line 1\r\nline 2",x\r\n', RESULT_TYPE_CSV)
+        assert rs.fetch_rows() == [(Literal('line 1\r\nline 2'), Literal('x'))]
+
+    def test_quoted_newline_small_chunks(self, monkeypatch):
+        """ The record spanning several chunks is parsed once its closing quote has been fed """
+        monkeypatch.setattr(CsvResultParser, 'CHUNK_SIZE', 3)
+        rs = line_result_set('a,b\r\n"line 1\r\n""2""\r\n",x\r\ny,\r\n', RESULT_TYPE_CSV)
+        assert rs.fetch_rows() == [(Literal('line 1\r\n"2"\r\n'), Literal('x')), (Literal('y'), None)]
+
+    def test_single_unbound_column(self):
+        rs = line_result_set('a\r\n\r\ny\r\n', RESULT_TYPE_CSV)
+        assert rs.fetch_rows() == [(None,), (Literal('y'),)]
+
+    def test_ask(self):
+        rs = line_result_set('_askResult\r\ntrue\r\n', RESULT_TYPE_CSV)
+        assert rs.has_result() is True
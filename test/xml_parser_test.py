@@ -0,0 +1,49 @@
+import pytest
+
+from result_set_test import resource, SIMPLE_RESULT_RAW, SIMPLE_RESULT_VARS, tmp_file
+from sparqlc import RawResultSet, SparqlParseException, XmlBackend
+from sparqlc.xml_parser import ExpatXmlParser
+
+
+class TestXmlBackends:
+    RESOURCES = [
+        'ask_result_negative.srx',
+        'ask_result_positive.srx',
+        'big_text.srx',
+        'simple_result.srx',
+        'utf_8_result.srx',
+        'w3c_sample_result.srx',
+        'xsd_types.srx',
+    ]
+
+    @pytest.mark.parametrize('resource_name', RESOURCES)
+    def test_backends_equal(self, tmp_path, resource_name: str):
+        expat_rs = RawResultSet(tmp_file(tmp_path, resource(resource_name)), xml_backend=XmlBackend.EXPAT)
+        pulldom_rs = RawResultSet(tmp_file(tmp_path, resource(resource_name)), xml_backend=XmlBackend.PULLDOM)
+        assert expat_rs.xml_backend is XmlBackend.EXPAT
+        assert pulldom_rs.xml_backend is XmlBackend.PULLDOM
+        assert expat_rs.has_result() == pulldom_rs.has_result()
+        assert expat_rs.variables == pulldom_rs.variables
+        assert expat_rs.fetch_rows() == pulldom_rs.fetch_rows()
+
+    @pytest.mark.parametrize('backend', [b for b in XmlBackend])
+    def test_invalid_chars(self, tmp_path, backend: XmlBackend):
+        with pytest.raises(SparqlParseException):
+            RawResultSet(tmp_file(tmp_path, resource('invalid_chars.srx')), xml_backend=backend).fetch_rows()
+
+    @pytest.mark.parametrize('backend', [b for b in XmlBackend])
+    def test_resume_iteration(self, tmp_path, backend: XmlBackend):
+        rs = RawResultSet(tmp_file(tmp_path, resource('simple_result.srx')), xml_backend=backend)
+        assert rs.fetch_rows(1) == SIMPLE_RESULT_RAW[:1]
+        assert rs.fetch_rows() == SIMPLE_RESULT_RAW[1:]
+
+
+class TestExpatXmlParser:
+    def test_small_chunks(self, tmp_path, monkeypatch):
+        """
+        Element and text boundaries falling in between the chunks must not matter
+        """
+        monkeypatch.setattr(ExpatXmlParser, 'CHUNK_SIZE', 7)
+        rs = RawResultSet(tmp_file(tmp_path, resource('simple_result.srx')))
+        assert rs.variables == SIMPLE_RESULT_VARS
+        assert rs.fetch_rows() == SIMPLE_RESULT_RAW